@@ -10,14 +10,15 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 # Import models
 from models import Base
+from database import DATABASE_URL
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
-# Set the SQLite URL
-database_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assignment_app.db")
-config.set_main_option("sqlalchemy.url", f"sqlite:///{database_path}")
+# Migrate the database the app uses (DATABASE_URL, or the local SQLite file).
+# "%" is escaped because the config file syntax treats it as interpolation.
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -44,6 +45,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
     )
 
     with context.begin_transaction():
@@ -63,7 +65,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            # SQLite cannot ALTER most of a table; batch mode recreates it instead
+            render_as_batch=True
         )
 
         with context.begin_transaction():
@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from models import ArchivedAssignment, Assignment, AssignmentChange, AssignmentStatus, Subject, User
+from changes import settled_cursor
+
+# Turnaround analytics: the timestamps of every assignment, current and
+# archived, are held in NumPy arrays and all statistics are computed with
+# array operations. The arrays follow the change feed, so a refresh only
+# reloads the assignments that changed, and requests are served the last
+# computed result while a refresh runs in the background.
+ANALYTICS_SLA_HOURS = float(os.getenv("ANALYTICS_SLA_HOURS", "72"))  # Target time from submission to return
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "60"))
+ANALYTICS_FULL_RELOAD_SECONDS = float(os.getenv("ANALYTICS_FULL_RELOAD_SECONDS", "86400"))
+ANALYTICS_WEEKS = 104  # Throughput history kept; requests ask for the latest weeks of it
+
+LOAD_BATCH_SIZE = 50000
+RELOAD_BATCH_SIZE = 500
+# More changed assignments than this are cheaper to reload all at once
+MAX_INCREMENTAL_CHANGES = 100000
+QUANTILES = (0.5, 0.9, 0.99)
+STATUSES = list(AssignmentStatus)
+# Upper bounds, in hours, of the backlog age buckets
+BACKLOG_BUCKETS = [(24, "<1d"), (72, "1-3d"), (168, "3-7d"), (336, "7-14d"), (np.inf, ">=14d")]
+HOUR = np.timedelta64(3600, "s")
+
+
+class AssignmentFrame:
+    """Columns of all assignments, sorted by id. Unassigned tutors are -1, missing times NaT."""
+
+    COLUMNS = ("id", "tutor", "subject", "status", "created", "returned")
+
+    def __init__(self, id, tutor, subject, status, created, returned):
+        self.id = id
+        self.tutor = tutor
+        self.subject = subject
+        self.status = status
+        self.created = created
+        self.returned = returned
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple]) -> "AssignmentFrame":
+        columns = list(zip(*rows)) or [()] * 6
+        return cls(
+            np.array(columns[0], dtype=np.int64),
+            np.array(columns[1], dtype=np.int64),
+            np.array(columns[2], dtype=np.int64),
+            np.array(columns[3], dtype=np.int8),
+            np.array(columns[4], dtype="datetime64[s]"),  # None becomes NaT
+            np.array(columns[5], dtype="datetime64[s]"),
+        )
+
+    @classmethod
+    def concat(cls, frames: List["AssignmentFrame"]) -> "AssignmentFrame":
+        if not frames:
+            return cls.from_rows([])
+        frame = cls(*(np.concatenate([getattr(f, name) for f in frames]) for name in cls.COLUMNS))
+        return frame.take(np.argsort(frame.id, kind="stable"))
+
+    def take(self, index) -> "AssignmentFrame":
+        return AssignmentFrame(*(getattr(self, name)[index] for name in self.COLUMNS))
+
+    def __len__(self):
+        return len(self.id)
+
+    def replace(self, ids: np.ndarray, reloaded: "AssignmentFrame") -> "AssignmentFrame":
+        # Drop the old rows of ``ids`` (also those that no longer exist) and add their new versions
+        return AssignmentFrame.concat([self.take(~np.isin(self.id, ids)), reloaded])
+
+
+def frame_statement(model):
+    status_code = case(*[(model.status == status, code) for code, status in enumerate(STATUSES)], else_=0)
+    return select(
+        model.id, func.coalesce(model.tutor_id, -1), model.subject_id, status_code, model.created_at, model.returned_at
+    )
+
+
+def load_frame(db: Session, ids: Optional[Sequence[int]] = None) -> AssignmentFrame:
+    """Load all assignments, or those with ``ids``, from the current and archived tables."""
+    frames = []
+    for model in (Assignment, ArchivedAssignment):
+        if ids is None:
+            statements = [frame_statement(model)]
+        else:
+            statements = [
+                frame_statement(model).where(model.id.in_(ids[i:i + RELOAD_BATCH_SIZE]))
+                for i in range(0, len(ids), RELOAD_BATCH_SIZE)
+            ]
+        for statement in statements:
+            result = db.execute(statement.execution_options(yield_per=LOAD_BATCH_SIZE))
+            frames.extend(AssignmentFrame.from_rows(batch) for batch in result.partitions())
+    return AssignmentFrame.concat(frames)
+
+
+def group_stats(keys: np.ndarray, hours: np.ndarray, sla_hours: float) -> Dict[int, dict]:
+    """Turnaround quantiles per key, without a loop over the groups."""
+    if not len(keys):
+        return {}
+    order = np.lexsort((hours, keys))
+    keys, hours = keys[order], hours[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    stats = {
+        "returned": counts,
+        "mean_hours": np.add.reduceat(hours, starts) / counts,
+        "within_sla": np.add.reduceat((hours <= sla_hours).astype(np.int64), starts) / counts,
+    }
+    for q in QUANTILES:
+        # Nearest rank within each sorted group
+        stats[f"p{int(q * 100)}_hours"] = hours[starts + np.ceil(q * counts).astype(np.int64) - 1]
+    return {int(group): {name: values[i].item() for name, values in stats.items()} for i, group in enumerate(groups)}
+
+
+def backlog_stats(keys: np.ndarray, age_hours: np.ndarray, sla_hours: float) -> Dict[int, dict]:
+    if not len(keys):
+        return {}
+    order = np.argsort(keys, kind="stable")
+    keys, age_hours = keys[order], age_hours[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    overdue = np.add.reduceat((age_hours > sla_hours).astype(np.int64), starts)
+    oldest = np.maximum.reduceat(age_hours, starts)
+    return {
+        int(group): {"backlog": int(counts[i]), "overdue": int(overdue[i]), "oldest_backlog_hours": float(oldest[i])}
+        for i, group in enumerate(groups)
+    }
+
+
+def group_rows(turnaround: Dict[int, dict], backlog: Dict[int, dict], names: Dict[int, str]) -> List[dict]:
+    empty_turnaround = {"returned": 0, "mean_hours": None, "within_sla": None,
+                        **{f"p{int(q * 100)}_hours": None for q in QUANTILES}}
+    empty_backlog = {"backlog": 0, "overdue": 0, "oldest_backlog_hours": None}
+    rows = []
+    for key in sorted(set(turnaround) | set(backlog)):
+        rows.append({
+            "id": None if key < 0 else key,
+            "name": names.get(key, "unassigned" if key < 0 else f"#{key}"),
+            **turnaround.get(key, empty_turnaround),
+            **backlog.get(key, empty_backlog),
+        })
+    return rows
+
+
+def compute(frame: AssignmentFrame, now: datetime, sla_hours: float = ANALYTICS_SLA_HOURS,
+            tutor_names: Optional[Dict[int, str]] = None, subject_names: Optional[Dict[int, str]] = None) -> dict:
+    now64 = np.datetime64(now.replace(microsecond=0), "s")
+    returned = ~np.isnat(frame.returned)
+    turnaround = (frame.returned[returned] - frame.created[returned]) / HOUR
+    open_rows = ~returned & ~np.isnat(frame.created)
+    age = (now64 - frame.created[open_rows]) / HOUR
+
+    # Backlog ages by status, counted with one bincount over (status, bucket) pairs
+    edges = np.array([bound for bound, _ in BACKLOG_BUCKETS[:-1]])
+    bucket = np.searchsorted(edges, age, side="right")
+    counts = np.bincount(frame.status[open_rows].astype(np.int64) * len(BACKLOG_BUCKETS) + bucket,
+                         minlength=len(STATUSES) * len(BACKLOG_BUCKETS)).reshape(len(STATUSES), len(BACKLOG_BUCKETS))
+    backlog = [
+        {"status": status, "count": int(counts[code].sum()),
+         "ages": {label: int(n) for (_, label), n in zip(BACKLOG_BUCKETS, counts[code])}}
+        for code, status in enumerate(STATUSES) if status != AssignmentStatus.RETURNED
+    ]
+
+    # Weekly throughput, newest week last; week 0 is the seven days up to now
+    def per_week(times):
+        weeks = ((now64 - times[~np.isnat(times)]) // np.timedelta64(7, "D")).astype(np.int64)
+        weeks = weeks[(weeks >= 0) & (weeks < ANALYTICS_WEEKS)]
+        return np.bincount(weeks, minlength=ANALYTICS_WEEKS)[::-1]
+
+    submitted, completed = per_week(frame.created), per_week(frame.returned)
+    throughput = [
+        {"week_start": now - timedelta(weeks=ANALYTICS_WEEKS - i), "submitted": int(submitted[i]),
+         "returned": int(completed[i])}
+        for i in range(ANALYTICS_WEEKS)
+    ]
+
+    return {
+        "computed_at": now,
+        "sla_hours": sla_hours,
+        "assignments": len(frame),
+        "returned": int(returned.sum()),
+        "tutors": group_rows(group_stats(frame.tutor[returned], turnaround, sla_hours),
+                             backlog_stats(frame.tutor[open_rows], age, sla_hours), tutor_names or {}),
+        "subjects": group_rows(group_stats(frame.subject[returned], turnaround, sla_hours),
+                               backlog_stats(frame.subject[open_rows], age, sla_hours), subject_names or {}),
+        "backlog": backlog,
+        "throughput": throughput,
+    }
+
+
+class TurnaroundAnalytics:
+    """Per-process cache of the assignment arrays and of the statistics computed from them."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+        self.frame: Optional[AssignmentFrame] = None
+        self.cursor = 0  # Change feed position the frame is up to date with
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self.result: Optional[dict] = None
+        self.refresh_lock = threading.Lock()
+
+    def session(self) -> Session:
+        if self.session_factory is None:
+            from database import ReadSessionLocal, SessionLocal
+            return (ReadSessionLocal or SessionLocal)()
+        return self.session_factory()
+
+    def report(self) -> dict:
+        if self.result is None:
+            # Nothing to serve yet: the first request waits for the initial load
+            self.refresh()
+        elif time.monotonic() - self.refreshed_at > ANALYTICS_REFRESH_SECONDS and not self.refresh_lock.locked():
+            threading.Thread(target=self.refresh, name="analytics-refresh", daemon=True).start()
+        return self.result
+
+    def refresh(self):
+        with self.refresh_lock:
+            if self.result is not None and time.monotonic() - self.refreshed_at <= ANALYTICS_REFRESH_SECONDS:
+                return  # Another thread has just refreshed
+            db = self.session()
+            try:
+                self.update(db)
+                self.result = compute(
+                    self.frame, datetime.utcnow(),
+                    tutor_names=dict(db.query(User.id, User.name).filter(User.id.in_(np.unique(self.frame.tutor).tolist()))),
+                    subject_names=dict(db.query(Subject.id, Subject.name)),
+                )
+                self.refreshed_at = time.monotonic()
+            finally:
+                db.close()
+
+    def update(self, db: Session):
+        # Read before the changes, so none committed in between is skipped
+        cursor = settled_cursor(db)
+        if self.frame is not None and time.monotonic() - self.loaded_at < ANALYTICS_FULL_RELOAD_SECONDS:
+            # Changes past the settled cursor are reloaded again next time, which is harmless
+            changed = [row[0] for row in db.query(AssignmentChange.assignment_id).filter(
+                AssignmentChange.id > self.cursor
+            ).distinct().limit(MAX_INCREMENTAL_CHANGES + 1)]
+            if len(changed) <= MAX_INCREMENTAL_CHANGES:
+                if changed:
+                    self.frame = self.frame.replace(np.array(changed, dtype=np.int64), load_frame(db, changed))
+                self.cursor = cursor
+                return
+        self.frame = load_frame(db)
+        self.cursor = cursor
+        self.loaded_at = time.monotonic()
+
+
+turnaround_analytics = TurnaroundAnalytics()
+
+
+def synthetic_frame(count: int, now: datetime) -> AssignmentFrame:
+    rng = np.random.default_rng(1)
+    created = np.datetime64(now.replace(microsecond=0), "s") - rng.integers(0, 2 * 365 * 86400, count).astype("timedelta64[s]")
+    returned = created + rng.gamma(2.0, 30.0, count).astype(np.int64) * HOUR
+    returned[(rng.random(count) < 0.1) | (returned > np.datetime64(now, "s"))] = np.datetime64("NaT")
+    status = np.where(np.isnat(returned), rng.integers(0, 4, count), STATUSES.index(AssignmentStatus.RETURNED))
+    return AssignmentFrame(np.arange(1, count + 1), rng.integers(-1, 200, count), rng.integers(1, 30, count),
+                           status.astype(np.int8), created, returned)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tutor turnaround, backlog and throughput statistics")
+    parser.add_argument("--sla-hours", type=float, default=ANALYTICS_SLA_HOURS)
+    parser.add_argument("--weeks", type=int, default=12, help="Weeks of throughput to print")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="Time the statistics over N random assignments instead of reading the database")
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    if args.synthetic:
+        frame = synthetic_frame(args.synthetic, now)
+        started = time.perf_counter()
+        result = compute(frame, now, args.sla_hours)
+        print(f"computed statistics of {len(frame)} assignments in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        frame = load_frame(db)
+        loaded = time.perf_counter()
+        result = compute(frame, now, args.sla_hours,
+                         tutor_names=dict(db.query(User.id, User.name)), subject_names=dict(db.query(Subject.id, Subject.name)))
+        print(f"loaded {len(frame)} assignments in {(loaded - started) * 1000:.0f} ms, "
+              f"computed in {(time.perf_counter() - loaded) * 1000:.0f} ms")
+    finally:
+        db.close()
+    result["throughput"] = result["throughput"][-args.weeks:]
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import sharding
+from changes import record_change
+from models import Assignment, AssignmentStatus, ArchivedAssignment, ArchivedComment
+from storage import UPLOAD_DIR, get_storage, get_stored_file, physical_key, relocate_upload, delete_upload
+
+# Returned assignments are moved out of the hot tables after this many days
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = 100
+
+# Files of archived assignments, always stored compressed
+COLD_DIR = UPLOAD_DIR / "archive"
+
+# Columns copied as-is from assignments to archived_assignments
+ARCHIVED_COLUMNS = (
+    "id", "title", "description", "file_path", "submission_text", "status", "student_id", "tutor_id",
+    "subject_id", "created_at", "updated_at", "returned_at", "solution_file_path", "file_checksum",
+    "solution_checksum", "comment_count", "last_comment_at", "last_activity_at",
+)
+
+
+def cold_path(path: str) -> str:
+    # uploads/student_2/file.pdf -> uploads/archive/student_2/file.pdf
+    relative = os.path.relpath(path, UPLOAD_DIR)
+    return str(COLD_DIR / relative)
+
+
+def move_to_cold(db: Session, path: Optional[str], stale: List[str]) -> Optional[str]:
+    if not path or path.startswith(str(COLD_DIR)):
+        return path
+    stored = get_stored_file(db, path)
+    if get_storage().size(physical_key(path, stored.codec if stored else None)) is None:
+        # The file is already gone; keep the reference as it was
+        return path
+    new_path = cold_path(path)
+    relocate_upload(db, path, new_path)
+    stale.append(path)
+    return new_path
+
+
+def archive_assignment(db: Session, assignment: Assignment, stale: List[str]) -> ArchivedAssignment:
+    """Move an assignment and its comments to the archive tables (not committed).
+
+    Paths of the hot copies of its files are appended to ``stale``; they are
+    deleted by the caller once the move has been committed.
+    """
+    archived = ArchivedAssignment(**{column: getattr(assignment, column) for column in ARCHIVED_COLUMNS})
+    archived.file_path = move_to_cold(db, assignment.file_path, stale)
+    archived.solution_file_path = move_to_cold(db, assignment.solution_file_path, stale)
+    archived.comments = [
+        ArchivedComment(id=c.id, text=c.text, user_id=c.user_id, created_at=c.created_at)
+        for c in assignment.comments
+    ]
+    db.add(archived)
+
+    # Extracted text and previews can be recomputed; they are not archived
+    # and go with the assignment (delete-orphan)
+    for artifact in assignment.artifacts:
+        if artifact.preview_path:
+            stale.append(artifact.preview_path)
+    for comment in assignment.comments:
+        db.delete(comment)
+
+    # Clients syncing the hot list drop it from their copy
+    record_change(db, assignment, "archived")
+    # Its jobs are kept as history, with assignment_id cleared
+    db.delete(assignment)
+    return archived
+
+
+def archive_returned(db: Session, now: Optional[datetime] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive one batch of assignments returned more than ARCHIVE_AFTER_DAYS ago."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    query = db.query(Assignment).options(
+        selectinload(Assignment.comments),
+        selectinload(Assignment.artifacts),
+    ).filter(
+        Assignment.status == AssignmentStatus.RETURNED,
+        Assignment.returned_at < cutoff,
+    )
+    if not sharding.shard_ids:
+        # SQLite hands out max(id) + 1 for new rows, so the newest assignment stays
+        # in place to keep its id from being reused while it is in the archive.
+        # Shard ids come from shard_sequences, which never hands one out twice.
+        newest_id = db.query(func.max(Assignment.id)).scalar()
+        query = query.filter(Assignment.id != newest_id)
+    assignments = query.order_by(Assignment.id).limit(batch_size).all()
+
+    stale: List[str] = []
+    for assignment in assignments:
+        archive_assignment(db, assignment, stale)
+    db.commit()
+
+    # Only now that nothing refers to them any more
+    for path in stale:
+        if path.startswith(str(UPLOAD_DIR / "previews")):
+            get_storage().delete(path)
+        else:
+            delete_upload(db, path)
+    db.commit()
+    return len(assignments)
+
+
+def get_archived_assignment(db: Session, assignment_id: int) -> Optional[ArchivedAssignment]:
+    return db.query(ArchivedAssignment).options(
+        joinedload(ArchivedAssignment.student),
+        joinedload(ArchivedAssignment.tutor),
+        joinedload(ArchivedAssignment.subject),
+    ).filter(ArchivedAssignment.id == assignment_id).first()
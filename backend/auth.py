@@ -7,7 +7,7 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from models import User, UserRole
 from schemas import TokenData
-from database import get_db
+from database import get_read_db
 import os
 from dotenv import load_dotenv
 
@@ -50,7 +50,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # Set to 24 hours instead of 30 minutes
 
 # Fix the get_current_user function
 async def get_current_user(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     credentials_exception = HTTPException(
@@ -74,7 +74,7 @@ async def get_current_user(
     return user
 
 async def get_current_user_from_cookie(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     access_token: Optional[str] = Cookie(None)
 ):
     if not access_token:
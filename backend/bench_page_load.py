@@ -0,0 +1,86 @@
+"""Compare page-load latency of the per-widget requests with the composite endpoints.
+
+Run against a running API server:
+
+    python bench_page_load.py --url http://localhost:8000 --email user@example.com \
+        --password string --assignment 1 --iterations 50
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def login(base_url: str, email: str, password: str) -> str:
+    data = urllib.parse.urlencode({"username": email, "password": password}).encode()
+    with urllib.request.urlopen(f"{base_url}/token", data=data) as response:
+        return json.load(response)["access_token"]
+
+
+def fetch(base_url: str, token: str, path: str):
+    request = urllib.request.Request(f"{base_url}{path}", headers={"Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def timed(load):
+    start = time.perf_counter()
+    load()
+    return (time.perf_counter() - start) * 1000
+
+
+def summarize(name: str, samples):
+    samples = sorted(samples)
+    p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+    print(f"{name:<32} median {statistics.median(samples):8.1f} ms   p95 {p95:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--assignment", type=int, required=True, help="Assignment id for the workspace page")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    token = login(base_url, args.email, args.password)
+    get = lambda path: fetch(base_url, token, path)
+
+    # What the pages request today, one after another...
+    workspace_paths = [
+        "/users/me", f"/assignments/{args.assignment}",
+        f"/comments/assignment/{args.assignment}", "/subjects/",
+    ]
+    dashboard_paths = ["/users/me", "/assignments/", "/subjects/"]
+    pages = {
+        "workspace": (workspace_paths, f"/assignments/{args.assignment}/workspace"),
+        "dashboard": (dashboard_paths, "/dashboard"),
+    }
+
+    pool = ThreadPoolExecutor(max_workers=max(len(workspace_paths), len(dashboard_paths)))
+    for page, (paths, composite) in pages.items():
+        # Warm up connections and caches
+        for path in paths + [composite]:
+            get(path)
+
+        sequential, parallel, combined = [], [], []
+        for _ in range(args.iterations):
+            sequential.append(timed(lambda: [get(path) for path in paths]))
+            # ...or in parallel, as a browser would for independent widgets
+            parallel.append(timed(lambda: list(pool.map(get, paths))))
+            combined.append(timed(lambda: get(composite)))
+
+        print(f"{page} ({len(paths)} requests vs {composite})")
+        summarize("  separate, sequential", sequential)
+        summarize("  separate, parallel", parallel)
+        summarize("  composite", combined)
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
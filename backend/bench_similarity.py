@@ -0,0 +1,104 @@
+"""Benchmark near-duplicate lookups in the LSH index against a linear scan.
+
+Fills a scratch SQLite database with random signatures, a few of them
+planted near-duplicates of each other, then times lookups:
+
+    python bench_similarity.py --count 1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import struct
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import LshBucket, SubmissionSignature
+from similarity import NUM_PERMUTATIONS, SIGNATURE_FORMAT, band_keys, estimate_similarity, find_similar, pack, unpack
+
+
+def random_signature():
+    return struct.unpack(SIGNATURE_FORMAT, os.urandom(4 * NUM_PERMUTATIONS))
+
+
+def near_copy(signature, changed: int):
+    # About (NUM_PERMUTATIONS - changed) / NUM_PERMUTATIONS similar to the original
+    copy = list(signature)
+    for i in random.sample(range(NUM_PERMUTATIONS), changed):
+        copy[i] = random.getrandbits(32)
+    return copy
+
+
+def fill(engine, count: int, cluster_every: int, changed: int, batch_size: int = 10000):
+    """Insert ``count`` signatures; every ``cluster_every``-th one gets a near copy right after it."""
+    planted = []
+    next_id = 1
+    while next_id <= count:
+        signatures, buckets = [], []
+        for _ in range(min(batch_size, count - next_id + 1)):
+            if next_id % cluster_every == 0 and signatures:
+                original_id, original = signatures[-1]["assignment_id"], unpack(signatures[-1]["signature"])
+                signature = near_copy(original, changed)
+                planted.append((original_id, next_id))
+            else:
+                signature = random_signature()
+            signatures.append({"assignment_id": next_id, "signature": pack(signature), "shingle_count": 0})
+            buckets.extend({"bucket": key, "assignment_id": next_id} for key in band_keys(signature))
+            next_id += 1
+        with engine.begin() as conn:
+            conn.execute(SubmissionSignature.__table__.insert(), signatures)
+            conn.execute(LshBucket.__table__.insert(), buckets)
+    return planted
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[max(int(len(samples) * fraction) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--cluster-every", type=int, default=1000, help="Plant a near-duplicate every N submissions")
+    parser.add_argument("--changed", type=int, default=24, help="Signature rows that differ in a near-duplicate")
+    parser.add_argument("--scan-sample", type=int, default=20000, help="Signatures compared to time the linear scan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        SubmissionSignature.__table__.create(engine)
+        LshBucket.__table__.create(engine)
+
+        started = time.perf_counter()
+        planted = fill(engine, args.count, args.cluster_every, args.changed)
+        print(f"indexed {args.count} signatures in {time.perf_counter() - started:.1f} s "
+              f"({len(planted)} planted near-duplicates)")
+
+        with Session(engine) as db:
+            queries = random.sample(planted, min(args.queries, len(planted)))
+            latencies, found = [], 0
+            for original_id, copy_id in queries:
+                started = time.perf_counter()
+                similar = find_similar(db, original_id)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found += any(other_id == copy_id for other_id, _ in similar)
+            print(f"LSH lookup      median {statistics.median(latencies):8.2f} ms   "
+                  f"p95 {percentile(latencies, 0.95):8.2f} ms   recall {found / len(queries):.1%}")
+
+            # A linear scan compares the query with every stored signature
+            query = unpack(db.get(SubmissionSignature, queries[0][0]).signature)
+            sample = [unpack(row.signature) for row in db.query(SubmissionSignature).limit(args.scan_sample)]
+            started = time.perf_counter()
+            for signature in sample:
+                estimate_similarity(query, signature)
+            per_signature = (time.perf_counter() - started) / len(sample)
+            print(f"linear scan     {per_signature * args.count * 1000:8.0f} ms per lookup "
+                  f"(extrapolated from {len(sample)} comparisons, excluding reads)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from models import Assignment, AssignmentChange, User, UserRole
+
+# Change ids are assigned when the row is inserted, not when its transaction
+# commits, so a slow transaction can commit a lower id after a higher one is
+# already visible. Cursors only move past changes older than this, and newer
+# changes are sent again on the next sync (clients apply them idempotently).
+CHANGE_FEED_SETTLE_SECONDS = float(os.getenv("CHANGE_FEED_SETTLE_SECONDS", "5"))
+
+
+def record_change(db: Session, assignment: Assignment, action: str, previous_tutor_id: Optional[int] = None):
+    """Add a change for ``assignment`` to ``db`` without committing, so it
+    commits (or rolls back) together with the change itself.
+
+    With sharding it is written to the outbox on the assignment's shard and
+    reaches the directory just after the commit (see sharding.divert_to_outbox).
+    """
+    if assignment.id is None:
+        db.flush()
+    db.add(AssignmentChange(
+        assignment_id=assignment.id,
+        action=action,
+        student_id=assignment.student_id,
+        tutor_id=assignment.tutor_id,
+        previous_tutor_id=previous_tutor_id if previous_tutor_id != assignment.tutor_id else None,
+    ))
+
+
+def visible_changes(query, user: User):
+    if user.role == UserRole.STUDENT:
+        return query.filter(AssignmentChange.student_id == user.id)
+    if user.role == UserRole.TUTOR:
+        return query.filter(or_(
+            AssignmentChange.tutor_id == user.id,
+            AssignmentChange.previous_tutor_id == user.id,
+        ))
+    return query
+
+
+def settled_cursor(db: Session, now: Optional[datetime] = None) -> int:
+    """Highest change id that no in-flight transaction can still commit below."""
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS)
+    settled = db.query(func.max(AssignmentChange.id)).filter(AssignmentChange.created_at < cutoff).scalar()
+    return settled or 0
+
+
+def changes_since(db: Session, user: User, since: int, limit: int) -> Tuple[List[AssignmentChange], int, bool]:
+    """Changes visible to ``user`` after ``since``, the next cursor and whether more are left."""
+    now = datetime.utcnow()
+    # Read before the changes, so the cursor never skips one committed in between
+    settled = settled_cursor(db, now)
+    rows = visible_changes(db.query(AssignmentChange), user).filter(
+        AssignmentChange.id > since
+    ).order_by(AssignmentChange.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = since
+    if rows:
+        cursor = max(since, min(rows[-1].id, settled))
+        if has_more and cursor == since:
+            # A full page of unsettled changes; move on rather than resend it forever
+            cursor = rows[-1].id
+    return rows, cursor, has_more
@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from storage import accepts_encoding
+
+try:
+    import brotli
+except ImportError:
+    # Without brotli, responses are only gzipped
+    brotli = None
+
+# Response compression configuration
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Fraction of one CPU core that may be spent compressing; above it responses go out uncompressed
+COMPRESSION_CPU_BUDGET = float(os.getenv("COMPRESSION_CPU_BUDGET", "0.5"))
+COMPRESSION_CACHE_BYTES = int(os.getenv("COMPRESSION_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Higher qualities cost far more CPU for a few percent
+# Larger responses are compressed in a worker thread instead of on the event loop
+THREAD_THRESHOLD = 64 * 1024
+# Responses are buffered to be compressed; larger ones (file downloads) are passed through
+MAX_BUFFERED_SIZE = 8 * 1024 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+class CpuBudget:
+    """Token bucket of CPU seconds, refilled at ``share`` seconds per second."""
+
+    def __init__(self, share: float, burst_seconds: float = 1.0):
+        self.share = share
+        self.capacity = max(share * burst_seconds, 0.0)
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def has_budget(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.share)
+            self.updated = now
+            return self.available > 0
+
+    def spend(self, seconds: float):
+        with self.lock:
+            self.available -= seconds
+
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (ETag, encoding), bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key: Tuple[str, str], body: bytes):
+        if len(body) > self.max_bytes // 8:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    if brotli is not None and accepts_encoding(accept_encoding, "br"):
+        return "br"
+    if accepts_encoding(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    # Each encoding of a body is a different representation, so it gets its own
+    # strong tag: "abc" -> "abc-gzip"
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def base_etag(tag: str) -> str:
+    # W/"abc-gzip" -> "abc": without the weak prefix (proxies such as nginx add
+    # it when they recompress) and without an encoding suffix (ours, or Apache's)
+    tag = tag.removeprefix("W/")
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison of the body's tag, whatever encoding the client got it in
+    return "*" in tags or any(base_etag(tag) == base_etag(etag) for tag in tags)
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli compression of API responses.
+
+    Responses below ``COMPRESSION_MIN_SIZE``, of non-text types, already
+    encoded (e.g. compressed uploads) or streamed without a length are passed
+    through untouched. Responses that ask to be revalidated
+    (``Cache-Control: no-cache``) get a content ETag, are answered with 304
+    when the client has them, and their compressed bytes are cached.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 cpu_budget: float = COMPRESSION_CPU_BUDGET, cache_bytes: int = COMPRESSION_CACHE_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.budget = CpuBudget(cpu_budget)
+        self.cache = CompressedCache(cache_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        if_none_match = request_headers.get("if-none-match") if scope["method"] == "GET" else None
+
+        start_message: Optional[Message] = None
+        chunks = []
+        buffering = True
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, buffering
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                length = headers.get("content-length")
+                content_type = headers.get("content-type", "")
+                buffering = (
+                    length is not None and int(length) <= MAX_BUFFERED_SIZE
+                    and "content-encoding" not in headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                    and (encoding is not None or self.revalidate(headers))
+                )
+                if buffering:
+                    start_message = message
+                else:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or not buffering:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self.finish(start_message, b"".join(chunks), encoding, if_none_match, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def revalidate(headers: Headers) -> bool:
+        return "etag" in headers or "no-cache" in headers.get("cache-control", "")
+
+    async def finish(self, start: Message, body: bytes, encoding: Optional[str],
+                     if_none_match: Optional[str], send: Send):
+        headers = MutableHeaders(raw=start["headers"])
+        status_code = start["status"]
+
+        etag = None
+        if status_code == 200 and self.revalidate(headers):
+            etag = headers.get("etag")
+            if etag is None:
+                etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+                headers["ETag"] = etag
+            if etag_matches(if_none_match, etag):
+                del headers["content-length"]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if encoding and status_code not in (204, 304) and len(body) >= self.minimum_size:
+            compressed = self.cache.get((etag, encoding)) if etag else None
+            if compressed is None and self.budget.has_budget():
+                started = time.perf_counter()
+                if len(body) > THREAD_THRESHOLD:
+                    compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+                else:
+                    compressed = compress(body, encoding)
+                self.budget.spend(time.perf_counter() - started)
+                if etag:
+                    self.cache.put((etag, encoding), compressed)
+            if compressed is not None and len(compressed) < len(body):
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                if etag:
+                    headers["ETag"] = encoded_etag(etag, encoding)
+        if headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            headers.add_vary_header("Accept-Encoding")
+
+        await send({"type": "http.response.start", "status": status_code, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
@@ -39,12 +39,19 @@
 
 
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from fastapi import Depends, Request
+import hashlib
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from slowlog import slow_query_log, SLOW_QUERY_MS
+from sharding import sharded_sessionmaker
+
 # Load environment variables
 load_dotenv()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -61,24 +68,58 @@ DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{db_path}")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Optional read replica for read-only requests
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+if READ_DATABASE_URL and READ_DATABASE_URL.startswith("postgres://"):
+    READ_DATABASE_URL = READ_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# After a client writes, its reads go to the primary for this long so that it
+# sees its own changes even while the replica is lagging
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+PRIMARY_COOKIE = "read_primary_until"
+
+# Optional sharding (see sharding.py): comma-separated URLs of the databases
+# that assignments and comments are spread over. DATABASE_URL is then the
+# directory that holds everything else. The number of shards cannot change
+# once there is data on them.
+SHARD_DATABASE_URLS = [
+    url.strip().replace("postgres://", "postgresql://", 1)
+    for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()
+]
+
+def make_engine(url: str):
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False}
+        )
+    else:
+        # PostgreSQL engine configuration
+        engine = create_engine(
+            url,
+            pool_size=5,
+            max_overflow=10,
+            pool_timeout=30,
+            pool_recycle=1800,  # Recycle connections after 30 minutes
+        )
+    if SLOW_QUERY_MS > 0:
+        slow_query_log.install(engine)
+    return engine
+
 # Create the SQLAlchemy engine
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}
-    )
-else:
-    # PostgreSQL engine configuration
-    engine = create_engine(
-        DATABASE_URL,
-        pool_size=5,
-        max_overflow=10,
-        pool_timeout=30,
-        pool_recycle=1800,  # Recycle connections after 30 minutes
-    )
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(READ_DATABASE_URL) if READ_DATABASE_URL else None
+shard_engines = [make_engine(url) for url in SHARD_DATABASE_URLS]
 
 # Create a session factory bound to the engine
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if shard_engines:
+    # Reads go to the shards themselves; replicas of the directory are not used
+    SessionLocal = sharded_sessionmaker(engine, shard_engines)
+    read_engine = None
+    ReadSessionLocal = None
+else:
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else None
 
 # Base class for models
 Base = declarative_base()
@@ -89,4 +130,55 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Recent writers, keyed by a hash of their credentials
+_recent_writes = {}
+_recent_writes_lock = threading.Lock()
+
+def requester_key(request: Request) -> str:
+    credentials = request.headers.get("authorization") or request.cookies.get("access_token")
+    if not credentials:
+        credentials = request.client.host if request.client else ""
+    return hashlib.sha256(credentials.encode()).hexdigest()
+
+def mark_write(request: Request) -> float:
+    """Pin the requester's reads to the primary; returns the time the pin ends."""
+    until = time.time() + READ_YOUR_WRITES_SECONDS
+    with _recent_writes_lock:
+        _recent_writes[requester_key(request)] = until
+        if len(_recent_writes) > 10000:
+            now = time.time()
+            for key in [k for k, v in _recent_writes.items() if v < now]:
+                del _recent_writes[key]
+    return until
+
+def wrote_recently(request: Request) -> bool:
+    now = time.time()
+    # The cookie covers requests that land on another API process
+    try:
+        if float(request.cookies.get(PRIMARY_COOKIE, 0)) > now:
+            return True
+    except ValueError:
+        pass
+    return _recent_writes.get(requester_key(request), 0) > now
+
+@event.listens_for(Session, "before_flush")
+def reject_replica_writes(session, flush_context, instances):
+    if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("Attempted to write through a read replica session")
+
+# Dependency for read-only routes: a replica session for GET requests, unless
+# there is no replica or the client has just written something. Otherwise it is
+# the request's get_db session, so a write that also authenticates (auth.py)
+# uses one primary connection, not two; sessions only connect when first used.
+def get_read_db(request: Request, primary: Session = Depends(get_db)):
+    if ReadSessionLocal is None or request.method not in ("GET", "HEAD") or wrote_recently(request):
+        yield primary
+        return
+    db = ReadSessionLocal()
+    db.info["read_only"] = True
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,249 @@
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import Assignment, Job, JobStatus
+from slowlog import query_source
+
+# Job queue configuration
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+# A RUNNING job whose lock is older than this is assumed to belong to a dead worker
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+
+# Registered job handlers, keyed by Job.kind
+HANDLERS: Dict[str, Callable[[Session, Job], Any]] = {}
+# Interval in seconds of jobs that reschedule themselves, keyed by Job.kind
+PERIODIC: Dict[str, float] = {}
+
+
+def job_handler(kind: str):
+    """Register a function as the handler for jobs of the given kind.
+
+    Handlers are called as ``handler(db, job)`` inside their own session and
+    may return a JSON-serializable result that is stored on the job.
+    """
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def periodic_job(kind: str, interval_seconds: float):
+    """Register a handler that runs every ``interval_seconds``.
+
+    After each run that succeeds, or fails for the last time, the next one is
+    queued; ``ensure_periodic_jobs`` seeds the first run when workers start.
+    """
+    def decorator(func):
+        PERIODIC[kind] = interval_seconds
+        return job_handler(kind)(func)
+    return decorator
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    assignment: Optional[Assignment] = None,
+    run_at: Optional[datetime] = None,
+    max_attempts: Optional[int] = None,
+) -> Job:
+    # The job is only added to the session: it is committed (or rolled back)
+    # together with whatever the caller is writing, e.g. the new assignment.
+    # With sharding, a job for an assignment goes through the outbox on the
+    # assignment's shard for that (see sharding.divert_to_outbox).
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        status=JobStatus.QUEUED,
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+    )
+    if assignment is not None:
+        job.assignment = assignment
+    db.add(job)
+    return job
+
+
+def backoff_delay(attempts: int) -> float:
+    # Exponential backoff with full jitter, capped
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return random.uniform(delay / 2, delay)
+
+
+def _claimable(now: datetime):
+    stale = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    return or_(
+        and_(Job.status == JobStatus.QUEUED, Job.run_at <= now),
+        and_(Job.status == JobStatus.RUNNING, Job.locked_at < stale),
+    )
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[Job]:
+    now = datetime.utcnow()
+
+    if engine.dialect.name == "postgresql":
+        # Row locks let concurrent workers skip each other's jobs without blocking
+        job = db.execute(
+            select(Job).where(_claimable(now)).order_by(Job.run_at, Job.id)
+            .limit(1).with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if job is None:
+            db.rollback()
+            return None
+        job.status = JobStatus.RUNNING
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts += 1
+        db.commit()
+        return job
+
+    # SQLite has no row locks: pick a candidate and take it with a
+    # compare-and-set UPDATE. SQLite serializes writers, so only one worker's
+    # UPDATE can match; the losers move on to the next candidate.
+    candidates = select(Job.id).where(_claimable(now)).order_by(Job.run_at, Job.id).limit(10)
+    for job_id in db.execute(candidates).scalars().all():
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now))
+            .values(
+                status=JobStatus.RUNNING,
+                locked_by=worker_id,
+                locked_at=now,
+                attempts=Job.attempts + 1,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if claimed.rowcount == 1:
+            return db.get(Job, job_id)
+    return None
+
+
+def run_job(db: Session, job: Job) -> Job:
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        result = handler(db, job)
+    except Exception:
+        db.rollback()
+        job = db.get(Job, job.id)
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            # One bad run must not stop a periodic job until the next restart
+            schedule_next_run(db, job)
+        else:
+            job.status = JobStatus.QUEUED
+            job.run_at = datetime.utcnow() + timedelta(seconds=backoff_delay(job.attempts))
+        db.commit()
+        return job
+
+    job.status = JobStatus.SUCCEEDED
+    job.result = result
+    job.last_error = None
+    job.locked_by = None
+    job.locked_at = None
+    schedule_next_run(db, job)
+    db.commit()
+    return job
+
+
+def schedule_next_run(db: Session, job: Job):
+    if job.kind in PERIODIC:
+        enqueue(db, job.kind, job.payload, run_at=datetime.utcnow() + timedelta(seconds=PERIODIC[job.kind]))
+
+
+def ensure_periodic_jobs():
+    import tasks  # noqa: F401  (registers the job handlers)
+
+    db = SessionLocal()
+    try:
+        for kind in PERIODIC:
+            pending = db.query(Job.id).filter(
+                Job.kind == kind,
+                Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])
+            ).first()
+            if pending is None:
+                enqueue(db, kind)
+        db.commit()
+    finally:
+        db.close()
+
+
+def work_once(worker_id: str) -> bool:
+    """Claim and run a single job. Returns False when the queue had nothing due."""
+    db = SessionLocal()
+    try:
+        job = claim_job(db, worker_id)
+        if job is None:
+            return False
+        # Slow queries of the job are reported under its kind
+        token = query_source.set(f"job {job.kind}")
+        try:
+            run_job(db, job)
+        finally:
+            query_source.reset(token)
+        return True
+    finally:
+        db.close()
+
+
+def work(worker_id: Optional[str] = None, stop_event: Optional[threading.Event] = None, burst: bool = False):
+    """Process jobs until stopped. With ``burst`` return as soon as the queue is drained."""
+    import tasks  # noqa: F401  (registers the job handlers)
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            did_work = work_once(worker_id)
+        except Exception:
+            # Keep the worker alive across transient DB errors
+            traceback.print_exc()
+            did_work = False
+        if not did_work:
+            if burst:
+                return
+            stop_event.wait(JOB_POLL_INTERVAL_SECONDS)
+
+
+# In-process worker threads, started with the API server
+_stop_event = threading.Event()
+_threads = []
+
+
+def start_workers(count: int):
+    ensure_periodic_jobs()
+    _stop_event.clear()
+    for i in range(count):
+        thread = threading.Thread(
+            target=work,
+            kwargs={"worker_id": f"{socket.gethostname()}:{os.getpid()}:thread-{i}", "stop_event": _stop_event},
+            name=f"job-worker-{i}",
+            daemon=True,
+        )
+        thread.start()
+        _threads.append(thread)
+
+
+def stop_workers(timeout: float = 5):
+    _stop_event.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
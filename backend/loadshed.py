@@ -0,0 +1,223 @@
+import asyncio
+import os
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Load shedding: requests are classified by route, and each class has its
+# own concurrency limit, wait queue and queue deadline within an overall
+# limit sized to the database pool (pool_size + max_overflow in database.py).
+# When the overall limit is reached, higher-priority classes get the free
+# slots first and lower-priority requests are turned away with a 503 before
+# they can hold up submissions for the 30 s pool timeout.
+LOAD_SHEDDING = os.getenv("LOAD_SHEDDING", "true").lower() == "true"
+LOAD_SHED_CONCURRENCY = int(os.getenv("LOAD_SHED_CONCURRENCY", "15"))
+
+# "<concurrency>/<queue>/<deadline seconds>" per class
+LOAD_SHED_SUBMISSION = os.getenv("LOAD_SHED_SUBMISSION", "10/50/15")
+LOAD_SHED_AUTH = os.getenv("LOAD_SHED_AUTH", "4/20/5")
+LOAD_SHED_READ = os.getenv("LOAD_SHED_READ", "10/50/5")
+LOAD_SHED_ADMIN = os.getenv("LOAD_SHED_ADMIN", "3/6/2")
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# (class, methods or None for any, path); the first match wins
+ROUTE_CLASSES = [
+    (None, None, re.compile(r"^/(health|load-shedding(/.*)?)?$")),  # Never shed
+    ("auth", None, re.compile(r"^/(register|token|logout)$")),
+    ("admin", None, re.compile(r"^/assignments/\d+/assign$")),
+    ("submission", WRITE_METHODS, re.compile(r"^/(assignments|comments|files/presign|storage)(/.*)?$")),
+    ("submission", None, re.compile(r"^/upload-sessions(/.*)?$")),
+    ("admin", None, re.compile(
+        r"^/(users/(tutors/list)?|files/usage|exports/.*|jobs/\d+/retry|analytics/.*|profiles(/.*)?|slow-queries(/.*)?|loop-lag(/.*)?|coalescing(/.*)?)$"
+    )),
+    ("admin", WRITE_METHODS, re.compile(r"^/subjects(/.*)?$")),
+]
+
+
+def classify(scope: Scope) -> Optional[str]:
+    """Class of a request, or None for requests that are never shed."""
+    method, path = scope["method"], scope["path"]
+    if method == "OPTIONS":
+        return None
+    for name, methods, pattern in ROUTE_CLASSES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name
+    # Lists that include the archive scan the cold tables as well
+    if path == "/assignments/" and b"include_archived=true" in scope.get("query_string", b""):
+        return "admin"
+    return "read"
+
+
+def parse_class(value: str) -> Tuple[int, int, float]:
+    limit, queue_size, deadline = value.split("/")
+    return int(limit), int(queue_size), float(deadline)
+
+
+class RouteClass:
+    def __init__(self, name: str, priority: int, limit: int, queue_size: int, deadline: float):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0, "preempted": 0}
+
+    @classmethod
+    def from_setting(cls, name: str, priority: int, value: str) -> "RouteClass":
+        return cls(name, priority, *parse_class(value))
+
+
+class LoadShedder:
+    """Admission control for the classes, run on the event loop (no locks needed)."""
+
+    def __init__(self, classes: List[RouteClass], concurrency: int):
+        self.classes = {route_class.name: route_class for route_class in classes}
+        self.by_priority = sorted(classes, key=lambda route_class: route_class.priority, reverse=True)
+        self.concurrency = concurrency
+        self.active = 0
+
+    def can_start(self, route_class: RouteClass) -> bool:
+        return route_class.active < route_class.limit and self.active < self.concurrency
+
+    def outranked(self, route_class: RouteClass) -> bool:
+        # A more important class is queued only for the overall limit: it gets the next slot
+        return any(
+            other.priority > route_class.priority and other.waiters and other.active < other.limit
+            for other in self.by_priority
+        )
+
+    def start(self, route_class: RouteClass):
+        route_class.active += 1
+        route_class.admitted += 1
+        self.active += 1
+
+    async def acquire(self, route_class: RouteClass) -> Optional[str]:
+        """Take a slot, waiting up to the class deadline. Returns why the request was shed, if it was."""
+        if self.can_start(route_class) and not route_class.waiters and not self.outranked(route_class):
+            self.start(route_class)
+            return None
+        if self.outranked(route_class):
+            reason = "preempted"
+        elif len(route_class.waiters) >= route_class.queue_size:
+            reason = "queue_full"
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            route_class.waiters.append(waiter)
+            try:
+                # Unlike wait_for, this leaves the future alone on timeout, so a
+                # slot handed over at the last moment is noticed below
+                await asyncio.wait([waiter], timeout=route_class.deadline)
+            except asyncio.CancelledError:
+                # The client went away while waiting
+                if waiter.done():
+                    self.release(route_class)
+                else:
+                    route_class.waiters.remove(waiter)
+                raise
+            if waiter.done():
+                return None
+            route_class.waiters.remove(waiter)
+            reason = "deadline"
+        route_class.rejected[reason] += 1
+        return reason
+
+    def release(self, route_class: RouteClass):
+        route_class.active -= 1
+        self.active -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        # Free slots go to waiters of the most important class that is under its own limit
+        for route_class in self.by_priority:
+            while route_class.waiters and self.can_start(route_class):
+                waiter = route_class.waiters.popleft()
+                self.start(route_class)
+                waiter.set_result(None)
+
+    def report(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "classes": [{
+                "name": route_class.name,
+                "priority": route_class.priority,
+                "limit": route_class.limit,
+                "queue_size": route_class.queue_size,
+                "deadline_seconds": route_class.deadline,
+                "active": route_class.active,
+                "queued": len(route_class.waiters),
+                "admitted": route_class.admitted,
+                "rejected": dict(route_class.rejected),
+            } for route_class in self.by_priority],
+        }
+
+    def metrics(self) -> str:
+        """The same numbers in the Prometheus text format."""
+        lines = [
+            "# HELP load_shed_active_requests Requests being served, by route class.",
+            "# TYPE load_shed_active_requests gauge",
+        ]
+        lines += [f'load_shed_active_requests{{class="{c.name}"}} {c.active}' for c in self.by_priority]
+        lines += [
+            "# HELP load_shed_queue_depth Requests waiting for a slot, by route class.",
+            "# TYPE load_shed_queue_depth gauge",
+        ]
+        lines += [f'load_shed_queue_depth{{class="{c.name}"}} {len(c.waiters)}' for c in self.by_priority]
+        lines += [
+            "# HELP load_shed_admitted_total Requests admitted, by route class.",
+            "# TYPE load_shed_admitted_total counter",
+        ]
+        lines += [f'load_shed_admitted_total{{class="{c.name}"}} {c.admitted}' for c in self.by_priority]
+        lines += [
+            "# HELP load_shed_rejected_total Requests shed with a 503, by route class and reason.",
+            "# TYPE load_shed_rejected_total counter",
+        ]
+        lines += [
+            f'load_shed_rejected_total{{class="{c.name}",reason="{reason}"}} {count}'
+            for c in self.by_priority for reason, count in c.rejected.items()
+        ]
+        return "\n".join(lines) + "\n"
+
+
+load_shedder = LoadShedder([
+    RouteClass.from_setting("submission", 3, LOAD_SHED_SUBMISSION),
+    RouteClass.from_setting("auth", 2, LOAD_SHED_AUTH),
+    RouteClass.from_setting("read", 1, LOAD_SHED_READ),
+    RouteClass.from_setting("admin", 0, LOAD_SHED_ADMIN),
+], LOAD_SHED_CONCURRENCY)
+
+
+class LoadSheddingMiddleware:
+    """Holds each request to its class's limits for as long as it runs."""
+
+    def __init__(self, app: ASGIApp, shedder: LoadShedder = load_shedder):
+        self.app = app
+        self.shedder = shedder
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        name = classify(scope) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.shedder.classes[name]
+        reason = await self.shedder.acquire(route_class)
+        if reason is not None:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy. Please try again shortly."},
+                headers={"Retry-After": str(max(int(route_class.deadline), 1))}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.release(route_class)
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+# Event loop monitoring configuration; LOOP_MONITOR_INTERVAL_MS=0 turns it off
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+
+RECENT_LAGS = 1200  # About a minute of ticks at the default interval, for percentiles
+RECENT_STALLS = 100
+MAX_STACK_FRAMES = 40
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def call_code(call):
+    # Dependencies may be functions or callable instances
+    return getattr(call, "__code__", None) or getattr(getattr(call, "__call__", None), "__code__", None)
+
+
+def dependency_codes(app) -> Dict[object, str]:
+    """Code objects of all route dependencies, mapped to their names."""
+    codes = {}
+
+    def visit(dependant):
+        for dependency in dependant.dependencies:
+            code = call_code(dependency.call)
+            if code is not None:
+                codes[code] = getattr(dependency.call, "__name__", type(dependency.call).__name__)
+            visit(dependency)
+
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            visit(route.dependant)
+    return codes
+
+
+class LoopMonitor:
+    """Measures how late the event loop runs a periodic timer.
+
+    A task on the loop sleeps for ``interval`` and records how much later
+    than that it woke up. A watchdog thread notices when that task has not
+    run for ``threshold`` past its due time, and takes the stack of the loop
+    thread while the loop is still blocked. It attributes the stall to the
+    route being served, the dependency being resolved and the innermost
+    frame in this application's code.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS, threshold_ms: float = LOOP_STALL_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.lock = threading.Lock()
+        self.dependencies: Dict[object, str] = {}
+        self.loop_thread: Optional[int] = None
+        self.heartbeat = time.monotonic()
+        self.stopped = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+
+        self.ticks = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+        self.lags: Deque[float] = deque(maxlen=RECENT_LAGS)
+        self.stall_count = 0
+        self.stalled_seconds = 0.0
+        self.pending: Optional[dict] = None  # Stall captured by the watchdog, finished by the loop
+        self.recent: Deque[dict] = deque(maxlen=RECENT_STALLS)
+        self.sites: Dict[Tuple[str, str, str], dict] = {}
+
+    def start(self, app):
+        """Start monitoring the running loop; called from a startup handler."""
+        self.dependencies = dependency_codes(app)
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.get_running_loop().create_task(self.tick())
+        threading.Thread(target=self.watch, name="loop-monitor", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    async def tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record_lag(max(loop.time() - due, 0.0))
+
+    def record_lag(self, lag: float):
+        with self.lock:
+            self.heartbeat = time.monotonic()
+            self.ticks += 1
+            self.lag_sum += lag
+            self.lag_max = max(self.lag_max, lag)
+            self.lags.append(lag)
+            pending, self.pending = self.pending, None
+            if lag < self.threshold:
+                return
+            stall = pending or {"started_at": datetime.utcnow(), "route": "-", "dependency": "-",
+                                "location": "-", "stack": []}  # Too short for the watchdog to catch
+            stall["duration_ms"] = lag * 1000
+            self.stall_count += 1
+            self.stalled_seconds += lag
+            self.recent.append(stall)
+            key = (stall["route"], stall["dependency"], stall["location"])
+            site = self.sites.setdefault(key, {"route": key[0], "dependency": key[1], "location": key[2],
+                                               "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            site["count"] += 1
+            site["total_ms"] += stall["duration_ms"]
+            site["max_ms"] = max(site["max_ms"], stall["duration_ms"])
+
+    def watch(self):
+        while not self.stopped.wait(min(self.interval, self.threshold) / 2):
+            with self.lock:
+                overdue = time.monotonic() - self.heartbeat - self.interval
+                if overdue < self.threshold or self.pending is not None:
+                    continue
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None:
+                continue
+            stall = self.describe(frame)
+            stall["started_at"] = datetime.utcnow() - timedelta(seconds=overdue)
+            with self.lock:
+                self.pending = stall
+
+    def describe(self, frame) -> dict:
+        route, dependency, location, stack = "-", "-", "-", []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_filename}:{frame.f_lineno} in {code.co_name}")
+            if location == "-" and code.co_filename.startswith(BACKEND_DIR):
+                location = f"{code.co_filename[len(BACKEND_DIR):]}:{frame.f_lineno} in {code.co_name}"
+            if dependency == "-" and code in self.dependencies:
+                dependency = self.dependencies[code]
+            if route == "-" and code.co_name == "handle":
+                # Starlette's Route.handle gets the scope that the router added the route to
+                scope = frame.f_locals.get("scope")
+                if isinstance(scope, dict) and scope.get("route") is not None:
+                    route = f"{scope['method']} {scope['route'].path}"
+            frame = frame.f_back
+        return {"route": route, "dependency": dependency, "location": location,
+                "stack": list(reversed(stack[:MAX_STACK_FRAMES]))}
+
+    def report(self, limit: int = 20) -> dict:
+        with self.lock:
+            lags = sorted(self.lags)
+            sites = sorted(self.sites.values(), key=lambda site: site["total_ms"], reverse=True)[:limit]
+            return {
+                "interval_ms": self.interval * 1000,
+                "threshold_ms": self.threshold * 1000,
+                "ticks": self.ticks,
+                "lag_p50_ms": percentile(lags, 0.5) * 1000,
+                "lag_p99_ms": percentile(lags, 0.99) * 1000,
+                "lag_max_ms": self.lag_max * 1000,
+                "stalls": self.stall_count,
+                "stalled_ms": self.stalled_seconds * 1000,
+                "sites": [dict(site) for site in sites],
+                "recent": [dict(stall) for stall in reversed(self.recent)][:limit],
+            }
+
+    def metrics(self) -> str:
+        """The same numbers in the Prometheus text format."""
+        with self.lock:
+            lags = sorted(self.lags)
+            lines = [
+                "# HELP event_loop_lag_seconds How late the event loop ran a timer (recent ticks).",
+                "# TYPE event_loop_lag_seconds summary",
+                f'event_loop_lag_seconds{{quantile="0.5"}} {percentile(lags, 0.5):.6f}',
+                f'event_loop_lag_seconds{{quantile="0.99"}} {percentile(lags, 0.99):.6f}',
+                f"event_loop_lag_seconds_sum {self.lag_sum:.6f}",
+                f"event_loop_lag_seconds_count {self.ticks}",
+                "# HELP event_loop_stalls_total Ticks delayed by more than the stall threshold.",
+                "# TYPE event_loop_stalls_total counter",
+                f"event_loop_stalls_total {self.stall_count}",
+                "# HELP event_loop_stalled_seconds_total Time the event loop spent stalled.",
+                "# TYPE event_loop_stalled_seconds_total counter",
+                f"event_loop_stalled_seconds_total {self.stalled_seconds:.6f}",
+            ]
+            lines += [
+                "# HELP event_loop_stalls_by_site_total Stalls by route, dependency and blocking frame.",
+                "# TYPE event_loop_stalls_by_site_total counter",
+            ]
+            for site in self.sites.values():
+                labels = ",".join(f'{name}="{escape_label(site[name])}"' for name in ("route", "dependency", "location"))
+                lines.append(f"event_loop_stalls_by_site_total{{{labels}}} {site['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+loop_monitor = LoopMonitor()
@@ -1,20 +1,26 @@
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from fastapi.responses import JSONResponse
-from routes import auth, users, subjects, assignments, comments
-from models import Base
-from database import engine
+from routes import auth, users, subjects, assignments, comments, jobs, files, upload_sessions, exports, pages, profiles, slow_queries, similarity, loop_lag, load_shedding, analytics, coalescing
+from database import read_engine, mark_write, PRIMARY_COOKIE, READ_YOUR_WRITES_SECONDS
+from startup import check_schema
+from jobs import start_workers, stop_workers
+from compression import CompressionMiddleware
+from profiler import ProfilerMiddleware, PROFILING_ENABLED
+from slowlog import QuerySourceMiddleware, SLOW_QUERY_MS
+from loopmon import loop_monitor, LOOP_MONITOR_INTERVAL_MS
+from loadshed import LoadSheddingMiddleware, LOAD_SHEDDING
+from singleflight import SINGLE_FLIGHT
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Create all tables in the database
-# In production on Render, we'll always need to ensure tables exist
-Base.metadata.create_all(bind=engine)
+# The tables are created and migrated by `python startup.py` (run by the Docker
+# image before the server starts); fail fast if that has not been done
+check_schema()
 
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
@@ -27,6 +33,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Per-route-class concurrency limits that shed low-priority work first under
+# overload. Added before CORS so that it runs inside it and 503s get CORS headers.
+if LOAD_SHEDDING:
+    app.add_middleware(LoadSheddingMiddleware)
+
 # Configure CORS
 origins = [
     "http://localhost",
@@ -45,10 +56,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by resumable upload clients, clients backing off from rate limits, change feed clients, exports and paging
+    expose_headers=["Location", "Upload-Offset", "Upload-Length", "Retry-After", "X-Change-Cursor", "X-Total-Count", "X-Next-Cursor"],
 )
 
-# Mount static files for file uploads
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# gzip/brotli for JSON responses; compressed uploads are already encoded and passed through
+app.add_middleware(CompressionMiddleware)
+
+# Lets the slow query log report the route that issued a query
+if SLOW_QUERY_MS > 0:
+    app.add_middleware(QuerySourceMiddleware)
+
+# Opt-in sampling profiler (PROFILE_SAMPLE_RATE / PROFILE_SLOW_MS), outermost so it also sees compression
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# Read-your-writes: after a successful write, the client's reads skip the replica for a while,
+# and do not join identical reads already in flight (see singleflight.py)
+@app.middleware("http")
+async def pin_writers_to_primary(request, call_next):
+    response = await call_next(request)
+    if (read_engine is not None or SINGLE_FLIGHT) and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        until = mark_write(request)
+        response.set_cookie(PRIMARY_COOKIE, f"{until:.3f}", max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+                            httponly=True, samesite="lax")
+    return response
+
+# Uploaded files are served by routes/files.py, which handles compressed storage
 
 # Include routers
 app.include_router(auth.router)
@@ -56,6 +90,41 @@ app.include_router(users.router)
 app.include_router(subjects.router)
 app.include_router(assignments.router)
 app.include_router(comments.router)
+app.include_router(jobs.router)
+app.include_router(files.router)
+app.include_router(upload_sessions.router)
+app.include_router(exports.router)
+app.include_router(pages.router)
+app.include_router(profiles.router)
+app.include_router(slow_queries.router)
+app.include_router(similarity.router)
+app.include_router(loop_lag.router)
+app.include_router(load_shedding.router)
+app.include_router(analytics.router)
+app.include_router(coalescing.router)
+
+# Background job workers running inside the API process. Set JOB_WORKERS=0
+# when jobs are processed by separate `python worker.py` processes instead.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
+@app.on_event("startup")
+def start_job_workers():
+    if JOB_WORKERS > 0:
+        start_workers(JOB_WORKERS)
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    stop_workers()
+
+# Measures event loop lag and reports what blocks it (see /loop-lag)
+@app.on_event("startup")
+async def start_loop_monitor():
+    if LOOP_MONITOR_INTERVAL_MS > 0:
+        loop_monitor.start(app)
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    loop_monitor.stop()
 
 @app.get("/")
 def read_root():
@@ -87,7 +156,8 @@ def health_check():
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Enum, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Text, DateTime, Enum, Boolean, JSON, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import enum
@@ -18,6 +18,12 @@ class AssignmentStatus(str, enum.Enum):
     COMPLETED = "completed"
     RETURNED = "returned"
 
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -66,6 +72,21 @@ class Assignment(Base):
     subject = relationship("Subject", back_populates="assignments")
     comments = relationship("Comment", back_populates="assignment")
     solution_file_path = Column(String(255), nullable=True)  # Path to solution file uploaded by tutor
+    file_checksum = Column(String(64), nullable=True)  # SHA-256 of file_path, filled in by the job queue
+    solution_checksum = Column(String(64), nullable=True)  # SHA-256 of solution_file_path
+    jobs = relationship("Job", back_populates="assignment")
+    artifacts = relationship("FileArtifact", back_populates="assignment", cascade="all, delete-orphan")
+    # Denormalized so list views can show and sort by activity without loading comments;
+    # kept up to date by the comment and status routes in the same transaction
+    comment_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_comment_at = Column(DateTime, nullable=True)
+    last_activity_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+
+    __table_args__ = (
+        # Lists sorted or filtered by activity, for admins and for one tutor
+        Index("ix_assignments_last_activity_at", "last_activity_at"),
+        Index("ix_assignments_tutor_id_last_activity_at", "tutor_id", "last_activity_at"),
+    )
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -78,4 +99,220 @@ class Comment(Base):
     
     # Relationships
     user = relationship("User", back_populates="comments")
-    assignment = relationship("Assignment", back_populates="comments")
\ No newline at end of file
+    assignment = relationship("Assignment", back_populates="comments")
+
+class ArchivedAssignment(Base):
+    """Assignment returned long ago, moved out of the hot table by the archive job."""
+    __tablename__ = "archived_assignments"
+
+    id = Column(Integer, primary_key=True, index=True)  # Same id as in the assignments table
+    title = Column(String(200), nullable=False)
+    description = Column(Text, nullable=True)
+    file_path = Column(String(255), nullable=True)  # Moved to the cold directory
+    submission_text = Column(Text, nullable=True)
+    status = Column(Enum(AssignmentStatus), nullable=False)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    tutor_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    returned_at = Column(DateTime, nullable=True)
+    solution_file_path = Column(String(255), nullable=True)
+    file_checksum = Column(String(64), nullable=True)
+    solution_checksum = Column(String(64), nullable=True)
+    comment_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_comment_at = Column(DateTime, nullable=True)
+    last_activity_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relationships
+    student = relationship("User", foreign_keys=[student_id], viewonly=True)
+    tutor = relationship("User", foreign_keys=[tutor_id], viewonly=True)
+    subject = relationship("Subject", viewonly=True)
+    comments = relationship("ArchivedComment", back_populates="assignment", cascade="all, delete-orphan",
+                            order_by="ArchivedComment.created_at")
+
+    # Extracted text and previews are not kept for archived assignments
+    artifacts = []
+
+class ArchivedComment(Base):
+    __tablename__ = "archived_comments"
+
+    id = Column(Integer, primary_key=True, index=True)  # Same id as in the comments table
+    text = Column(Text, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    assignment_id = Column(Integer, ForeignKey("archived_assignments.id"), nullable=False, index=True)
+    created_at = Column(DateTime)
+
+    # Relationships
+    user = relationship("User", viewonly=True)
+    assignment = relationship("ArchivedAssignment", back_populates="comments")
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=True)
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=True, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Not claimable before this time (used for backoff)
+    locked_by = Column(String(100), nullable=True)  # Worker currently holding the job
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    assignment = relationship("Assignment", back_populates="jobs")
+
+    __table_args__ = (
+        # Workers poll for the oldest due job in a given status
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+class FileArtifact(Base):
+    """Precomputed text and preview of an uploaded submission or solution file."""
+    __tablename__ = "file_artifacts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False, index=True)
+    field = Column(String(50), nullable=False)  # "file_path" or "solution_file_path"
+    source_path = Column(String(255), nullable=False)  # File the artifact was computed from
+    content_type = Column(String(100), nullable=True)
+    page_count = Column(Integer, nullable=True)
+    text = Column(Text, nullable=True)  # Extracted text, truncated for very large files
+    preview_path = Column(String(255), nullable=True)  # Small PNG of the first page
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    assignment = relationship("Assignment", back_populates="artifacts")
+
+    __table_args__ = (
+        UniqueConstraint("assignment_id", "field", name="uq_file_artifacts_assignment_field"),
+    )
+
+class StoredFile(Base):
+    """How an uploaded file is stored on disk. ``path`` is the logical path used in URLs."""
+    __tablename__ = "stored_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(255), unique=True, index=True, nullable=False)
+    codec = Column(String(10), nullable=True)  # "gzip", "zstd" or None when stored raw
+    original_size = Column(BigInteger, nullable=False)
+    stored_size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    crc32 = Column(BigInteger, nullable=True)  # CRC-32 of the original bytes, used by ZIP exports
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class QuarantinedFile(Base):
+    """An unreferenced file moved aside by the upload garbage collector, deleted after a grace period."""
+    __tablename__ = "quarantined_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(255), unique=True, nullable=False)  # Storage key the file was moved from
+    size = Column(BigInteger, nullable=False)
+    user_id = Column(Integer, nullable=True)  # Owner of the upload directory, if any
+    quarantined_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class StorageUsage(Base):
+    """Bytes stored per user, kept up to date by uploads and deletions and recounted by upload garbage collection."""
+    __tablename__ = "storage_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Not a foreign key: files of deleted users are still counted. None for
+    # files that belong to no user directory (previews, upload chunks)
+    user_id = Column(Integer, nullable=True, unique=True)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    quarantined_bytes = Column(BigInteger, nullable=False, default=0)  # Included in total_bytes
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class UploadSession(Base):
+    """A resumable upload; the file arrives as chunks that may be sent in parallel."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # Random hex id, used in URLs
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    purpose = Column(String(20), nullable=False)  # "submission" or "solution"
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    total_size = Column(BigInteger, nullable=False)
+    completed_at = Column(DateTime, nullable=True)  # Set once the file was attached to an assignment
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    chunks = relationship("UploadChunk", back_populates="session", cascade="all, delete-orphan",
+                          order_by="UploadChunk.offset")
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(32), ForeignKey("upload_sessions.id"), nullable=False)
+    offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)
+    checksum = Column(String(64), nullable=False)  # SHA-256 hex of the chunk
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    session = relationship("UploadSession", back_populates="chunks")
+
+    __table_args__ = (
+        UniqueConstraint("session_id", "offset", name="uq_upload_chunks_session_offset"),
+    )
+
+class AssignmentChange(Base):
+    """Append-only log of assignment changes; the id is the sync cursor for clients."""
+    __tablename__ = "assignment_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Not a foreign key: changes outlive assignments that are moved to the archive
+    assignment_id = Column(Integer, nullable=False, index=True)
+    action = Column(String(50), nullable=False)  # e.g. "created", "status_changed", "comment_added"
+    # Who could see the assignment when it changed, so feeds can be filtered without a join
+    student_id = Column(Integer, nullable=False)
+    tutor_id = Column(Integer, nullable=True)
+    previous_tutor_id = Column(Integer, nullable=True)  # Set when the assignment moves to another tutor
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Per-role feeds read changes after a cursor for one user
+        Index("ix_assignment_changes_student_id_id", "student_id", "id"),
+        Index("ix_assignment_changes_tutor_id_id", "tutor_id", "id"),
+        Index("ix_assignment_changes_previous_tutor_id_id", "previous_tutor_id", "id"),
+    )
+
+class SubmissionSignature(Base):
+    """MinHash signature of a submission's text, for near-duplicate detection."""
+    __tablename__ = "submission_signatures"
+
+    # Not a foreign key: archived submissions stay comparable
+    assignment_id = Column(Integer, primary_key=True)
+    signature = Column(LargeBinary, nullable=False)  # 128 little-endian uint32 minimums
+    shingle_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class LshBucket(Base):
+    """One LSH band of a submission signature; submissions sharing a bucket are candidates."""
+    __tablename__ = "lsh_buckets"
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, nullable=False, index=True)  # Hash of the band number and its rows
+    assignment_id = Column(Integer, nullable=False, index=True)
+
+class MigrationCheckpoint(Base):
+    """Progress of a batched backfill from online_migrations.py, so that it resumes where it stopped."""
+    __tablename__ = "migration_checkpoints"
+
+    name = Column(String(100), primary_key=True)
+    last_key = Column(BigInteger, nullable=True)  # Primary key of the last row backfilled
+    rows_done = Column(BigInteger, default=0, nullable=False)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
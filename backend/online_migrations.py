@@ -0,0 +1,367 @@
+"""Online schema changes and data backfills for large tables.
+
+Alembic revisions should only make changes that are quick on a big table
+(adding a nullable column, creating a table). The slow parts run here,
+against the live database, without holding long locks:
+
+    python online_migrations.py backfill assignment_comments --dry-run
+    python online_migrations.py backfill assignment_comments
+    python online_migrations.py index ix_assignments_last_activity_at
+    python online_migrations.py rebuild assignment_changes --dry-run
+    python online_migrations.py status
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Index, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+from models import ArchivedAssignment, ArchivedComment, Assignment, Base, Comment, MigrationCheckpoint
+
+# Rows updated per transaction. Each batch holds its row locks only until it commits.
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+# After each batch, sleep this many times as long as the batch took, so that a
+# backfill uses at most 1 / (1 + throttle) of the database's time (0 disables)
+MIGRATION_THROTTLE = float(os.getenv("MIGRATION_THROTTLE", "1.0"))
+# Seconds between progress lines
+MIGRATION_PROGRESS_SECONDS = float(os.getenv("MIGRATION_PROGRESS_SECONDS", "5"))
+
+checkpoints = MigrationCheckpoint.__table__
+
+
+class Backfill:
+    """An UPDATE of ``table`` that is run in primary key order, one batch per transaction.
+
+    ``values`` maps column names to SQL expressions, which can be correlated
+    subqueries. The UPDATE must be idempotent: a batch that is interrupted
+    is rolled back as a whole and run again on resume.
+    """
+
+    def __init__(self, name: str, table: Table, values: Callable[[], dict], where=None):
+        self.name = name
+        self.table = table
+        self.values = values
+        self.where = where
+        if len(table.primary_key.columns) != 1:
+            raise ValueError(f"{table.name} does not have a single-column primary key")
+        self.key = list(table.primary_key.columns)[0]
+
+    def statement(self, after: Optional[int], upper: int):
+        values = self.values()
+        # Keep columns such as updated_at as they are instead of applying their onupdate
+        for column in self.table.columns:
+            if column.onupdate is not None and column.name not in values:
+                values[column.name] = column
+        statement = self.table.update().where(self.key <= upper).values(values)
+        if after is not None:
+            statement = statement.where(self.key > after)
+        if self.where is not None:
+            statement = statement.where(self.where)
+        return statement
+
+    def remaining(self, after: Optional[int]):
+        statement = select(self.key).select_from(self.table)
+        if after is not None:
+            statement = statement.where(self.key > after)
+        if self.where is not None:
+            statement = statement.where(self.where)
+        return statement
+
+    def next_upper(self, connection: Connection, after: Optional[int], batch_size: int) -> Optional[int]:
+        batch = self.remaining(after).order_by(self.key).limit(batch_size).subquery()
+        return connection.execute(select(func.max(batch.c[self.key.name]))).scalar()
+
+
+def comment_totals(model, comment_model) -> Callable[[], dict]:
+    # comment_count and last_comment_at recomputed from the comments themselves
+    def values():
+        return {
+            "comment_count": select(func.count(comment_model.id)).where(
+                comment_model.assignment_id == model.id
+            ).scalar_subquery(),
+            "last_comment_at": select(func.max(comment_model.created_at)).where(
+                comment_model.assignment_id == model.id
+            ).scalar_subquery(),
+        }
+    return values
+
+
+BACKFILLS: Dict[str, Backfill] = {backfill.name: backfill for backfill in [
+    Backfill("assignment_comments", Assignment.__table__, comment_totals(Assignment, Comment)),
+    Backfill("archived_assignment_comments", ArchivedAssignment.__table__,
+             comment_totals(ArchivedAssignment, ArchivedComment)),
+]}
+
+
+def target_engines(table_name: str) -> List[Engine]:
+    # Sharded tables are migrated on every shard, everything else on the main database
+    from database import engine, shard_engines
+    from sharding import SHARDED_TABLES
+    if shard_engines and table_name in SHARDED_TABLES:
+        return shard_engines
+    return [engine]
+
+
+def describe(engine: Engine) -> str:
+    return engine.url.render_as_string(hide_password=True)
+
+
+def format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def print_progress(name: str, done: int, total: int, rate: float):
+    percent = 100 * done / total if total else 100
+    eta = format_seconds((total - done) / rate) if rate and total > done else "-"
+    print(f"{name}: {done}/{total} rows ({percent:.1f}%), {rate:.0f} rows/s, ETA {eta}", file=sys.stderr)
+
+
+def load_checkpoint(connection: Connection, name: str) -> dict:
+    row = connection.execute(select(checkpoints).where(checkpoints.c.name == name)).mappings().first()
+    if row is None:
+        connection.execute(checkpoints.insert().values(name=name, rows_done=0))
+        row = connection.execute(select(checkpoints).where(checkpoints.c.name == name)).mappings().first()
+    return dict(row)
+
+
+def run_backfill(engine: Engine, backfill: Backfill, batch_size: int = MIGRATION_BATCH_SIZE,
+                 throttle: float = MIGRATION_THROTTLE, restart: bool = False,
+                 progress: Callable[[str, int, int, float], None] = print_progress) -> dict:
+    """Run (or resume) ``backfill`` on ``engine`` until every row is done."""
+    checkpoints.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        if restart:
+            connection.execute(checkpoints.delete().where(checkpoints.c.name == backfill.name))
+        checkpoint = load_checkpoint(connection, backfill.name)
+        if checkpoint["finished_at"] is not None:
+            return checkpoint
+        after = checkpoint["last_key"]
+        total = checkpoint["rows_done"] + connection.execute(
+            select(func.count()).select_from(backfill.remaining(after).subquery())
+        ).scalar()
+
+    done, started, reported = checkpoint["rows_done"], time.monotonic(), 0.0
+    done_at_start = reported_done = done
+    while True:
+        batch_started = time.monotonic()
+        # The batch and its checkpoint commit together, so a resume never skips or repeats rows
+        with engine.begin() as connection:
+            upper = backfill.next_upper(connection, after, batch_size)
+            if upper is None:
+                connection.execute(checkpoints.update().where(checkpoints.c.name == backfill.name).values(
+                    finished_at=datetime.utcnow()
+                ))
+                break
+            done += connection.execute(backfill.statement(after, upper)).rowcount
+            connection.execute(checkpoints.update().where(checkpoints.c.name == backfill.name).values(
+                last_key=upper, rows_done=done
+            ))
+        after = upper
+        now = time.monotonic()
+        if now - reported >= MIGRATION_PROGRESS_SECONDS:
+            progress(backfill.name, done, total, (done - done_at_start) / max(now - started, 1e-9))
+            reported, reported_done = now, done
+        time.sleep((now - batch_started) * throttle)
+
+    if done != reported_done:
+        elapsed = time.monotonic() - started
+        progress(backfill.name, done, max(total, done), (done - done_at_start) / max(elapsed, 1e-9))
+    with engine.connect() as connection:
+        return load_checkpoint(connection, backfill.name)
+
+
+def estimate_backfill(engine: Engine, backfill: Backfill, batch_size: int = MIGRATION_BATCH_SIZE,
+                      throttle: float = MIGRATION_THROTTLE) -> dict:
+    """Rows left to backfill and how long that should take, timed on one batch that is rolled back."""
+    checkpoints.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        try:
+            row = connection.execute(select(checkpoints).where(checkpoints.c.name == backfill.name)).mappings().first()
+            after = row["last_key"] if row else None
+            rows = connection.execute(select(func.count()).select_from(backfill.remaining(after).subquery())).scalar()
+            started = time.perf_counter()
+            upper = backfill.next_upper(connection, after, batch_size)
+            sample = connection.execute(backfill.statement(after, upper)).rowcount if upper is not None else 0
+            sample_seconds = time.perf_counter() - started
+        finally:
+            connection.rollback()
+
+    seconds_per_row = sample_seconds / sample if sample else 0.0
+    return {
+        "backfill": backfill.name,
+        "database": describe(engine),
+        "resuming_after": after,
+        "rows": rows,
+        "batches": math.ceil(rows / batch_size),
+        "sample_rows": sample,
+        "sample_seconds": round(sample_seconds, 4),
+        "estimated_seconds": round(rows * seconds_per_row * (1 + throttle), 1),
+    }
+
+
+def find_index(name: str) -> Index:
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(name)
+
+
+def create_index_online(engine: Engine, index: Index, dry_run: bool = False) -> dict:
+    """Create a model's index if the database does not have it yet.
+
+    PostgreSQL builds it with CREATE INDEX CONCURRENTLY, which does not block
+    writes to the table. SQLite has no such option and blocks writers while
+    the index is built.
+    """
+    table = index.table
+    postgres = engine.dialect.name == "postgresql"
+    with engine.connect() as connection:
+        exists = index.name in {existing["name"] for existing in inspect(connection).get_indexes(table.name)}
+        invalid = False
+        if postgres and exists:
+            # An interrupted concurrent build leaves an index that is never used
+            invalid = connection.execute(text(
+                "SELECT NOT indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name"
+            ), {"name": index.name}).scalar() or False
+        rows = connection.execute(select(func.count()).select_from(table)).scalar()
+    result = {
+        "index": index.name,
+        "table": table.name,
+        "database": describe(engine),
+        "rows": rows,
+        "exists": exists and not invalid,
+        "method": "concurrently" if postgres else "blocking",
+    }
+    if dry_run or result["exists"]:
+        return result
+
+    started = time.perf_counter()
+    if postgres:
+        # CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if invalid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+            index.dialect_kwargs["postgresql_concurrently"] = True
+            try:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+            finally:
+                index.dialect_kwargs["postgresql_concurrently"] = False
+    else:
+        with engine.begin() as connection:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    result["exists"] = True
+    return result
+
+
+def rebuild_table(engine: Engine, table_name: str, dry_run: bool = False) -> dict:
+    """Recreate a SQLite table as its model defines it.
+
+    SQLite cannot ALTER a column's type or nullability or drop a constraint,
+    so Alembic's batch mode copies the table into a new one and swaps them,
+    in one transaction. Writers wait for it; the dry run times copying one
+    batch of rows to estimate for how long.
+    """
+    if engine.dialect.name != "sqlite":
+        raise ValueError("Only SQLite tables need rebuilding; write an Alembic revision for other databases")
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    table = Base.metadata.tables[table_name]
+    with engine.connect() as connection:
+        rows = connection.execute(select(func.count()).select_from(table)).scalar()
+        sample = min(rows, MIGRATION_BATCH_SIZE)
+        started = time.perf_counter()
+        connection.execute(text(
+            f'CREATE TEMP TABLE "_sample_{table_name}" AS SELECT * FROM "{table_name}" LIMIT :rows'
+        ), {"rows": sample})
+        sample_seconds = time.perf_counter() - started
+        # pysqlite commits DDL as it runs, so the copy is dropped rather than rolled back
+        connection.execute(text(f'DROP TABLE temp."_sample_{table_name}"'))
+        connection.commit()
+    result = {
+        "table": table_name,
+        "database": describe(engine),
+        "rows": rows,
+        # Copying the rows, then building the table's indexes again
+        "estimated_seconds": round(rows * sample_seconds / sample * 2, 1) if sample else 0.0,
+    }
+    if dry_run:
+        return result
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        operations = Operations(MigrationContext.configure(connection))
+        with operations.batch_alter_table(table_name, copy_from=table, recreate="always"):
+            pass
+        # Batch mode only carries over named indexes, not those of index=True columns
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def status(engine: Engine) -> List[dict]:
+    checkpoints.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        return [dict(row, database=describe(engine)) for row in
+                connection.execute(select(checkpoints).order_by(checkpoints.c.name)).mappings()]
+
+
+def main():
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="Run or resume a batched backfill")
+    backfill.add_argument("name", choices=sorted(BACKFILLS))
+    backfill.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    backfill.add_argument("--throttle", type=float, default=MIGRATION_THROTTLE)
+    backfill.add_argument("--restart", action="store_true", help="Start over instead of resuming")
+    backfill.add_argument("--dry-run", action="store_true", help="Estimate the rows and duration only")
+    index = commands.add_parser("index", help="Create a model's index without blocking writes (PostgreSQL)")
+    index.add_argument("name")
+    index.add_argument("--dry-run", action="store_true")
+    rebuild = commands.add_parser("rebuild", help="Recreate a SQLite table from its model")
+    rebuild.add_argument("table", choices=sorted(Base.metadata.tables))
+    rebuild.add_argument("--dry-run", action="store_true")
+    commands.add_parser("status", help="Show backfill checkpoints")
+    args = parser.parse_args()
+
+    results = []
+    if args.command == "backfill":
+        job = BACKFILLS[args.name]
+        for engine in target_engines(job.table.name):
+            if args.dry_run:
+                results.append(estimate_backfill(engine, job, args.batch_size, args.throttle))
+            else:
+                results.append(run_backfill(engine, job, args.batch_size, args.throttle, args.restart))
+    elif args.command == "index":
+        try:
+            target = find_index(args.name)
+        except KeyError:
+            parser.error(f"no model defines an index named {args.name}")
+        for engine in target_engines(target.table.name):
+            results.append(create_index_online(engine, target, args.dry_run))
+    elif args.command == "rebuild":
+        for engine in target_engines(args.table):
+            results.append(rebuild_table(engine, args.table, args.dry_run))
+    else:
+        from database import engine, shard_engines
+        for target in [engine, *shard_engines]:
+            results.extend(status(target))
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
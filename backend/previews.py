@@ -0,0 +1,93 @@
+import mimetypes
+import re
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24.3
+    except ImportError:
+        # Without PyMuPDF, PDFs get no text or preview
+        fitz = None
+
+PREVIEW_WIDTH = 320  # Pixels
+TEXT_LIMIT = 200_000  # Characters of extracted text kept per file
+
+TEXT_SUFFIXES = {".txt", ".md", ".csv", ".py", ".java", ".c", ".cpp", ".js", ".html", ".tex"}
+
+
+def extract_pdf(path: Path) -> dict:
+    if fitz is None:
+        return {"page_count": None, "text": None, "preview": None}
+
+    with fitz.open(str(path)) as doc:
+        parts = []
+        length = 0
+        for page in doc:
+            if length >= TEXT_LIMIT:
+                break
+            text = page.get_text()
+            parts.append(text)
+            length += len(text)
+
+        preview = None
+        if doc.page_count:
+            page = doc[0]
+            zoom = PREVIEW_WIDTH / page.rect.width
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            preview = pixmap.tobytes("png")
+
+        return {
+            "page_count": doc.page_count,
+            "text": "".join(parts)[:TEXT_LIMIT],
+            "preview": preview,
+        }
+
+
+def extract_docx(path: Path) -> dict:
+    # A DOCX file is a zip archive; the body text lives in word/document.xml
+    with zipfile.ZipFile(path) as archive:
+        xml = archive.read("word/document.xml").decode("utf-8", errors="replace")
+    xml = re.sub(r"</w:p>", "\n", xml)
+    text = re.sub(r"<[^>]+>", "", xml)
+    return {"page_count": None, "text": text[:TEXT_LIMIT], "preview": None}
+
+
+def extract_plain_text(path: Path) -> dict:
+    with path.open("r", encoding="utf-8", errors="replace") as f:
+        text = f.read(TEXT_LIMIT)
+    return {"page_count": None, "text": text, "preview": None}
+
+
+def is_pdf(path: Path) -> bool:
+    with path.open("rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def extract_file(path: Path) -> dict:
+    """Extract text, page count and a first-page preview from an uploaded file.
+
+    Returns a dict with ``content_type``, ``page_count``, ``text`` and
+    ``preview`` (PNG bytes); values that cannot be computed for the file type are None.
+    """
+    content_type: Optional[str] = mimetypes.guess_type(path.name)[0]
+    suffix = path.suffix.lower()
+
+    if is_pdf(path):
+        content_type = "application/pdf"
+        result = extract_pdf(path)
+    elif suffix == ".docx" and zipfile.is_zipfile(path):
+        result = extract_docx(path)
+    elif suffix in TEXT_SUFFIXES:
+        result = extract_plain_text(path)
+    else:
+        result = {"page_count": None, "text": None, "preview": None}
+
+    if result["text"]:
+        # PostgreSQL text columns cannot store NUL characters
+        result["text"] = result["text"].replace("\x00", "")
+    result["content_type"] = content_type
+    return result
@@ -0,0 +1,238 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import Context, ContextVar
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+import anyio
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Request profiling configuration (off unless one of the first two is set)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of requests profiled
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))  # Also keep profiles of requests slower than this
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "500"))
+PROFILING_ENABLED = PROFILE_SAMPLE_RATE > 0 or PROFILE_SLOW_MS > 0
+
+MAX_SAMPLES = 20000  # Per request, about 100 seconds at the default interval
+# Threads that never work on requests
+SKIPPED_THREADS = ("job-worker-", "request-profiler")
+# Top frames of threads waiting for work (idle thread pool workers, the event loop in select)
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get")}
+
+PROFILE_NAME = re.compile(r"^(\d{8}T\d{6}_\d{6})_(\d+)ms_(\d{3})\.collapsed$")
+ROUTE_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+# Longest first, so frames are labelled relative to the most specific sys.path entry
+PATH_PREFIXES = sorted((os.path.join(os.path.abspath(p), "") for p in sys.path if p), key=len, reverse=True)
+
+
+@lru_cache(maxsize=8192)
+def frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    # ";" separates frames in the collapsed format
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def frame_context(frame) -> Optional[Context]:
+    # Work for a request runs in (a copy of) its context: on the event loop one
+    # task step at a time, from asyncio's Handle._run, and in the threadpool from
+    # anyio's worker loop. Both hold that context in a local variable.
+    if frame.f_code.co_name not in ("_run", "run"):
+        return None
+    local = frame.f_locals
+    context = local.get("context", getattr(local.get("self"), "_context", None))
+    return context if isinstance(context, Context) else None
+
+
+def busy_stacks(skip_ident: int) -> List[Tuple[Optional["Profile"], str]]:
+    """Collapsed stacks ("root;...;leaf") of all threads that are doing something,
+    each with the profile of the request the thread is working for, if any."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = []
+    for ident, frame in sys._current_frames().items():
+        name = names.get(ident, "")
+        if ident == skip_ident or name.startswith(SKIPPED_THREADS) or is_idle(frame):
+            continue
+        labels = []
+        context = None
+        while frame is not None:
+            labels.append(frame_label(frame.f_code))
+            # The innermost context is the one the thread is running in
+            context = context or frame_context(frame)
+            frame = frame.f_back
+        labels.append(name.replace(";", ","))
+        stacks.append((context.get(current_profile) if context else None, ";".join(reversed(labels))))
+    return stacks
+
+
+class Profile:
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.samples = 0
+
+    def add(self, stacks: List[str]):
+        if self.samples < MAX_SAMPLES:
+            self.counts.update(stacks)
+            self.samples += 1
+
+
+# The profile of the request being handled, seen by everything that runs for it
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+
+class Sampler:
+    """One background thread that samples thread stacks while profiled requests are in flight.
+
+    Each request's profile gets the stacks of the threads that are working for
+    it (see busy_stacks), not those of requests running at the same time.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self.active: Set[Profile] = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self.lock:
+            self.active.add(profile)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def remove(self, profile: Profile):
+        with self.lock:
+            self.active.discard(profile)
+
+    def run(self):
+        ident = threading.get_ident()
+        while True:
+            self.wakeup.wait()
+            with self.lock:
+                if not self.active:
+                    self.wakeup.clear()
+                    continue
+                active = list(self.active)
+            stacks = defaultdict(list)
+            for profile, stack in busy_stacks(ident):
+                stacks[profile].append(stack)
+            for profile in active:
+                profile.add(stacks[profile])
+            time.sleep(self.interval)
+
+
+_sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def route_name(scope: Scope) -> str:
+    # GET /assignments/{assignment_id} -> GET_assignments_assignment_id
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return scope["method"] + "_" + (re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root")
+
+
+def write_profile(route: str, profile: Profile, duration_ms: float, status_code: int, directory: Path = PROFILE_DIR):
+    route_dir = directory / route
+    route_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S_%f")
+    path = route_dir / f"{stamp}_{int(duration_ms)}ms_{status_code}.collapsed"
+    # Collapsed stacks, one "frame;frame;... count" line each, as read by
+    # flamegraph.pl, speedscope and most other flame graph viewers
+    with path.open("w") as f:
+        for stack, count in profile.counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+    files = sorted(directory.glob("*/*.collapsed"), key=lambda p: p.stat().st_mtime)
+    for old in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        old.unlink(missing_ok=True)
+
+
+def list_profiles(directory: Path = PROFILE_DIR) -> List[dict]:
+    profiles = []
+    for path in directory.glob("*/*.collapsed"):
+        match = PROFILE_NAME.match(path.name)
+        if not match:
+            continue
+        stat = path.stat()
+        profiles.append({
+            "route": path.parent.name,
+            "name": path.name,
+            "duration_ms": int(match.group(2)),
+            "status_code": int(match.group(3)),
+            "size": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+        })
+    profiles.sort(key=lambda p: p["created_at"], reverse=True)
+    return profiles
+
+
+def profile_path(route: str, name: str, directory: Path = PROFILE_DIR) -> Optional[Path]:
+    # Both parts are checked, so they cannot point outside the directory
+    if not ROUTE_NAME.match(route) or not PROFILE_NAME.match(name):
+        return None
+    path = directory / route / name
+    return path if path.is_file() else None
+
+
+class ProfilerMiddleware:
+    """Samples where time goes inside requests and writes per-route collapsed stacks.
+
+    A PROFILE_SAMPLE_RATE fraction of requests is profiled, and any request
+    slower than PROFILE_SLOW_MS. For the latter every request has to be
+    sampled while it runs, and the profile is kept only if it was slow.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        sampled = scope["type"] == "http" and random.random() < self.sample_rate
+        if scope["type"] != "http" or not (sampled or self.slow_ms > 0):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        profile = Profile()
+        token = current_profile.set(profile)
+        _sampler.add(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _sampler.remove(profile)
+            current_profile.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            if profile.counts and (sampled or (self.slow_ms > 0 and duration_ms >= self.slow_ms)):
+                try:
+                    await anyio.to_thread.run_sync(write_profile, route_name(scope), profile, duration_ms, status_code)
+                except OSError:
+                    # The response has been sent; a full disk must not turn it into an error
+                    pass
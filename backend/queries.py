@@ -0,0 +1,53 @@
+from typing import Optional
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, joinedload, lazyload, load_only, selectinload
+
+from models import Assignment
+
+# Shared assignment statements. They are built once at import instead of on
+# every request, and always have the same shape, so SQLAlchemy compiles
+# each of them to SQL once and reuses that from its compiled cache.
+
+# Relationships serialized by AssignmentResponse
+ASSIGNMENT_LOADERS = (
+    joinedload(Assignment.student),
+    joinedload(Assignment.tutor),
+    joinedload(Assignment.subject),
+    selectinload(Assignment.artifacts),
+)
+
+# Everything a response needs
+ASSIGNMENT_DETAIL = select(Assignment).options(*ASSIGNMENT_LOADERS).where(
+    Assignment.id == bindparam("assignment_id")
+)
+
+# Write paths only read the ids and status before changing the row; the
+# other columns and relationships are not loaded (or joined) at all
+ASSIGNMENT_FOR_WRITE = select(Assignment).options(
+    load_only(Assignment.id, Assignment.student_id, Assignment.tutor_id, Assignment.status),
+    lazyload("*"),
+).where(Assignment.id == bindparam("assignment_id"))
+
+# Permission checks need two columns, not an Assignment object
+ASSIGNMENT_ACCESS = select(Assignment.id, Assignment.student_id, Assignment.tutor_id).where(
+    Assignment.id == bindparam("assignment_id")
+)
+
+
+def get_assignment_detail(db: Session, assignment_id: int, refresh: bool = False) -> Optional[Assignment]:
+    # refresh reloads an assignment this session has just changed, relationships included
+    return db.execute(
+        ASSIGNMENT_DETAIL, {"assignment_id": assignment_id},
+        execution_options={"populate_existing": refresh}
+    ).scalar_one_or_none()
+
+
+def get_assignment_for_write(db: Session, assignment_id: int) -> Optional[Assignment]:
+    return db.execute(ASSIGNMENT_FOR_WRITE, {"assignment_id": assignment_id}).scalar_one_or_none()
+
+
+def get_assignment_access(db: Session, assignment_id: int) -> Optional[Row]:
+    """(id, student_id, tutor_id) of an assignment, or None if it does not exist."""
+    return db.execute(ASSIGNMENT_ACCESS, {"assignment_id": assignment_id}).one_or_none()
@@ -0,0 +1,150 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+# Token buckets: "<burst>/<seconds>" allows a burst of requests that refills over the period.
+# A whole class behind one school NAT shares an IP, so the per-IP limits leave room for
+# everyone signing in (or up) at once, and the burst itself is capped by the password
+# hashing limit below. The email limit counts failed logins per IP and account: it stops
+# guessing at one account from one address, and nobody can lock the owner out by failing
+# on purpose from another address (guessing from many is slowed by the per-IP limit).
+LOGIN_IP_LIMIT = os.getenv("LOGIN_IP_LIMIT", "300/60")
+LOGIN_EMAIL_LIMIT = os.getenv("LOGIN_EMAIL_LIMIT", "5/60")
+REGISTER_IP_LIMIT = os.getenv("REGISTER_IP_LIMIT", "100/600")
+
+# Password hashing is CPU-bound; cap how many run at once and how many may wait
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", str(PASSWORD_HASH_CONCURRENCY * 4)))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "2"))
+
+# Only trust X-Forwarded-For when running behind a proxy that sets it. Clients can
+# put anything in the header themselves, so the address used is the one appended by
+# our own proxies: TRUSTED_PROXY_HOPS entries from the right (1 for a single proxy).
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+# Buckets that have refilled are dropped once this many keys are tracked
+MAX_TRACKED_KEYS = 100000
+
+
+def parse_limit(value: str) -> Tuple[int, float]:
+    burst, _, seconds = value.partition("/")
+    return int(burst), float(seconds or 60)
+
+
+class TokenBucket:
+    """In-memory token buckets keyed by client, e.g. an IP address or an email."""
+
+    def __init__(self, burst: int, period_seconds: float):
+        self.burst = burst
+        self.rate = burst / period_seconds  # tokens per second
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_setting(cls, value: str) -> "TokenBucket":
+        return cls(*parse_limit(value))
+
+    def take(self, key: str, now: Optional[float] = None, consume: bool = True) -> float:
+        """Take a token for ``key``. Returns 0 if allowed, else seconds until one is available.
+
+        With ``consume=False`` only checks that a token is available.
+        """
+        if self.burst <= 0:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            if not consume:
+                return 0
+            self.buckets[key] = (tokens - 1, now)
+            if len(self.buckets) > MAX_TRACKED_KEYS:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now: float):
+        full_after = self.burst / self.rate
+        self.buckets = {
+            key: value for key, value in self.buckets.items() if now - value[1] < full_after
+        }
+
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded wait queue and a wait timeout."""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self.condition:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                if not self.condition.wait_for(lambda: self.active < self.limit, self.timeout):
+                    return False
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+
+login_ip_bucket = TokenBucket.from_setting(LOGIN_IP_LIMIT)
+login_email_bucket = TokenBucket.from_setting(LOGIN_EMAIL_LIMIT)
+register_ip_bucket = TokenBucket.from_setting(REGISTER_IP_LIMIT)
+password_limiter = ConcurrencyLimiter(PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_QUEUE, PASSWORD_HASH_WAIT_SECONDS)
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def check_rate(bucket: TokenBucket, key: str, consume: bool = True):
+    retry_after = bucket.take(key, consume=consume)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+
+@contextmanager
+def password_slot():
+    # Fail fast when the server is saturated instead of queuing without bound
+    if not password_limiter.acquire():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        yield
+    finally:
+        password_limiter.release()
@@ -0,0 +1,255 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from models import UploadSession, UploadChunk, StoredFile, User
+from storage import UPLOAD_DIR, CHUNK_SIZE, MAX_UPLOAD_SIZE, get_storage, save_upload
+
+# Resumable upload configuration
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+MAX_CHUNK_SIZE = int(os.getenv("MAX_CHUNK_SIZE", str(16 * 1024 * 1024)))
+
+# Chunks are stored as separate objects until the upload is finalized
+SESSION_DIR = UPLOAD_DIR / ".sessions"
+
+# Digest algorithms accepted in the Upload-Checksum header
+CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def create_session(db: Session, user: User, purpose: str, filename: str,
+                   total_size: int, content_type: Optional[str] = None) -> UploadSession:
+    if total_size <= 0 or total_size > MAX_UPLOAD_SIZE:
+        raise UploadError(413, f"Upload size must be between 1 and {MAX_UPLOAD_SIZE} bytes")
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        purpose=purpose,
+        filename=Path(filename).name,
+        content_type=content_type,
+        total_size=total_size,
+        expires_at=datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS),
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def chunk_key(session_id: str, offset: int) -> str:
+    # Zero-padded so that keys sort in offset order
+    return str(SESSION_DIR / session_id / f"{offset:015d}")
+
+
+def received_ranges(chunks: List[UploadChunk]) -> List[Tuple[int, int]]:
+    """Merge the stored chunks into sorted, non-overlapping [start, end) ranges."""
+    ranges: List[Tuple[int, int]] = []
+    for chunk in sorted(chunks, key=lambda c: c.offset):
+        end = chunk.offset + chunk.size
+        if ranges and chunk.offset <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((chunk.offset, end))
+    return ranges
+
+
+def contiguous_offset(chunks: List[UploadChunk]) -> int:
+    # The tus Upload-Offset: everything before it has been received
+    ranges = received_ranges(chunks)
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def parse_checksum(header: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    # tus checksum extension: "Upload-Checksum: sha256 <base64 digest>"
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(400, f"Unsupported checksum algorithm '{algorithm}'")
+    try:
+        return algorithm, base64.b64decode(encoded.strip(), validate=True)
+    except ValueError:
+        raise UploadError(400, "Malformed Upload-Checksum header")
+
+
+def lock_session(db: Session, session: UploadSession):
+    """Serialize the writes to one upload session until ``db`` commits.
+
+    The UPDATE takes the session's row lock (PostgreSQL) or the database write
+    lock (SQLite), and the session and its chunks are then re-read, so checks
+    made afterwards see every chunk committed by a concurrent request.
+    """
+    db.execute(update(UploadSession).where(UploadSession.id == session.id).values(updated_at=datetime.utcnow()))
+    db.refresh(session)
+    db.expire(session, ["chunks"])
+
+
+async def write_chunk(db: Session, session: UploadSession, offset: int,
+                      body: AsyncIterator[bytes], checksum_header: Optional[str] = None) -> UploadChunk:
+    """Store one chunk of an upload, verifying its size and checksum as it streams in.
+
+    The body is spooled to a temporary file as it arrives; that and the
+    storage and database calls (store_chunk) run in the threadpool.
+    """
+    if session.completed_at is not None:
+        raise UploadError(409, "Upload has already been finalized")
+    if offset < 0 or offset >= session.total_size:
+        raise UploadError(409, "Offset is outside the upload")
+
+    expected = parse_checksum(checksum_header)
+    digest = hashlib.sha256()
+    check = hashlib.new(expected[0]) if expected and expected[0] != "sha256" else None
+    size = 0
+    limit = min(MAX_CHUNK_SIZE, session.total_size - offset)
+
+    def absorb(data: bytes):
+        spool.write(data)
+        digest.update(data)
+        if check:
+            check.update(data)
+
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE) as spool:
+        async for data in body:
+            size += len(data)
+            if size > limit:
+                raise UploadError(413, f"Chunk exceeds {limit} bytes")
+            await run_in_threadpool(absorb, data)
+        if size == 0:
+            raise UploadError(400, "Empty chunk")
+        if expected and (check or digest).digest() != expected[1]:
+            raise UploadError(460, "Checksum mismatch")
+        spool.seek(0)
+        return await run_in_threadpool(store_chunk, db, session, offset, spool, size, digest.hexdigest())
+
+
+def store_chunk(db: Session, session: UploadSession, offset: int, src: BinaryIO,
+                size: int, checksum: str) -> UploadChunk:
+    """Record a verified chunk. Re-sending a chunk at the same offset replaces it.
+
+    Each attempt is written under its own key, so parallel uploads of the same
+    chunk cannot mix their bytes; the one that is recorded is moved into place.
+    """
+    storage = get_storage()
+    attempt = f"{chunk_key(session.id, offset)}.{uuid.uuid4().hex}"
+    with storage.open_write(attempt) as dest:
+        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+    try:
+        lock_session(db, session)
+        if session.completed_at is not None:
+            raise UploadError(409, "Upload has already been finalized")
+        existing = next((chunk for chunk in session.chunks if chunk.offset == offset), None)
+        for chunk in session.chunks:
+            if chunk is not existing and chunk.offset < offset + size and offset < chunk.offset + chunk.size:
+                raise UploadError(409, f"Chunk at offset {offset} overlaps an uploaded chunk")
+        storage.move(attempt, chunk_key(session.id, offset))
+        if existing is None:
+            existing = UploadChunk(session_id=session.id, offset=offset)
+            db.add(existing)
+        existing.size = size
+        existing.checksum = checksum
+        db.commit()
+    except BaseException:
+        db.rollback()
+        storage.delete(attempt)
+        raise
+    return existing
+
+
+class ChunkReader:
+    """File-like reader over the chunks of a completed upload, in offset order."""
+
+    def __init__(self, keys: List[str]):
+        self.keys = list(keys)
+        self.current = None
+        self.storage = get_storage()
+
+    def read(self, size: int = -1) -> bytes:
+        size = CHUNK_SIZE if size is None or size < 0 else size
+        while True:
+            if self.current is None:
+                if not self.keys:
+                    return b""
+                self.current = self.storage.open_read(self.keys.pop(0))
+            data = self.current.read(size)
+            if data:
+                return data
+            self.current.close()
+            self.current = None
+
+
+def get_user_session(db: Session, session_id: str, user: User) -> UploadSession:
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if session is None or session.user_id != user.id:
+        raise UploadError(404, f"Upload {session_id} not found")
+    if session.completed_at is None and session.expires_at < datetime.utcnow():
+        raise UploadError(410, f"Upload {session_id} has expired")
+    return session
+
+
+def consume_session(db: Session, session_id: str, user: User, purpose: str,
+                    directory: Path, prefix: str = "") -> StoredFile:
+    """Assemble a completed upload into ``directory`` as ``<prefix><filename>``.
+
+    Like save_upload, the StoredFile row is added to ``db`` without
+    committing, so the file is attached in the caller's transaction.
+    """
+    session = get_user_session(db, session_id, user)
+    if session.purpose != purpose:
+        raise UploadError(400, f"Upload {session_id} is not a {purpose} upload")
+    if session.completed_at is not None:
+        raise UploadError(409, f"Upload {session_id} has already been used")
+    # Covered from start to end, and without overlaps (which would add bytes)
+    chunks = [(chunk.offset, chunk.size, chunk.checksum) for chunk in session.chunks]
+    if contiguous_offset(session.chunks) != session.total_size or \
+            sum(size for _, size, _ in chunks) != session.total_size:
+        raise UploadError(409, f"Upload {session_id} is incomplete")
+
+    reader = ChunkReader([chunk_key(session.id, offset) for offset, _, _ in chunks])
+    stored = save_upload(db, reader, directory / f"{prefix}{session.filename}")
+
+    # Only locked now, so that other requests are not held up while the file is
+    # assembled; a chunk replaced in the meantime means it has to be done again
+    lock_session(db, session)
+    if session.completed_at is not None:
+        raise UploadError(409, f"Upload {session_id} has already been used")
+    if [(chunk.offset, chunk.size, chunk.checksum) for chunk in session.chunks] != chunks:
+        raise UploadError(409, f"Upload {session_id} changed while it was being assembled")
+    session.completed_at = datetime.utcnow()
+    return stored
+
+
+def discard_session(db: Session, session: UploadSession):
+    # Listed rather than derived from the chunks, to include attempts left by failed requests
+    storage = get_storage()
+    for key, _, _ in list(storage.iter_keys(str(SESSION_DIR / session.id))):
+        storage.delete(key)
+    db.delete(session)
+
+
+def collect_sessions(db: Session, now: Optional[datetime] = None) -> int:
+    """Delete the chunks of finalized and abandoned (expired) upload sessions."""
+    now = now or datetime.utcnow()
+    sessions = db.query(UploadSession).filter(
+        (UploadSession.completed_at.isnot(None)) | (UploadSession.expires_at < now)
+    ).limit(500).all()
+    for session in sessions:
+        discard_session(db, session)
+    db.commit()
+    return len(sessions)
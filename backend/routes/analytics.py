@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, Query
+
+from models import User
+from schemas import TurnaroundAnalyticsResponse
+from auth import get_admin_user
+from analytics import turnaround_analytics
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"]
+)
+
+@router.get("/turnaround", response_model=TurnaroundAnalyticsResponse)
+def get_turnaround_analytics(
+    weeks: int = Query(12, ge=1, le=104),
+    current_user: User = Depends(get_admin_user)
+):
+    # Served from a cache that is refreshed in the background; computed_at tells how fresh it is
+    result = turnaround_analytics.report()
+    return dict(result, throughput=result["throughput"][-weeks:])
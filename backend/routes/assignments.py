@@ -1,15 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from sqlalchemy import literal, select
+from sqlalchemy.orm import Session, aliased, joinedload
 from typing import List, Optional
 from datetime import datetime
-import shutil
+from functools import partial
 import os
 from pathlib import Path
 
-from database import get_db
-from models import Assignment, User, UserRole, AssignmentStatus, Subject
-from schemas import AssignmentCreate, AssignmentResponse, AssignmentAssign, AssignmentUpdate
+from database import get_db, get_read_db
+from models import Assignment, ArchivedAssignment, User, UserRole, AssignmentStatus, Subject, FileArtifact
+from schemas import (
+    AssignmentCreate, AssignmentResponse, AssignmentAssign, AssignmentUpdate, FileTextResponse,
+    AssignmentChangesResponse, AssignmentSort
+)
 from auth import get_current_user, get_admin_user, get_tutor_user, get_student_user
+from jobs import enqueue
+from storage import save_upload, register_upload, get_stored_file
+from resumable import UploadError, consume_session
+from changes import record_change, changes_since, settled_cursor
+from archive import get_archived_assignment
+from rowstream import ExportFormat, stream_rows
+from queries import ASSIGNMENT_LOADERS, get_assignment_access, get_assignment_detail, get_assignment_for_write
+from sharding import count_rows, fetch_page
+from singleflight import coalesced_response
 
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = Path("uploads")
@@ -20,13 +33,45 @@ router = APIRouter(
     tags=["assignments"]
 )
 
+def attach_direct_upload(db: Session, file_key: str, user_dir: Path) -> str:
+    # A file uploaded straight to storage through a presigned URL from /files/presign
+    if not file_key.startswith(str(user_dir) + "/") or ".." in file_key:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="File key does not belong to you"
+        )
+    if get_stored_file(db, file_key):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File has already been attached"
+        )
+    if not register_upload(db, file_key):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No file has been uploaded for this key"
+        )
+    return file_key
+
+def attach_resumable_upload(db: Session, upload_id: str, user: User, purpose: str,
+                            user_dir: Path, prefix: str) -> str:
+    # A file uploaded in chunks through /upload-sessions
+    try:
+        stored = consume_session(db, upload_id, user, purpose, user_dir, prefix)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    return stored.path
+
+# Not async: storing an upload (or assembling a resumable one) reads and compresses
+# the whole file, which has to happen in the threadpool rather than on the event loop
 @router.post("/", response_model=AssignmentResponse, status_code=status.HTTP_201_CREATED)
-async def create_assignment(
+def create_assignment(
     title: str = Form(...),
     description: Optional[str] = Form(None),
     submission_text: Optional[str] = Form(None),
     subject_id: int = Form(...),
     file: Optional[UploadFile] = File(None),
+    file_key: Optional[str] = Form(None),
+    upload_id: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_student_user)
 ):
@@ -55,53 +100,91 @@ async def create_assignment(
         status=AssignmentStatus.SUBMITTED
     )
     
+    student_dir = UPLOAD_DIR / f"student_{current_user.id}"
+    
     # Handle file upload if provided
     if file:
-        # Create student directory if it doesn't exist
-        student_dir = UPLOAD_DIR / f"student_{current_user.id}"
-        student_dir.mkdir(exist_ok=True)
-        
         # Save the file
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         filename = f"{timestamp}_{file.filename}"
         file_path = student_dir / filename
         
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        save_upload(db, file.file, file_path)
         
         # Save the file path in the database
         db_assignment.file_path = str(file_path)
+    elif file_key:
+        db_assignment.file_path = attach_direct_upload(db, file_key, student_dir)
+    elif upload_id:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        db_assignment.file_path = attach_resumable_upload(
+            db, upload_id, current_user, "submission", student_dir, f"{timestamp}_"
+        )
     
-    # Save assignment to database
+    # Save assignment to database, queueing follow-up processing in the same transaction
     db.add(db_assignment)
+    if db_assignment.file_path:
+        enqueue(db, "checksum", {"field": "file_path"}, assignment=db_assignment)
+        enqueue(db, "extract", {"field": "file_path"}, assignment=db_assignment)
+    elif db_assignment.submission_text:
+        # With a file, this is queued once its text has been extracted
+        enqueue(db, "similarity", assignment=db_assignment)
+    record_change(db, db_assignment, "created")
     db.commit()
-    db.refresh(db_assignment)
     
     # Load relationships for response
-    db.refresh(db_assignment)
-    return db_assignment
+    return get_assignment_detail(db, db_assignment.id, refresh=True)
+
+EXPORT_COLUMNS = [
+    "id", "title", "description", "status", "student_id", "student_name", "student_email",
+    "tutor_id", "tutor_name", "subject_id", "subject_name", "file_path", "solution_file_path",
+    "file_checksum", "solution_checksum", "created_at", "updated_at", "returned_at", "archived",
+]
+
+def export_statement(model, current_user: User, assignment_status: Optional[AssignmentStatus]):
+    # Flat rows of Assignment or ArchivedAssignment, with the same role filtering as the list
+    student, tutor = aliased(User), aliased(User)
+    statement = select(
+        model.id, model.title, model.description, model.status,
+        model.student_id, student.name.label("student_name"), student.email.label("student_email"),
+        model.tutor_id, tutor.name.label("tutor_name"),
+        model.subject_id, Subject.name.label("subject_name"),
+        model.file_path, model.solution_file_path, model.file_checksum, model.solution_checksum,
+        model.created_at, model.updated_at, model.returned_at,
+        literal(model is ArchivedAssignment).label("archived"),
+    ).join(student, model.student_id == student.id).outerjoin(
+        tutor, model.tutor_id == tutor.id
+    ).join(Subject, model.subject_id == Subject.id)
+    if current_user.role == UserRole.STUDENT:
+        statement = statement.where(model.student_id == current_user.id)
+    elif current_user.role == UserRole.TUTOR:
+        statement = statement.where(model.tutor_id == current_user.id)
+    if assignment_status:
+        statement = statement.where(model.status == assignment_status)
+    return statement.order_by(model.id)
+
+def activity_key(assignment: Assignment):
+    # The order of the activity sort, for merging pages from several shards
+    return (assignment.last_activity_at or datetime.min, assignment.id)
+
+def list_assignments(
+    db: Session,
+    current_user: User,
+    response: Response,
+    skip: int,
+    limit: int,
+    after: Optional[int],
+    status: Optional[AssignmentStatus],
+    sort: AssignmentSort,
+    active_since: Optional[datetime],
+    include_archived: bool
+) -> list:
+    # One page of the assignments current_user can see, for get_assignments
+    # Cursor for GET /assignments/changes, read before the list so nothing is missed
+    response.headers["X-Change-Cursor"] = str(settled_cursor(db))
 
-@router.get("/", response_model=List[AssignmentResponse])
-def get_assignments(
-    skip: int = 0,
-    limit: int = 100,
-    status: Optional[AssignmentStatus] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    # Make sure current_user is a valid User object
-    if not isinstance(current_user, User):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required"
-        )
-    
     # Filter assignments based on user role
-    query = db.query(Assignment).options(
-        joinedload(Assignment.student),
-        joinedload(Assignment.tutor),
-        joinedload(Assignment.subject)
-    )
+    query = db.query(Assignment).options(*ASSIGNMENT_LOADERS)
     
     if current_user.role == UserRole.STUDENT:
         # Students can only see their own assignments
@@ -114,15 +197,129 @@ def get_assignments(
     # Filter by status if provided
     if status:
         query = query.filter(Assignment.status == status)
+    if active_since:
+        query = query.filter(Assignment.last_activity_at >= active_since)
     
-    # Paginate results
-    assignments = query.offset(skip).limit(limit).all()
+    # Paginate results: most recently active first, or by id so that pages can also be
+    # read with a keyset cursor (pass the X-Next-Cursor of one page as ?after= for the next)
+    if sort == AssignmentSort.ACTIVITY:
+        if after is not None:
+            raise HTTPException(
+                status_code=400,  # fastapi.status is shadowed by the status parameter here
+                detail="after can only be used when sorting by id"
+            )
+        query = query.order_by(Assignment.last_activity_at.desc(), Assignment.id.desc())
+        page = partial(fetch_page, query, key=activity_key, reverse=True)
+    else:
+        query = query.order_by(Assignment.id)
+        if after is not None:
+            query = query.filter(Assignment.id > after)
+        page = partial(fetch_page, query)
+    if not include_archived:
+        assignments = page(skip, limit)
+        if sort == AssignmentSort.ID and len(assignments) == limit:
+            response.headers["X-Next-Cursor"] = str(assignments[-1].id)
+        return assignments
+
+    # Archived assignments are listed after the current ones
+    hot_count = count_rows(db, query.statement)
+    assignments = page(skip, limit) if skip < hot_count else []
+    if len(assignments) < limit:
+        archived = db.query(ArchivedAssignment).options(
+            joinedload(ArchivedAssignment.student),
+            joinedload(ArchivedAssignment.tutor),
+            joinedload(ArchivedAssignment.subject)
+        )
+        if current_user.role == UserRole.STUDENT:
+            archived = archived.filter(ArchivedAssignment.student_id == current_user.id)
+        elif current_user.role == UserRole.TUTOR:
+            archived = archived.filter(ArchivedAssignment.tutor_id == current_user.id)
+        if status:
+            archived = archived.filter(ArchivedAssignment.status == status)
+        if active_since:
+            archived = archived.filter(ArchivedAssignment.last_activity_at >= active_since)
+        assignments += archived.order_by(ArchivedAssignment.id).offset(max(skip - hot_count, 0)).limit(
+            limit - len(assignments)
+        ).all()
     return assignments
 
+@router.get("/", response_model=List[AssignmentResponse])
+def get_assignments(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[int] = Query(None, ge=0),
+    status: Optional[AssignmentStatus] = None,
+    sort: AssignmentSort = AssignmentSort.ID,
+    active_since: Optional[datetime] = None,
+    include_archived: bool = False,
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Make sure current_user is a valid User object
+    if not isinstance(current_user, User):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+    
+    if export_format:
+        # Every visible assignment, streamed instead of paged (skip and limit are ignored)
+        statements = [export_statement(Assignment, current_user, status)]
+        total = None
+        if include_archived:
+            statements.append(export_statement(ArchivedAssignment, current_user, status))
+        else:
+            # The archive job keeps the hot table small, so counting it is cheap; the archive is not
+            total = count_rows(db, statements[0])
+        return stream_rows(db, statements, EXPORT_COLUMNS, export_format, "assignments", total=total)
+    
+    # Identical lists requested at the same time are computed once (see singleflight.py);
+    # admins all see the same assignments, everyone else only their own
+    scope = (current_user.role, None if current_user.role == UserRole.ADMIN else current_user.id)
+    return coalesced_response(
+        request, "assignments", (scope, skip, limit, after, status, sort, active_since, include_archived),
+        List[AssignmentResponse],
+        lambda scratch: list_assignments(
+            db, current_user, scratch, skip, limit, after, status, sort, active_since, include_archived
+        )
+    )
+
+@router.get("/changes", response_model=AssignmentChangesResponse)
+def get_assignment_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Incremental sync: only the assignments that changed after the client's cursor
+    changes, cursor, has_more = changes_since(db, current_user, since, limit)
+
+    changed_ids = {change.assignment_id for change in changes}
+    assignments = []
+    if changed_ids:
+        query = db.query(Assignment).options(*ASSIGNMENT_LOADERS).filter(Assignment.id.in_(changed_ids))
+        if current_user.role == UserRole.STUDENT:
+            query = query.filter(Assignment.student_id == current_user.id)
+        elif current_user.role == UserRole.TUTOR:
+            query = query.filter(Assignment.tutor_id == current_user.id)
+        assignments = fetch_page(query.order_by(Assignment.id), 0, len(changed_ids))
+
+    visible_ids = {assignment.id for assignment in assignments}
+    return {
+        "cursor": cursor,
+        "has_more": has_more,
+        "changes": changes,
+        "assignments": assignments,
+        "removed": sorted(changed_ids - visible_ids),
+    }
+
 @router.get("/{assignment_id}", response_model=AssignmentResponse)
 def get_assignment(
     assignment_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     # Make sure current_user is a valid User object
@@ -133,11 +330,11 @@ def get_assignment(
         )
         
     # Get assignment with relationships
-    assignment = db.query(Assignment).options(
-        joinedload(Assignment.student),
-        joinedload(Assignment.tutor),
-        joinedload(Assignment.subject)
-    ).filter(Assignment.id == assignment_id).first()
+    assignment = get_assignment_detail(db, assignment_id)
+    
+    if not assignment:
+        # Assignments returned long ago live in the archive
+        assignment = get_archived_assignment(db, assignment_id)
     
     if not assignment:
         raise HTTPException(
@@ -153,6 +350,8 @@ def get_assignment(
             detail="You don't have permission to access this assignment"
         )
     
+    # Revalidated with an ETag, so repeat loads get a 304 (see compression.py)
+    response.headers["Cache-Control"] = "private, no-cache"
     return assignment
 
 @router.put("/{assignment_id}/assign", response_model=AssignmentResponse)
@@ -170,11 +369,7 @@ def assign_tutor(
         )
         
     # Check if assignment exists
-    assignment = db.query(Assignment).options(
-        joinedload(Assignment.student),
-        joinedload(Assignment.tutor),
-        joinedload(Assignment.subject)
-    ).filter(Assignment.id == assignment_id).first()
+    assignment = get_assignment_for_write(db, assignment_id)
     
     if not assignment:
         raise HTTPException(
@@ -195,12 +390,14 @@ def assign_tutor(
         )
     
     # Update assignment
+    previous_tutor_id = assignment.tutor_id
     assignment.tutor_id = assignment_data.tutor_id
     assignment.status = assignment_data.status
+    assignment.last_activity_at = datetime.utcnow()
+    record_change(db, assignment, "tutor_assigned", previous_tutor_id=previous_tutor_id)
     
     db.commit()
-    db.refresh(assignment)
-    return assignment
+    return get_assignment_detail(db, assignment_id, refresh=True)
 
 @router.put("/{assignment_id}/status", response_model=AssignmentResponse)
 def update_assignment_status(
@@ -217,11 +414,7 @@ def update_assignment_status(
         )
         
     # Check if assignment exists
-    assignment = db.query(Assignment).options(
-        joinedload(Assignment.student),
-        joinedload(Assignment.tutor),
-        joinedload(Assignment.subject)
-    ).filter(Assignment.id == assignment_id).first()
+    assignment = get_assignment_for_write(db, assignment_id)
     
     if not assignment:
         raise HTTPException(
@@ -237,25 +430,30 @@ def update_assignment_status(
         )
     
     # Update assignment status
+    now = datetime.utcnow()
+    assignment.last_activity_at = now
     if assignment_data.status:
         assignment.status = assignment_data.status
         
         # Set returned_at timestamp if status is RETURNED
         if assignment_data.status == AssignmentStatus.RETURNED:
-            assignment.returned_at = datetime.utcnow()
+            assignment.returned_at = now
     
     # Update description if provided
     if assignment_data.description:
         assignment.description = assignment_data.description
+    record_change(db, assignment, "status_changed")
     
     db.commit()
-    db.refresh(assignment)
-    return assignment
+    return get_assignment_detail(db, assignment_id, refresh=True)
 
+# Not async, like create_assignment
 @router.put("/{assignment_id}/solution", response_model=AssignmentResponse)
-async def upload_solution(
+def upload_solution(
     assignment_id: int,
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    file_key: Optional[str] = Form(None),
+    upload_id: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_tutor_user)
 ):
@@ -267,11 +465,7 @@ async def upload_solution(
         )
         
     # Check if assignment exists
-    assignment = db.query(Assignment).options(
-        joinedload(Assignment.student),
-        joinedload(Assignment.tutor),
-        joinedload(Assignment.subject)
-    ).filter(Assignment.id == assignment_id).first()
+    assignment = get_assignment_for_write(db, assignment_id)
     
     if not assignment:
         raise HTTPException(
@@ -286,25 +480,71 @@ async def upload_solution(
             detail="You don't have permission to update this assignment"
         )
     
-    # Create tutor directory if it doesn't exist
     tutor_dir = UPLOAD_DIR / f"tutor_{current_user.id}"
-    tutor_dir.mkdir(exist_ok=True)
-    
-    # Save the solution file
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = f"solution_{timestamp}_{file.filename}"
-    file_path = tutor_dir / filename
     
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    if file:
+        # Save the solution file
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename = f"solution_{timestamp}_{file.filename}"
+        file_path = str(tutor_dir / filename)
+        save_upload(db, file.file, tutor_dir / filename)
+    elif file_key:
+        file_path = attach_direct_upload(db, file_key, tutor_dir)
+    elif upload_id:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        file_path = attach_resumable_upload(
+            db, upload_id, current_user, "solution", tutor_dir, f"solution_{timestamp}_"
+        )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="One of file, file_key or upload_id is required"
+        )
     
     # Update the assignment with solution file path
-    assignment.solution_file_path = str(file_path)
+    assignment.solution_file_path = file_path
+    assignment.solution_checksum = None
+    enqueue(db, "checksum", {"field": "solution_file_path"}, assignment=assignment)
+    enqueue(db, "extract", {"field": "solution_file_path"}, assignment=assignment)
     
     # Update status to COMPLETED if it's not already RETURNED
     if assignment.status != AssignmentStatus.RETURNED:
         assignment.status = AssignmentStatus.COMPLETED
+    assignment.last_activity_at = datetime.utcnow()
+    record_change(db, assignment, "solution_uploaded")
     
     db.commit()
-    db.refresh(assignment)
-    return assignment
\ No newline at end of file
+    return get_assignment_detail(db, assignment_id, refresh=True)
+
+@router.get("/{assignment_id}/text", response_model=FileTextResponse)
+def get_assignment_file_text(
+    assignment_id: int,
+    field: str = "file_path",
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    assignment = get_assignment_access(db, assignment_id)
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Assignment with ID {assignment_id} not found"
+        )
+    
+    # Check permissions
+    if (current_user.role == UserRole.STUDENT and assignment.student_id != current_user.id) or \
+       (current_user.role == UserRole.TUTOR and assignment.tutor_id != current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to access this assignment"
+        )
+    
+    artifact = db.query(FileArtifact).filter(
+        FileArtifact.assignment_id == assignment_id,
+        FileArtifact.field == field
+    ).first()
+    if not artifact:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No extracted text available for this file yet"
+        )
+    return artifact
\ No newline at end of file
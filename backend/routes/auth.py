@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
@@ -9,12 +9,17 @@ from database import get_db
 from models import User, UserRole
 from schemas import UserCreate, UserResponse, Token
 from auth import authenticate_user, create_access_token, get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+from ratelimit import (
+    login_ip_bucket, login_email_bucket, register_ip_bucket, check_rate, client_ip, password_slot
+)
 
 router = APIRouter(tags=["authentication"])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+def register_user(user_data: UserCreate, request: Request, db: Session = Depends(get_db)):
+    check_rate(register_ip_bucket, client_ip(request))
+
     # Check if email already exists
     existing_user = db.query(User).filter(User.email == user_data.email).first()
     if existing_user:
@@ -25,7 +30,8 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     
     # Create new user
     try:
-        hashed_password = get_password_hash(user_data.password)
+        with password_slot():
+            hashed_password = get_password_hash(user_data.password)
         db_user = User(
             name=user_data.name,
             email=user_data.email,
@@ -48,11 +54,22 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
 @router.post("/token")
 def login_for_access_token(
     response: Response,  # Add this parameter
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # Limit by address, and failed attempts by address and account: a client
+    # cannot flood the password check or keep guessing at one account, and
+    # failing on purpose from elsewhere does not lock the account's owner out
+    ip = client_ip(request)
+    check_rate(login_ip_bucket, ip)
+    attempt_key = f"{ip} {form_data.username.strip().lower()}"
+    check_rate(login_email_bucket, attempt_key, consume=False)
+
+    with password_slot():
+        user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
+        login_email_bucket.take(attempt_key)
         return JSONResponse(
             status_code=status.HTTP_401_UNAUTHORIZED,
             content={"detail": "Incorrect email or password"},
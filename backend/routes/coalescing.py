@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from models import User
+from schemas import CoalescingResponse
+from auth import get_admin_user
+from singleflight import single_flight
+
+router = APIRouter(
+    prefix="/coalescing",
+    tags=["coalescing"]
+)
+
+@router.get("/", response_model=CoalescingResponse)
+def get_coalescing(
+    current_user: User = Depends(get_admin_user)
+):
+    # How many reads in this API process ran their queries, and how many shared another's result
+    return single_flight.report()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_coalescing_metrics(
+    current_user: User = Depends(get_admin_user)
+):
+    return single_flight.metrics()
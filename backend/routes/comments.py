@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session, joinedload
 from typing import List
+from datetime import datetime
 
-from database import get_db
-from models import Comment, Assignment, User, UserRole
+from database import get_db, get_read_db
+from models import Assignment, Comment, ArchivedComment, User, UserRole
 from schemas import CommentCreate, CommentResponse
 from auth import get_current_user
+from changes import record_change
+from archive import get_archived_assignment
+from queries import get_assignment_access, get_assignment_for_write
 
 router = APIRouter(
     prefix="/comments",
@@ -19,7 +24,7 @@ def create_comment(
     current_user: User = Depends(get_current_user)
 ):
     # Check if assignment exists
-    assignment = db.query(Assignment).filter(Assignment.id == comment_data.assignment_id).first()
+    assignment = get_assignment_for_write(db, comment_data.assignment_id)
     if not assignment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -40,13 +45,20 @@ def create_comment(
         )
     
     # Create new comment
+    now = datetime.utcnow()
     db_comment = Comment(
         text=comment_data.text,
         user_id=current_user.id,
-        assignment_id=comment_data.assignment_id
+        assignment_id=comment_data.assignment_id,
+        created_at=now
     )
     
     db.add(db_comment)
+    # The count is incremented in SQL, so concurrent comments are all counted
+    assignment.comment_count = Assignment.comment_count + 1
+    assignment.last_comment_at = now
+    assignment.last_activity_at = now
+    record_change(db, assignment, "comment_added")
     db.commit()
     db.refresh(db_comment)
     
@@ -60,11 +72,15 @@ def create_comment(
 @router.get("/assignment/{assignment_id}", response_model=List[CommentResponse])
 def get_assignment_comments(
     assignment_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Check if assignment exists
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    # Check if assignment exists, in the archive if it was returned long ago
+    assignment = get_assignment_access(db, assignment_id)
+    archived = False
+    if not assignment:
+        assignment = get_archived_assignment(db, assignment_id)
+        archived = assignment is not None
     if not assignment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -85,6 +101,11 @@ def get_assignment_comments(
         )
     
     # Get comments with user information
+    if archived:
+        return db.query(ArchivedComment).options(
+            joinedload(ArchivedComment.user)
+        ).filter(ArchivedComment.assignment_id == assignment_id).order_by(ArchivedComment.created_at).all()
+
     comments = db.query(Comment).options(
         joinedload(Comment.user)
     ).filter(Comment.assignment_id == assignment_id).order_by(Comment.created_at).all()
@@ -113,6 +134,14 @@ def delete_comment(
         )
     
     # Delete the comment
+    assignment = comment.assignment
     db.delete(comment)
+    assignment.comment_count = Assignment.comment_count - 1
+    assignment.last_comment_at = select(func.max(Comment.created_at)).where(
+        Comment.assignment_id == assignment.id,
+        Comment.id != comment.id
+    ).scalar_subquery()
+    assignment.last_activity_at = datetime.utcnow()
+    record_change(db, assignment, "comment_deleted")
     db.commit()
     return None
\ No newline at end of file
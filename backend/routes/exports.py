@@ -0,0 +1,158 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional
+from datetime import datetime
+from pathlib import PurePosixPath
+import hashlib
+import re
+
+from database import get_read_db
+from models import Assignment, AssignmentStatus, StoredFile, Subject, User, UserRole
+from auth import get_tutor_user
+from storage import get_storage, physical_key
+from zipstream import ZipEntry, ZipStream, ALREADY_COMPRESSED
+
+router = APIRouter(
+    prefix="/exports",
+    tags=["exports"]
+)
+
+def safe_name(value: str) -> str:
+    # Keep archive member names portable
+    return re.sub(r"[^\w.\- ]+", "_", value).strip() or "untitled"
+
+def build_entries(db: Session, rows, include_solutions: bool, deflate: bool) -> List[ZipEntry]:
+    files = []
+    for row in rows:
+        folder = f"{safe_name(row.subject_name)}/{row.id}_{safe_name(row.student_name)}"
+        if row.file_path:
+            files.append((f"{folder}/{safe_name(PurePosixPath(row.file_path).name)}", row.file_path, row.created_at))
+        if include_solutions and row.solution_file_path:
+            name = safe_name(PurePosixPath(row.solution_file_path).name)
+            files.append((f"{folder}/solution/{name}", row.solution_file_path, row.updated_at))
+
+    # Codec, size and CRC of every file in one query per batch
+    stored = {}
+    paths = [path for _, path, _ in files]
+    for i in range(0, len(paths), 500):
+        for record in db.query(StoredFile).filter(StoredFile.path.in_(paths[i:i + 500])):
+            stored[record.path] = (record.codec, record.original_size, record.crc32)
+
+    storage = get_storage()
+    entries = []
+    for name, path, modified in files:
+        codec, size, crc32 = stored.get(path, (None, None, None))
+        if size is None:
+            # Uploaded before sizes were recorded
+            size = storage.size(physical_key(path, codec))
+            if size is None:
+                continue
+        compressible = PurePosixPath(path).suffix.lower() not in ALREADY_COMPRESSED
+        entries.append(ZipEntry(
+            name, path, size, codec=codec, crc32=crc32, modified=modified,
+            # Files that were worth compressing at rest are worth deflating too
+            deflate=deflate and compressible and codec is not None
+        ))
+    return entries
+
+def parse_range(header: str, length: int):
+    # Single "bytes=start-end" ranges only, which is what download managers send
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if not match.group(1):
+        start = max(length - int(match.group(2)), 0)
+        end = length
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)) + 1, length) if match.group(2) else length
+    if start >= length or start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, end
+
+@router.get("/submissions.zip")
+def export_submissions(
+    tutor_id: Optional[int] = None,
+    subject_id: Optional[int] = None,
+    assignment_status: Optional[AssignmentStatus] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_solutions: bool = True,
+    compress: bool = True,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_tutor_user)
+):
+    # Tutors can only export the assignments assigned to them
+    if current_user.role == UserRole.TUTOR:
+        tutor_id = current_user.id
+
+    student = aliased(User)
+    query = db.query(
+        Assignment.id,
+        Assignment.file_path,
+        Assignment.solution_file_path,
+        Assignment.created_at,
+        Assignment.updated_at,
+        Subject.name.label("subject_name"),
+        student.name.label("student_name"),
+    ).join(Subject, Assignment.subject_id == Subject.id).join(student, Assignment.student_id == student.id)
+
+    if tutor_id is not None:
+        query = query.filter(Assignment.tutor_id == tutor_id)
+    if subject_id is not None:
+        query = query.filter(Assignment.subject_id == subject_id)
+    if assignment_status:
+        query = query.filter(Assignment.status == assignment_status)
+    if created_from:
+        query = query.filter(Assignment.created_at >= created_from)
+    if created_to:
+        query = query.filter(Assignment.created_at < created_to)
+
+    # Sorted again here because with sharding each shard returns its rows in turn
+    rows = sorted(query.order_by(Assignment.id).all(), key=lambda row: row.id)
+    entries = build_entries(db, rows, include_solutions, deflate=compress)
+
+    # Everything needed is in memory now; give the connection back to the pool
+    # instead of holding it while the archive streams
+    db.close()
+
+    archive = ZipStream(entries)
+    filename = f"submissions_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.zip"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if not archive.seekable:
+        # Deflated entries have unknown sizes, so the archive cannot be resumed
+        headers["Accept-Ranges"] = "none"
+        return StreamingResponse(iter(archive), media_type="application/zip", headers=headers)
+
+    # Resumed downloads must see the same bytes: the ETag covers the whole layout
+    fingerprint = hashlib.sha256()
+    for entry in entries:
+        fingerprint.update(f"{entry.name}\0{entry.path}\0{entry.size}\0{entry.modified}\n".encode())
+    etag = f'"{fingerprint.hexdigest()[:32]}"'
+    length = archive.content_length
+    headers.update({"Accept-Ranges": "bytes", "ETag": etag})
+
+    byte_range = None
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, length)
+    if byte_range is None:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(archive.iter_range(), media_type="application/zip", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start)
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{length}"
+    return StreamingResponse(
+        archive.iter_range(start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type="application/zip",
+        headers=headers
+    )
@@ -0,0 +1,203 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from datetime import datetime
+from pathlib import Path
+import os
+import tempfile
+from urllib.parse import urljoin
+
+from database import get_db, get_read_db
+from models import StorageUsage, User, UserRole
+from schemas import PresignedUploadRequest, PresignedUploadResponse, StorageUsageResponse, UploadPurpose
+from auth import get_current_user, get_admin_user
+from storage import (
+    UPLOAD_DIR, PRESIGNED_URL_EXPIRE_SECONDS, MAX_UPLOAD_SIZE, get_storage, get_stored_file,
+    physical_key, iter_original, accepts_encoding, verify_signature, owner_id
+)
+
+router = APIRouter(tags=["files"])
+
+def upload_prefix(user: User, purpose: UploadPurpose) -> str:
+    # Same layout as files uploaded through the API
+    if purpose == UploadPurpose.SOLUTION:
+        return str(UPLOAD_DIR / f"tutor_{user.id}") + "/"
+    return str(UPLOAD_DIR / f"student_{user.id}") + "/"
+
+@router.post("/files/presign", response_model=PresignedUploadResponse)
+def presign_upload(
+    upload: PresignedUploadRequest,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    if (upload.purpose == UploadPurpose.SUBMISSION and current_user.role == UserRole.TUTOR) or \
+       (upload.purpose == UploadPurpose.SOLUTION and current_user.role == UserRole.STUDENT):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not authorized to upload a {upload.purpose.value} file"
+        )
+
+    if upload.size is not None and not 0 < upload.size <= MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload size must be between 1 and {MAX_UPLOAD_SIZE} bytes"
+        )
+
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = Path(upload.filename).name
+    if upload.purpose == UploadPurpose.SOLUTION:
+        filename = f"solution_{timestamp}_{filename}"
+    else:
+        filename = f"{timestamp}_{filename}"
+    key = upload_prefix(current_user, upload.purpose) + filename
+
+    url = get_storage().presigned_put_url(key, content_type=upload.content_type, size=upload.size)
+    headers = {"Content-Type": upload.content_type} if upload.content_type else {}
+    if upload.size:
+        headers["Content-Length"] = str(upload.size)
+    return {
+        "file_key": key,
+        "upload_url": urljoin(str(request.base_url), url),
+        "method": "PUT",
+        "headers": headers,
+        "expires_in": PRESIGNED_URL_EXPIRE_SECONDS,
+    }
+
+@router.get("/files/usage", response_model=StorageUsageResponse)
+def get_storage_usage(
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_admin_user)
+):
+    # Counters change with each upload and deletion; the collect_orphaned_uploads job corrects any drift
+    users = db.query(StorageUsage).order_by(StorageUsage.total_bytes.desc()).all()
+    return {
+        "file_count": sum(usage.file_count for usage in users),
+        "total_bytes": sum(usage.total_bytes for usage in users),
+        "quarantined_bytes": sum(usage.quarantined_bytes for usage in users),
+        "updated_at": max((usage.updated_at for usage in users), default=None),
+        "users": users,
+    }
+
+def check_presigned(method: str, key: str, expires: int, signature: str, max_size: int = 0) -> Path:
+    # Presigned /storage URLs are only issued by the local storage backend
+    try:
+        local_path = get_storage().local_path(key)
+    except ValueError:
+        local_path = None
+    if local_path is None or not verify_signature(method, key, expires, signature, max_size):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired URL"
+        )
+    return local_path
+
+def too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"This URL accepts at most {max_size} bytes"
+    )
+
+def publish_upload(tmp_path: str, local_path: Path):
+    # A hard link fails if the file exists, so a URL cannot overwrite an earlier upload
+    try:
+        os.link(tmp_path, local_path)
+    except FileExistsError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A file was already uploaded to this URL"
+        )
+    finally:
+        os.unlink(tmp_path)
+
+@router.put("/storage/{key:path}", status_code=status.HTTP_200_OK)
+async def put_presigned(
+    key: str,
+    expires: int,
+    signature: str,
+    request: Request,
+    max_size: int = 0,
+    current_user: User = Depends(get_current_user)
+):
+    local_path = check_presigned("PUT", key, expires, signature, max_size)
+    if owner_id(key) != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This URL was issued to another user"
+        )
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > max_size:
+        raise too_large(max_size)
+
+    # Written next to the target in a thread (not on the event loop), and
+    # only put in place once complete and within max_size
+    await run_in_threadpool(local_path.parent.mkdir, parents=True, exist_ok=True)
+    fd, tmp_path = await run_in_threadpool(tempfile.mkstemp, dir=local_path.parent, prefix=".put-")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_size:
+                    raise too_large(max_size)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        await run_in_threadpool(os.unlink, tmp_path)
+        raise
+    await run_in_threadpool(publish_upload, tmp_path, local_path)
+    return {"file_key": key, "size": size}
+
+@router.get("/storage/{key:path}")
+def get_presigned(key: str, expires: int, signature: str):
+    local_path = check_presigned("GET", key, expires, signature)
+    if not local_path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    return FileResponse(local_path)
+
+@router.get("/uploads/{file_path:path}")
+def download_file(
+    file_path: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    path = str(UPLOAD_DIR / file_path)
+    storage = get_storage()
+
+    stored = get_stored_file(db, path)
+    codec = stored.codec if stored else None
+    key = physical_key(path, codec)
+    try:
+        if storage.size(key) is None:
+            raise ValueError(key)
+    except ValueError:
+        # Missing, or a key that resolves outside the uploads directory
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+
+    content_type = stored.content_type if stored else None
+    send_encoded = codec is not None and accepts_encoding(request.headers.get("accept-encoding", ""), codec)
+    headers = {"Vary": "Accept-Encoding"} if codec else {}
+
+    # Object stores serve the bytes themselves; the client is redirected there
+    # unless the file has to be decompressed for it
+    local_path = storage.local_path(key)
+    if local_path is None and (codec is None or send_encoded):
+        url = storage.presigned_get_url(key, content_type=content_type, content_encoding=codec)
+        return RedirectResponse(url, headers=headers)
+
+    # Files stored raw (and uploads from before compression) are served as-is
+    if not codec:
+        return FileResponse(local_path, media_type=content_type)
+
+    if send_encoded:
+        # Send the compressed bytes untouched and let the client decode them
+        headers["Content-Encoding"] = codec
+        return FileResponse(local_path, media_type=content_type, headers=headers)
+
+    headers["Content-Length"] = str(stored.original_size)
+    return StreamingResponse(iter_original(path, codec), media_type=content_type, headers=headers)
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+
+from database import get_db, get_read_db
+from models import Job, JobStatus, Assignment, User, UserRole
+from schemas import JobResponse
+from auth import get_current_user, get_admin_user
+from sharding import shard_ids
+from jobs import PERIODIC
+import tasks  # noqa: F401  (registers the job handlers, including the periodic ones)
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+def check_job_access(job: Job, current_user: User):
+    # Students and tutors only see jobs of assignments they can access
+    if current_user.role == UserRole.ADMIN:
+        return
+    assignment = job.assignment
+    if assignment is None or \
+       (current_user.role == UserRole.STUDENT and assignment.student_id != current_user.id) or \
+       (current_user.role == UserRole.TUTOR and assignment.tutor_id != current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to access this job"
+        )
+
+def visible_jobs(db: Session, query, criterion):
+    if not shard_ids:
+        return query.join(Job.assignment).filter(criterion)
+    # Jobs are in the directory and assignments on the shards, which cannot be
+    # joined: look up the ids of the assignments first
+    assignment_ids = [assignment_id for (assignment_id,) in db.query(Assignment.id).filter(criterion)]
+    return query.filter(Job.assignment_id.in_(assignment_ids))
+
+@router.get("/", response_model=List[JobResponse])
+def get_jobs(
+    skip: int = 0,
+    limit: int = 100,
+    assignment_id: Optional[int] = None,
+    job_status: Optional[JobStatus] = Query(None, alias="status"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    query = db.query(Job)
+
+    if current_user.role == UserRole.STUDENT:
+        query = visible_jobs(db, query, Assignment.student_id == current_user.id)
+    elif current_user.role == UserRole.TUTOR:
+        query = visible_jobs(db, query, Assignment.tutor_id == current_user.id)
+
+    if assignment_id is not None:
+        query = query.filter(Job.assignment_id == assignment_id)
+    if job_status:
+        query = query.filter(Job.status == job_status)
+
+    return query.order_by(Job.id.desc()).offset(skip).limit(limit).all()
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    check_job_access(job, current_user)
+    return job
+
+@router.post("/{job_id}/retry", response_model=JobResponse)
+def retry_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_admin_user)
+):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    if job.status != JobStatus.FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only failed jobs can be retried"
+        )
+    if job.kind in PERIODIC:
+        # Its next run was queued when it failed; retrying would start a second chain
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Periodic jobs are not retried: their next run is already queued"
+        )
+
+    # Give the job a fresh set of attempts
+    job.status = JobStatus.QUEUED
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+    return job
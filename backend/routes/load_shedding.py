@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from models import User
+from schemas import LoadSheddingResponse
+from auth import get_admin_user
+from loadshed import load_shedder
+
+# Not shed themselves (see loadshed.py), so they can be read during an overload
+router = APIRouter(
+    prefix="/load-shedding",
+    tags=["load-shedding"]
+)
+
+@router.get("/", response_model=LoadSheddingResponse)
+def get_load_shedding(
+    current_user: User = Depends(get_admin_user)
+):
+    # Requests being served and waiting in this API process, and how many were shed
+    return load_shedder.report()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_load_shedding_metrics(
+    current_user: User = Depends(get_admin_user)
+):
+    return load_shedder.metrics()
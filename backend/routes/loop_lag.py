@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from models import User
+from schemas import LoopLagResponse
+from auth import get_admin_user
+from loopmon import loop_monitor
+
+router = APIRouter(
+    prefix="/loop-lag",
+    tags=["loop-lag"]
+)
+
+@router.get("/", response_model=LoopLagResponse)
+def get_loop_lag(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_admin_user)
+):
+    # Lag of this API process's event loop, and what blocked it for longer than LOOP_STALL_THRESHOLD_MS
+    return loop_monitor.report(limit=limit)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_loop_lag_metrics(
+    current_user: User = Depends(get_admin_user)
+):
+    return loop_monitor.metrics()
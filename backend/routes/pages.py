@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+
+from database import get_read_db
+from models import Assignment, Comment, Subject, User, UserRole
+from schemas import AssignmentWorkspaceResponse, DashboardResponse
+from auth import get_current_user
+from changes import settled_cursor
+from archive import get_archived_assignment
+from queries import ASSIGNMENT_LOADERS, get_assignment_detail
+from sharding import fetch_page
+
+# Aggregate endpoints that return everything a page needs in one round trip,
+# with a single authentication check, instead of one request per widget
+router = APIRouter(tags=["pages"])
+
+def visible_assignments(query, user: User):
+    if user.role == UserRole.STUDENT:
+        return query.filter(Assignment.student_id == user.id)
+    if user.role == UserRole.TUTOR:
+        return query.filter(Assignment.tutor_id == user.id)
+    return query
+
+@router.get("/assignments/{assignment_id}/workspace", response_model=AssignmentWorkspaceResponse)
+def get_assignment_workspace(
+    assignment_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Data for the view and review pages: the assignment, its comments and the subject list
+    assignment = get_assignment_detail(db, assignment_id)
+    comments = None
+
+    if not assignment:
+        assignment = get_archived_assignment(db, assignment_id)
+        if assignment:
+            comments = assignment.comments
+
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Assignment with ID {assignment_id} not found"
+        )
+
+    if (current_user.role == UserRole.STUDENT and assignment.student_id != current_user.id) or \
+       (current_user.role == UserRole.TUTOR and assignment.tutor_id != current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to access this assignment"
+        )
+
+    if comments is None:
+        comments = db.query(Comment).options(joinedload(Comment.user)).filter(
+            Comment.assignment_id == assignment_id
+        ).order_by(Comment.created_at).all()
+
+    return {
+        "me": current_user,
+        "assignment": assignment,
+        "comments": comments,
+        "subjects": db.query(Subject).order_by(Subject.id).all(),
+    }
+
+@router.get("/dashboard", response_model=DashboardResponse)
+def get_dashboard(
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Read before the list, like GET /assignments, so the client can sync from here
+    change_cursor = settled_cursor(db)
+
+    assignments = fetch_page(visible_assignments(
+        db.query(Assignment).options(*ASSIGNMENT_LOADERS), current_user
+    ).order_by(Assignment.id), 0, limit)
+
+    # Added up, since each shard returns its own counts when sharding is on
+    status_counts = {}
+    for assignment_status, count in visible_assignments(
+        db.query(Assignment.status, func.count(Assignment.id)), current_user
+    ).group_by(Assignment.status):
+        status_counts[assignment_status] = status_counts.get(assignment_status, 0) + count
+
+    tutors = []
+    if current_user.role == UserRole.ADMIN:
+        tutors = db.query(User).filter(User.role == UserRole.TUTOR).order_by(User.id).all()
+
+    return {
+        "me": current_user,
+        "assignments": assignments,
+        "status_counts": status_counts,
+        "subjects": db.query(Subject).order_by(Subject.id).all(),
+        "tutors": tutors,
+        "change_cursor": change_cursor,
+    }
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from typing import List, Optional
+
+from models import User
+from schemas import ProfileResponse
+from auth import get_admin_user
+from profiler import list_profiles, profile_path
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["profiles"]
+)
+
+@router.get("/", response_model=List[ProfileResponse])
+def get_profiles(
+    route: Optional[str] = None,
+    limit: int = 100,
+    current_user: User = Depends(get_admin_user)
+):
+    # Newest first; written by ProfilerMiddleware when PROFILE_SAMPLE_RATE or PROFILE_SLOW_MS is set
+    profiles = list_profiles()
+    if route:
+        profiles = [profile for profile in profiles if profile["route"] == route]
+    return profiles[:limit]
+
+@router.get("/{route}/{name}")
+def download_profile(
+    route: str,
+    name: str,
+    current_user: User = Depends(get_admin_user)
+):
+    path = profile_path(route, name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, media_type="text/plain", filename=name)
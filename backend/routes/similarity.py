@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, joinedload
+from typing import List
+
+from database import get_read_db
+from models import Assignment, ArchivedAssignment, User, UserRole
+from schemas import SimilarSubmissionResponse
+from auth import get_current_user
+from archive import get_archived_assignment
+from similarity import SIMILARITY_THRESHOLD, find_similar
+
+router = APIRouter(tags=["similarity"])
+
+@router.get("/assignments/{assignment_id}/similar", response_model=List[SimilarSubmissionResponse])
+def get_similar_submissions(
+    assignment_id: int,
+    threshold: float = Query(SIMILARITY_THRESHOLD, ge=0, le=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    assignment = db.get(Assignment, assignment_id) or get_archived_assignment(db, assignment_id)
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Assignment with ID {assignment_id} not found"
+        )
+
+    # Other students' submissions are only shown to the assigned tutor and admins
+    if current_user.role == UserRole.STUDENT or \
+       (current_user.role == UserRole.TUTOR and assignment.tutor_id != current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the assigned tutor can compare this submission"
+        )
+
+    similar = find_similar(db, assignment_id, threshold=threshold, limit=limit)
+    if similar is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This submission has no text to compare yet"
+        )
+
+    ids = [other_id for other_id, _ in similar]
+    hot = {a.id: a for a in db.query(Assignment).options(joinedload(Assignment.student)).filter(Assignment.id.in_(ids))}
+    archived = {a.id: a for a in db.query(ArchivedAssignment).options(
+        joinedload(ArchivedAssignment.student)
+    ).filter(ArchivedAssignment.id.in_(ids))}
+
+    results = []
+    for other_id, score in similar:
+        other = hot.get(other_id) or archived.get(other_id)
+        if other is None:
+            # Deleted since it was indexed
+            continue
+        results.append({
+            "assignment_id": other_id,
+            "similarity": score,
+            "title": other.title,
+            "student": other.student,
+            "created_at": other.created_at,
+            "archived": other_id not in hot,
+        })
+    return results
@@ -0,0 +1,34 @@
+from enum import Enum
+from fastapi import APIRouter, Depends, Query, status
+from typing import List
+
+from models import User
+from schemas import SlowQueryResponse
+from auth import get_admin_user
+from slowlog import slow_query_log
+
+router = APIRouter(
+    prefix="/slow-queries",
+    tags=["slow-queries"]
+)
+
+class SlowQueryOrder(str, Enum):
+    TOTAL = "total_ms"
+    MEAN = "mean_ms"
+    MAX = "max_ms"
+    COUNT = "count"
+
+@router.get("/", response_model=List[SlowQueryResponse])
+def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: SlowQueryOrder = SlowQueryOrder.TOTAL,
+    current_user: User = Depends(get_admin_user)
+):
+    # Top statements slower than SLOW_QUERY_MS, since this API process started
+    return slow_query_log.report(limit=limit, order_by=order_by.value)
+
+@router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
+def reset_slow_queries(
+    current_user: User = Depends(get_admin_user)
+):
+    slow_query_log.reset()
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Subject, User
 from schemas import SubjectCreate, SubjectResponse
 from auth import get_admin_user, get_current_user
+from singleflight import coalesced_response
 
 router = APIRouter(
     prefix="/subjects",
@@ -35,18 +36,24 @@ def create_subject(
 
 @router.get("/", response_model=List[SubjectResponse])
 def get_all_subjects(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    subjects = db.query(Subject).offset(skip).limit(limit).all()
-    return subjects
+    def page(response: Response):
+        # Revalidated with an ETag, so repeat loads get a 304 (see compression.py)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return db.query(Subject).offset(skip).limit(limit).all()
+
+    # Every user sees the same subjects, so concurrent loads share one query (see singleflight.py)
+    return coalesced_response(request, "subjects", (skip, limit), List[SubjectResponse], page)
 
 @router.get("/{subject_id}", response_model=SubjectResponse)
 def get_subject(
     subject_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     subject = db.query(Subject).filter(Subject.id == subject_id).first()
@@ -0,0 +1,120 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, status
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from database import get_db
+from models import User, UserRole, UploadSession
+from schemas import UploadSessionCreate, UploadSessionResponse, UploadPurpose
+from auth import get_current_user
+from resumable import (
+    MAX_CHUNK_SIZE, UploadError, create_session, get_user_session, write_chunk,
+    received_ranges, contiguous_offset, discard_session
+)
+
+router = APIRouter(
+    prefix="/upload-sessions",
+    tags=["uploads"]
+)
+
+def to_http_error(exc: UploadError) -> HTTPException:
+    return HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+def session_response(session: UploadSession) -> dict:
+    return {
+        "id": session.id,
+        "purpose": session.purpose,
+        "filename": session.filename,
+        "content_type": session.content_type,
+        "total_size": session.total_size,
+        "offset": contiguous_offset(session.chunks),
+        "received": [list(r) for r in received_ranges(session.chunks)],
+        "max_chunk_size": MAX_CHUNK_SIZE,
+        "expires_at": session.expires_at,
+        "completed_at": session.completed_at,
+    }
+
+@router.post("/", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    upload: UploadSessionCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if (upload.purpose == UploadPurpose.SUBMISSION and current_user.role == UserRole.TUTOR) or \
+       (upload.purpose == UploadPurpose.SOLUTION and current_user.role == UserRole.STUDENT):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not authorized to upload a {upload.purpose.value} file"
+        )
+    try:
+        session = create_session(db, current_user, upload.purpose.value, upload.filename,
+                                 upload.size, upload.content_type)
+    except UploadError as exc:
+        raise to_http_error(exc)
+
+    response.headers["Location"] = f"{router.prefix}/{session.id}"
+    return session_response(session)
+
+@router.get("/{session_id}", response_model=UploadSessionResponse)
+def get_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        session = get_user_session(db, session_id, current_user)
+    except UploadError as exc:
+        raise to_http_error(exc)
+    return session_response(session)
+
+@router.head("/{session_id}")
+def get_upload_offset(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # tus-style offset query, used by clients to resume after a dropped connection
+    try:
+        session = get_user_session(db, session_id, current_user)
+    except UploadError as exc:
+        raise to_http_error(exc)
+    return Response(headers={
+        "Upload-Offset": str(contiguous_offset(session.chunks)),
+        "Upload-Length": str(session.total_size),
+        "Cache-Control": "no-store",
+    })
+
+@router.patch("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    upload_checksum: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Each chunk is sent with its byte offset, so chunks can be sent in parallel.
+    # Async only to stream the body: database and storage calls go to the threadpool.
+    try:
+        session = await run_in_threadpool(get_user_session, db, session_id, current_user)
+        await write_chunk(db, session, upload_offset, request.stream(), upload_checksum)
+    except UploadError as exc:
+        raise to_http_error(exc)
+
+    offset = await run_in_threadpool(lambda: contiguous_offset(session.chunks))
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        session = get_user_session(db, session_id, current_user)
+    except UploadError as exc:
+        raise to_http_error(exc)
+    discard_session(db, session)
+    db.commit()
+    return None
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from database import get_db
+from database import get_read_db
 from models import User, UserRole
 from schemas import UserResponse
 from auth import get_current_user, get_admin_user
+from rowstream import ExportFormat, stream_rows
+from singleflight import coalesced_response
 
 router = APIRouter(
     prefix="/users",
@@ -13,17 +16,31 @@ router = APIRouter(
 )
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return current_user
+def get_current_user_info(request: Request, current_user: User = Depends(get_current_user)):
+    # Apps load the profile from several places at startup; those calls share one response
+    return coalesced_response(request, "users_me", current_user.id, UserResponse, lambda response: current_user)
 
 @router.get("/", response_model=List[UserResponse])
 def get_users(
     skip: int = 0,
     limit: int = 100,
     role: Optional[UserRole] = None,
-    db: Session = Depends(get_db),
+    export_format: Optional[ExportFormat] = Query(None, alias="format"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_admin_user)
 ):
+    if export_format:
+        # Every matching user, streamed instead of paged (skip and limit are ignored)
+        statement = select(User.id, User.name, User.email, User.role, User.created_at).order_by(User.id)
+        count = select(func.count(User.id))
+        if role:
+            statement = statement.where(User.role == role)
+            count = count.where(User.role == role)
+        return stream_rows(
+            db, [statement], ["id", "name", "email", "role", "created_at"], export_format, "users",
+            total=db.execute(count).scalar()
+        )
+
     query = db.query(User)
     
     # Filter by role if provided
@@ -37,7 +54,7 @@ def get_users(
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     # Regular users can only view their own info, admins can view any user
@@ -58,7 +75,7 @@ def get_user(
 
 @router.get("/tutors/list", response_model=List[UserResponse])
 def get_all_tutors(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_admin_user)
 ):
     tutors = db.query(User).filter(User.role == UserRole.TUTOR).all()
@@ -0,0 +1,81 @@
+import csv
+import enum
+import io
+import json
+import os
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+# Rows fetched from the database cursor, and sent to the client, at a time
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+
+class ExportFormat(str, enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def iter_batches(db: Session, statements: list) -> Iterator[List[dict]]:
+    # yield_per streams from a server-side cursor on PostgreSQL, and the
+    # statements select columns rather than ORM objects, so memory stays flat
+    # however many rows there are
+    for statement in statements:
+        result = db.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for batch in result.mappings().partitions():
+            yield [{key: plain(value) for key, value in row.items()} for row in batch]
+
+
+def iter_ndjson(batches: Iterator[List[dict]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(json.dumps(row) + "\n" for row in batch)
+
+
+def iter_csv(batches: Iterator[List[dict]], columns: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Nothing but the header when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_rows(db: Session, statements: list, columns: List[str], export_format: ExportFormat,
+                name: str, total: Optional[int] = None) -> StreamingResponse:
+    """Stream the rows of ``statements``, one after the other, as NDJSON or CSV.
+
+    The rows are read while the response is sent, on the request's session,
+    which stays open until the response is complete.
+    """
+    batches = iter_batches(db, statements)
+    if export_format == ExportFormat.CSV:
+        body = iter_csv(batches, columns)
+    else:
+        body = iter_ndjson(batches)
+
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    headers = {"Content-Disposition": f'attachment; filename="{name}_{stamp}.{export_format.value}"'}
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[export_format], headers=headers)
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 from datetime import datetime
-from models import UserRole, AssignmentStatus
+from enum import Enum
+from models import UserRole, AssignmentStatus, JobStatus
 
 # User Schemas
 class UserBase(BaseModel):
@@ -38,6 +39,19 @@ class SubjectResponse(SubjectBase):
     class Config:
         orm_mode = True
 
+# File Artifact Schemas
+class FileArtifactResponse(BaseModel):
+    field: str
+    content_type: Optional[str] = None
+    page_count: Optional[int] = None
+    preview_path: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+class FileTextResponse(FileArtifactResponse):
+    text: Optional[str] = None
+
 # Assignment Schemas
 class AssignmentBase(BaseModel):
     title: str
@@ -55,6 +69,10 @@ class AssignmentUpdate(BaseModel):
     status: Optional[AssignmentStatus] = None
     description: Optional[str] = None
 
+class AssignmentSort(str, Enum):
+    ID = "id"
+    ACTIVITY = "activity"  # Most recently active first
+
 class AssignmentResponse(AssignmentBase):
     id: int
     file_path: Optional[str] = None
@@ -66,15 +84,101 @@ class AssignmentResponse(AssignmentBase):
     created_at: datetime
     updated_at: datetime
     returned_at: Optional[datetime] = None
+    file_checksum: Optional[str] = None
+    solution_checksum: Optional[str] = None
+    comment_count: int = 0
+    last_comment_at: Optional[datetime] = None
+    last_activity_at: Optional[datetime] = None
     
     # Include related data
     student: UserResponse
     tutor: Optional[UserResponse] = None
     subject: SubjectResponse
+    artifacts: List[FileArtifactResponse] = []
+
+    class Config:
+        orm_mode = True
+
+# Change Feed Schemas
+class AssignmentChangeResponse(BaseModel):
+    id: int
+    assignment_id: int
+    action: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class AssignmentChangesResponse(BaseModel):
+    cursor: int  # Pass as ?since= on the next sync
+    has_more: bool
+    changes: List[AssignmentChangeResponse]
+    assignments: List[AssignmentResponse]  # Current state of every changed assignment still visible
+    removed: List[int]  # Changed assignments that are no longer visible to the user
+
+# Similarity Schemas
+class SimilarSubmissionResponse(BaseModel):
+    assignment_id: int
+    similarity: float  # Estimated Jaccard similarity of the submitted text, 0 to 1
+    title: str
+    student: UserResponse
+    created_at: Optional[datetime] = None
+    archived: bool = False
+
+# Direct Upload Schemas
+class UploadPurpose(str, Enum):
+    SUBMISSION = "submission"
+    SOLUTION = "solution"
+
+class PresignedUploadRequest(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    size: Optional[int] = None  # In bytes, signed into the URL; without it the URL accepts up to MAX_UPLOAD_SIZE
+    purpose: UploadPurpose = UploadPurpose.SUBMISSION
+
+class PresignedUploadResponse(BaseModel):
+    file_key: str
+    upload_url: str
+    method: str = "PUT"
+    headers: dict = {}
+    expires_in: int
+
+# Resumable Upload Schemas
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+    purpose: UploadPurpose = UploadPurpose.SUBMISSION
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    purpose: UploadPurpose
+    filename: str
+    content_type: Optional[str] = None
+    total_size: int
+    offset: int  # Bytes received contiguously from the start of the file
+    received: List[List[int]]  # [start, end) byte ranges received so far
+    max_chunk_size: int
+    expires_at: datetime
+    completed_at: Optional[datetime] = None
+
+# Storage Usage Schemas
+class UserStorageUsage(BaseModel):
+    user_id: Optional[int] = None  # None for files outside user directories (previews, upload chunks)
+    file_count: int
+    total_bytes: int
+    quarantined_bytes: int  # Unreferenced files waiting to be deleted, included in total_bytes
 
     class Config:
         orm_mode = True
 
+class StorageUsageResponse(BaseModel):
+    file_count: int
+    total_bytes: int
+    quarantined_bytes: int
+    updated_at: Optional[datetime] = None  # Time of the last change to the counters
+    users: List[UserStorageUsage]
+
 # Comment Schemas
 class CommentBase(BaseModel):
     text: str
@@ -92,6 +196,149 @@ class CommentResponse(CommentBase):
     class Config:
         orm_mode = True
 
+# Page Schemas (everything a page needs in one response)
+class AssignmentWorkspaceResponse(BaseModel):
+    me: UserResponse
+    assignment: AssignmentResponse
+    comments: List[CommentResponse]
+    subjects: List[SubjectResponse]
+
+class DashboardResponse(BaseModel):
+    me: UserResponse
+    assignments: List[AssignmentResponse]
+    status_counts: Dict[AssignmentStatus, int]
+    subjects: List[SubjectResponse]
+    tutors: List[UserResponse] = []  # Only for admins, who assign tutors from the dashboard
+    change_cursor: int  # For GET /assignments/changes
+
+# Job Schemas
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    payload: Optional[dict] = None
+    status: JobStatus
+    assignment_id: Optional[int] = None
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+# Profile Schemas
+class ProfileResponse(BaseModel):
+    route: str  # Method and route path, e.g. GET_assignments_assignment_id
+    name: str
+    duration_ms: int
+    status_code: int
+    size: int
+    created_at: datetime
+
+# Slow Query Schemas
+class SlowQueryResponse(BaseModel):
+    sql: str  # Normalized: literals and IN lists replaced by placeholders
+    count: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    sources: Dict[str, int]  # Route or job that issued it, with counts
+    parameters: Optional[Union[dict, list]] = None  # Types of the last parameters, never their values
+    plan: Optional[str] = None
+    plan_captured_at: Optional[datetime] = None
+    last_seen: datetime
+
+# Event Loop Schemas
+class LoopStallSite(BaseModel):
+    route: str  # "-" when unknown
+    dependency: str
+    location: str  # Innermost frame in the application's code
+    count: int
+    total_ms: float
+    max_ms: float
+
+class LoopStall(BaseModel):
+    started_at: datetime
+    duration_ms: float
+    route: str
+    dependency: str
+    location: str
+    stack: List[str]  # Loop thread's stack while it was blocked, outermost first
+
+class LoopLagResponse(BaseModel):
+    interval_ms: float
+    threshold_ms: float
+    ticks: int
+    lag_p50_ms: float
+    lag_p99_ms: float
+    lag_max_ms: float
+    stalls: int
+    stalled_ms: float
+    sites: List[LoopStallSite]  # Most stalled time first
+    recent: List[LoopStall]
+
+class LoadClassStats(BaseModel):
+    name: str  # submission, auth, read or admin
+    priority: int  # Higher classes get free slots first
+    limit: int
+    queue_size: int
+    deadline_seconds: float
+    active: int
+    queued: int
+    admitted: int
+    rejected: Dict[str, int]  # By reason: queue_full, deadline or preempted
+
+class LoadSheddingResponse(BaseModel):
+    concurrency: int
+    active: int
+    classes: List[LoadClassStats]  # Highest priority first
+
+class CoalescedRoute(BaseModel):
+    name: str  # subjects, users_me or assignments
+    executed: int  # Requests that ran the queries
+    coalesced: int  # Requests answered with the result of an identical one in flight
+
+class CoalescingResponse(BaseModel):
+    enabled: bool
+    in_flight: int
+    routes: List[CoalescedRoute]
+
+class TurnaroundGroup(BaseModel):
+    id: Optional[int] = None  # None for assignments without a tutor
+    name: str
+    returned: int
+    mean_hours: Optional[float] = None  # Submission to return, over returned assignments
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    p99_hours: Optional[float] = None
+    within_sla: Optional[float] = None  # Fraction returned within sla_hours
+    backlog: int  # Not returned yet
+    overdue: int  # Not returned and older than sla_hours
+    oldest_backlog_hours: Optional[float] = None
+
+class BacklogAges(BaseModel):
+    status: AssignmentStatus
+    count: int
+    ages: Dict[str, int]  # Assignments by age bucket, e.g. "1-3d"
+
+class ThroughputWeek(BaseModel):
+    week_start: datetime
+    submitted: int
+    returned: int
+
+class TurnaroundAnalyticsResponse(BaseModel):
+    computed_at: datetime
+    sla_hours: float
+    assignments: int
+    returned: int
+    tutors: List[TurnaroundGroup]
+    subjects: List[TurnaroundGroup]
+    backlog: List[BacklogAges]
+    throughput: List[ThroughputWeek]  # Oldest week first
+
 # Token Schemas
 class Token(BaseModel):
     access_token: str
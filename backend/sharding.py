@@ -0,0 +1,374 @@
+import enum
+import heapq
+import itertools
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Dict, List, Optional
+
+from sqlalchemy import JSON, BigInteger, Column, DateTime, MetaData, String, Table, event, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, ColumnClause
+
+from models import Assignment, AssignmentChange, Base, Comment, Job, Subject, User
+
+# Optional horizontal sharding (SHARD_DATABASE_URLS in database.py).
+# Assignments and their comments live on one of N shard databases, chosen by
+# the student: shard = student_id % N. Their ids are allocated per shard so
+# that id % N is the shard too, which routes lookups by assignment or comment
+# id without a directory. Everything else stays on the main database (the
+# directory); users and subjects are copied to every shard as they change, so
+# assignments can still be joined to their student, tutor and subject.
+DIRECTORY = "directory"
+SHARDED_TABLES = {"assignments", "comments"}
+REPLICATED_MODELS = (User, Subject)
+
+# Directory rows that are written together with an assignment (see divert_to_outbox)
+OUTBOX_MODELS = (Job, AssignmentChange)
+# Receipts of relayed outbox entries are kept this long, far longer than a relay can take
+OUTBOX_RECEIPT_DAYS = 7
+
+logger = logging.getLogger("sharding")
+
+# Filled in by sharded_sessionmaker()
+shard_ids: List[str] = []
+engines: Dict[str, Engine] = {}
+session_factory: Optional[sessionmaker] = None
+executor: Optional[ThreadPoolExecutor] = None
+
+# Next id per sharded table, on each shard
+shard_sequences = Table(
+    "shard_sequences", MetaData(),
+    Column("name", String(50), primary_key=True),
+    Column("next_value", BigInteger, nullable=False),
+)
+
+# On each shard: directory rows waiting to be relayed. Ids are never reused,
+# so a receipt cannot be mistaken for that of a later entry.
+shard_outbox = Table(
+    "shard_outbox", MetaData(),
+    Column("id", String(32), primary_key=True),
+    Column("table_name", String(50), nullable=False),
+    Column("row", JSON, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+# In the directory: outbox entries that have been relayed
+outbox_receipts = Table(
+    "outbox_receipts", MetaData(),
+    Column("id", String(32), primary_key=True),
+    Column("created_at", DateTime, nullable=False, index=True),
+)
+
+
+def shard_for_id(value: int) -> str:
+    return shard_ids[value % len(shard_ids)]
+
+
+def shard_for_student(student_id: int) -> str:
+    return shard_ids[student_id % len(shard_ids)]
+
+
+# Columns whose value in a WHERE clause pins a statement to one shard
+ROUTING_COLUMNS = {
+    ("assignments", "student_id"): shard_for_student,
+    ("assignments", "id"): shard_for_id,
+    ("comments", "id"): shard_for_id,
+    ("comments", "assignment_id"): shard_for_id,
+}
+
+
+def shard_chooser(mapper, instance, clause=None) -> str:
+    # Shard of a new row; rows that were loaded stay on the shard they came from
+    if mapper is None or mapper.local_table.name not in SHARDED_TABLES or instance is None:
+        return DIRECTORY
+    if isinstance(instance, Assignment):
+        return shard_for_student(instance.student_id)
+    assignment_id = instance.assignment_id if instance.assignment_id is not None else instance.assignment.id
+    return shard_for_id(assignment_id)
+
+
+def identity_chooser(mapper, primary_key, **kw) -> List[str]:
+    if mapper.local_table.name in SHARDED_TABLES:
+        return [shard_for_id(primary_key[0])]
+    return [DIRECTORY]
+
+
+def conjuncts(clause) -> list:
+    if clause is None:
+        return []
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        return [part for inner in clause.clauses for part in conjuncts(inner)]
+    return [clause]
+
+
+def bound_value(parameter: BindParameter, parameters):
+    if parameter.value is not None or parameter.callable is not None:
+        return parameter.effective_value
+    if isinstance(parameters, dict):
+        return parameters.get(parameter.key)
+    return None
+
+
+def route(statement, parameters=None) -> List[str]:
+    """Databases that ``statement`` has to run on."""
+    tables = {element.name for element in visitors.iterate(statement) if isinstance(element, Table)}
+    if not tables & SHARDED_TABLES:
+        return [DIRECTORY]
+    # A top-level "column = value" or "column IN (values)" on a routing column
+    for clause in conjuncts(getattr(statement, "whereclause", None)):
+        if not isinstance(clause, BinaryExpression):
+            continue
+        column, value = clause.left, clause.right
+        if isinstance(column, BindParameter):
+            column, value = value, column
+        if not isinstance(column, ColumnClause) or not isinstance(value, BindParameter) or column.table is None:
+            continue
+        choose = ROUTING_COLUMNS.get((column.table.name, column.name))
+        bound = bound_value(value, parameters)
+        if choose is None or bound is None:
+            continue
+        if clause.operator is operators.eq:
+            return [choose(bound)]
+        if clause.operator is operators.in_op:
+            # An empty IN matches nothing, but has to run somewhere
+            return sorted({choose(item) for item in bound}) or shard_ids[:1]
+    return list(shard_ids)
+
+
+def execute_chooser(context) -> List[str]:
+    return route(context.statement, context.parameters)
+
+
+def allocate_id(session: Session, shard_id: str, table: str) -> int:
+    # The row lock on the counter is held until commit, like a sequence without caching
+    connection = session.connection(bind_arguments={"shard_id": shard_id})
+    value = connection.execute(
+        shard_sequences.update().where(shard_sequences.c.name == table).values(
+            next_value=shard_sequences.c.next_value + 1
+        ).returning(shard_sequences.c.next_value)
+    ).scalar_one()
+    return value * len(shard_ids) + shard_ids.index(shard_id)
+
+
+def assign_shard_ids(session: Session, flush_context, instances):
+    # Assignments first, so that comments on a new assignment find its id
+    new = sorted(session.new, key=lambda instance: not isinstance(instance, Assignment))
+    for instance in new:
+        if isinstance(instance, (Assignment, Comment)) and instance.id is None:
+            shard_id = shard_chooser(inspect(instance).mapper, instance)
+            instance.id = allocate_id(session, shard_id, instance.__tablename__)
+
+
+def replica_row(instance) -> dict:
+    mapper = inspect(instance).mapper
+    return {prop.columns[0].name: getattr(instance, prop.key) for prop in mapper.column_attrs}
+
+
+def upsert(connection, table: Table, row: dict):
+    key = [column == row[column.name] for column in table.primary_key.columns]
+    if not connection.execute(table.update().where(*key).values(row)).rowcount:
+        connection.execute(table.insert().values(row))
+
+
+def replicate_directory(session: Session, flush_context):
+    # Copies the users and subjects written to the directory in this flush to
+    # every shard, in the same (per-database) transactions
+    def from_directory(instance):
+        return isinstance(instance, REPLICATED_MODELS) and inspect(instance).identity_token == DIRECTORY
+
+    changed = [instance for instance in itertools.chain(session.new, session.dirty) if from_directory(instance)]
+    deleted = [instance for instance in session.deleted if from_directory(instance)]
+    if not changed and not deleted:
+        return
+    for shard_id in shard_ids:
+        connection = session.connection(bind_arguments={"shard_id": shard_id})
+        for instance in changed:
+            upsert(connection, instance.__table__, replica_row(instance))
+        for instance in deleted:
+            table = instance.__table__
+            connection.execute(table.delete().where(table.c.id == instance.id))
+
+
+def outbox_row(instance) -> dict:
+    # The column values that were set, JSON-safe; the others get their defaults when relayed
+    row = {}
+    for name, value in replica_row(instance).items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, enum.Enum):
+            value = value.name
+        if value is not None:
+            row[name] = value
+    return row
+
+
+def from_outbox(table: Table, row: dict) -> dict:
+    return {
+        name: datetime.fromisoformat(value) if isinstance(table.c[name].type, DateTime) else value
+        for name, value in row.items()
+    }
+
+
+def divert_to_outbox(session: Session, flush_context, instances):
+    # Jobs and change feed entries of an assignment live in the directory, but
+    # have to commit (or roll back) together with the assignment. They are
+    # written to the outbox on its shard instead, in the same transaction, and
+    # relay_outbox moves them to the directory once that has committed.
+    for instance in list(session.new):
+        if not isinstance(instance, OUTBOX_MODELS):
+            continue
+        assignment = getattr(instance, "assignment", None)
+        assignment_id = instance.assignment_id if instance.assignment_id is not None else getattr(assignment, "id", None)
+        if assignment_id is None:
+            continue  # Not about an assignment, e.g. the next run of a periodic job
+        if assignment is not None:
+            instance.assignment = None  # Also takes it out of assignment.jobs
+        row = dict(outbox_row(instance), assignment_id=assignment_id)
+        session.expunge(instance)
+
+        shard_id = shard_for_id(assignment_id)
+        session.connection(bind_arguments={"shard_id": shard_id}).execute(shard_outbox.insert().values(
+            id=uuid.uuid4().hex, table_name=instance.__tablename__, row=row, created_at=datetime.utcnow(),
+        ))
+        session.info.setdefault("outbox_shards", set()).add(shard_id)
+
+
+def relay_after_commit(session: Session):
+    shards = session.info.pop("outbox_shards", None)
+    if not shards:
+        return
+    try:
+        relay_outbox(sorted(shards))
+    except Exception:
+        # The entries stay in the outbox until the relay_outbox job moves them
+        logger.exception("Relaying the outbox failed")
+
+
+def forget_outbox(session: Session, previous_transaction=None):
+    # Rolled back, so nothing was written to the outbox
+    session.info.pop("outbox_shards", None)
+
+
+def relay_outbox(shards: Optional[List[str]] = None, batch_size: int = 500) -> int:
+    """Move outbox entries from the shards to the directory. Returns how many were moved.
+
+    Each entry is moved once: its receipt is committed in the same directory
+    transaction, and an entry that already has one is only deleted from the
+    shard (its shard transaction failed after the directory's committed).
+    """
+    moved = 0
+    for shard_id in shards or shard_ids:
+        while True:
+            with engines[shard_id].begin() as shard:
+                entries = shard.execute(
+                    select(shard_outbox).order_by(shard_outbox.c.created_at).limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                ).mappings().all()
+                if not entries:
+                    break
+                ids = [entry["id"] for entry in entries]
+                with engines[DIRECTORY].begin() as directory:
+                    relayed = set(directory.execute(
+                        select(outbox_receipts.c.id).where(outbox_receipts.c.id.in_(ids))
+                    ).scalars())
+                    for entry in entries:
+                        if entry["id"] in relayed:
+                            continue
+                        table = Base.metadata.tables[entry["table_name"]]
+                        directory.execute(table.insert().values(from_outbox(table, entry["row"])))
+                        directory.execute(outbox_receipts.insert().values(id=entry["id"], created_at=datetime.utcnow()))
+                        moved += 1
+                shard.execute(shard_outbox.delete().where(shard_outbox.c.id.in_(ids)))
+            if len(entries) < batch_size:
+                break
+    return moved
+
+
+def prune_outbox_receipts(now: Optional[datetime] = None) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(days=OUTBOX_RECEIPT_DAYS)
+    with engines[DIRECTORY].begin() as directory:
+        return directory.execute(outbox_receipts.delete().where(outbox_receipts.c.created_at < cutoff)).rowcount
+
+
+def sharded_sessionmaker(directory: Engine, shards: List[Engine]) -> sessionmaker:
+    global session_factory, executor
+    shard_ids[:] = [f"shard{index}" for index in range(len(shards))]
+    engines.clear()
+    engines.update({DIRECTORY: directory, **dict(zip(shard_ids, shards))})
+    session_factory = sessionmaker(
+        class_=ShardedSession, autocommit=False, autoflush=False, shards=engines,
+        shard_chooser=shard_chooser, identity_chooser=identity_chooser, execute_chooser=execute_chooser,
+    )
+    # Assignment ids first: the outbox is on the assignment's shard
+    event.listen(session_factory, "before_flush", assign_shard_ids)
+    event.listen(session_factory, "before_flush", divert_to_outbox)
+    event.listen(session_factory, "after_flush", replicate_directory)
+    event.listen(session_factory, "after_commit", relay_after_commit)
+    event.listen(session_factory, "after_soft_rollback", forget_outbox)
+    executor = ThreadPoolExecutor(max_workers=4 * len(shards), thread_name_prefix="shard")
+
+    # Jobs and file artifacts stay in the directory, so their assignment ids
+    # cannot be foreign keys to a table on another database
+    for table in Base.metadata.tables.values():
+        for constraint in table.foreign_key_constraints:
+            if table.name not in SHARDED_TABLES and constraint.referred_table.name in SHARDED_TABLES:
+                constraint.ddl_if(callable_=lambda *args, **kw: False)
+    return session_factory
+
+
+def create_shard_schemas(directory: Engine, shards: List[Engine]):
+    """Create the tables on every shard and bring its copy of the users and subjects up to date."""
+    tables = [Base.metadata.tables[name] for name in ("users", "subjects", *sorted(SHARDED_TABLES))]
+    with directory.connect() as connection:
+        replicated = [(model.__table__, connection.execute(select(model.__table__)).mappings().all())
+                      for model in REPLICATED_MODELS]
+    outbox_receipts.create(directory, checkfirst=True)
+    for engine in shards:
+        Base.metadata.create_all(engine, tables=tables)
+        shard_sequences.create(engine, checkfirst=True)
+        shard_outbox.create(engine, checkfirst=True)
+        with engine.begin() as connection:
+            for name in SHARDED_TABLES:
+                if connection.execute(select(shard_sequences.c.name).where(shard_sequences.c.name == name)).first() is None:
+                    connection.execute(shard_sequences.insert().values(name=name, next_value=0))
+            for table, rows in replicated:
+                for row in rows:
+                    upsert(connection, table, dict(row))
+
+
+def fetch_page(query, skip: int, limit: int, key=attrgetter("id"), reverse: bool = False) -> list:
+    """``query.offset(skip).limit(limit).all()`` for a query ordered by ``key``
+    (descending if ``reverse``), id by default.
+
+    Without shards, or when the query is pinned to one, that is what runs.
+    Otherwise every shard returns its first skip + limit rows, in parallel,
+    and those are merge-sorted.
+    """
+    statement = query.statement
+    shards = route(statement) if shard_ids else [DIRECTORY]
+    if len(shards) == 1:
+        return query.offset(skip).limit(limit).all()
+
+    statement = statement.limit(skip + limit)
+
+    def run(shard_id: str) -> list:
+        # Each shard gets its own session; the objects are fully loaded before it closes
+        with session_factory() as session:
+            return session.execute(statement, bind_arguments={"shard_id": shard_id}).unique().scalars().all()
+
+    pages = list(executor.map(run, shards))
+    return list(itertools.islice(heapq.merge(*pages, key=key, reverse=reverse), skip, skip + limit))
+
+
+def count_rows(db: Session, statement) -> int:
+    """Number of rows ``statement`` returns, added up over the shards it runs on."""
+    count = select(func.count()).select_from(statement.order_by(None).subquery())
+    if not shard_ids:
+        return db.execute(count).scalar()
+    return sum(db.execute(count, bind_arguments={"shard_id": shard_id}).scalar() for shard_id in route(statement))
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import random
+import re
+import struct
+from typing import List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Assignment, FileArtifact, LshBucket, SubmissionSignature
+
+# Near-duplicate detection: submissions are reduced to MinHash signatures,
+# whose bands are stored in an LSH index. Submissions sharing a band are
+# candidates, so a lookup reads a few index entries instead of every
+# previous submission, and only candidates are compared.
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))  # Estimated Jaccard similarity
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+# Candidates sharing the most bands are compared first; boilerplate that
+# every submission shares could otherwise make one lookup compare thousands
+MAX_CANDIDATES = 1000
+
+
+def band_layout(threshold: float) -> Tuple[int, int]:
+    """(bands, rows per band) of an index that finds pairs at least ``threshold`` similar.
+
+    Two signatures of similarity s share a band with probability
+    1 - (1 - s^rows)^bands, which rises steeply around (1 / bands)^(1 / rows).
+    The layout with the most rows per band (the fewest false candidates) whose
+    rise is at or below the threshold is used: 32 bands of 4 rows for 0.5.
+    """
+    for rows in (16, 8, 4, 2):
+        bands = NUM_PERMUTATIONS // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            return bands, rows
+    return NUM_PERMUTATIONS, 1
+
+
+# Fixed when submissions are indexed: after changing SIMILARITY_THRESHOLD, index
+# them again (lookups with a lower threshold than it miss more near-duplicates)
+BANDS, ROWS_PER_BAND = band_layout(SIMILARITY_THRESHOLD)
+
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed: signatures are stored, so every process must use the same permutations
+_random = random.Random(20250307)
+PERMUTATIONS = [
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+SIGNATURE_FORMAT = f"<{NUM_PERMUTATIONS}I"
+
+WORD = re.compile(r"\w+")
+
+
+def hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingles(text: str) -> Set[int]:
+    """Hashes of the overlapping SHINGLE_WORDS-word sequences of ``text``."""
+    words = WORD.findall(text.lower())
+    if not words:
+        return set()
+    if len(words) < SHINGLE_WORDS:
+        return {hash64(" ".join(words).encode())}
+    return {
+        hash64(" ".join(words[i:i + SHINGLE_WORDS]).encode())
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def minhash(hashes: Set[int]) -> List[int]:
+    # 32 bits of each minimum are plenty to tell signatures apart and halve their size
+    return [min((a * h + b) % MERSENNE_PRIME for h in hashes) & 0xFFFFFFFF for a, b in PERMUTATIONS]
+
+
+def pack(signature: Sequence[int]) -> bytes:
+    return struct.pack(SIGNATURE_FORMAT, *signature)
+
+
+def unpack(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(SIGNATURE_FORMAT, data)
+
+
+def band_keys(signature: Sequence[int]) -> List[int]:
+    # One signed 64-bit key per band, including the band number so equal rows in different bands differ
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<H{ROWS_PER_BAND}I", band, *rows), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def estimate_similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERMUTATIONS
+
+
+def submission_text(db: Session, assignment: Assignment) -> str:
+    # The text typed into the form and the text extracted from the submitted file
+    artifact = db.query(FileArtifact).filter(
+        FileArtifact.assignment_id == assignment.id,
+        FileArtifact.field == "file_path"
+    ).first()
+    parts = [assignment.submission_text, artifact.text if artifact else None]
+    return "\n".join(part for part in parts if part)
+
+
+def index_submission(db: Session, assignment: Assignment) -> Optional[SubmissionSignature]:
+    """Compute and store the signature of ``assignment`` (not committed).
+
+    Returns None, after removing any previous signature, when there is no text to compare.
+    """
+    db.query(LshBucket).filter(LshBucket.assignment_id == assignment.id).delete(synchronize_session=False)
+    db.query(SubmissionSignature).filter(
+        SubmissionSignature.assignment_id == assignment.id
+    ).delete(synchronize_session=False)
+
+    hashes = shingles(submission_text(db, assignment))
+    if not hashes:
+        return None
+    signature = minhash(hashes)
+    record = SubmissionSignature(assignment_id=assignment.id, signature=pack(signature), shingle_count=len(hashes))
+    db.add(record)
+    db.add_all([LshBucket(bucket=key, assignment_id=assignment.id) for key in band_keys(signature)])
+    return record
+
+
+def find_similar(db: Session, assignment_id: int, threshold: float = SIMILARITY_THRESHOLD,
+                 limit: int = 20) -> Optional[List[Tuple[int, float]]]:
+    """(assignment id, estimated similarity) of near-duplicates, most similar first.
+
+    Returns None if the submission has no signature (yet).
+    """
+    record = db.get(SubmissionSignature, assignment_id)
+    if record is None:
+        return None
+    signature = unpack(record.signature)
+
+    candidates = db.query(LshBucket.assignment_id).filter(
+        LshBucket.bucket.in_(band_keys(signature)),
+        LshBucket.assignment_id != assignment_id
+    ).group_by(LshBucket.assignment_id).order_by(
+        func.count().desc()
+    ).limit(MAX_CANDIDATES).subquery()
+    others = db.query(SubmissionSignature).filter(SubmissionSignature.assignment_id.in_(candidates.select())).all()
+
+    scored = [(other.assignment_id, estimate_similarity(signature, unpack(other.signature))) for other in others]
+    scored = [(other_id, score) for other_id, score in scored if score >= threshold]
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
@@ -0,0 +1,111 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import parse_obj_as
+
+from database import wrote_recently
+
+# Single-flight: while a read is running, identical reads (same route,
+# parameters and authorization scope) wait for it and are sent the same
+# serialized response instead of running the queries again. Only requests
+# that arrive while the first one is in flight share it; nothing is cached.
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+
+# Headers that belong to each response rather than to the shared result
+PER_RESPONSE_HEADERS = {"content-length", "content-type"}
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile get its result (or exception)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, Future] = {}
+        self.executed: Counter = Counter()
+        self.coalesced: Counter = Counter()
+
+    def do(self, name: str, key: Hashable, call: Callable[[], Any], join: bool = True) -> Any:
+        if not join:
+            # Runs on its own, without becoming the call that others join either
+            with self.lock:
+                self.executed[name] += 1
+            return call()
+        with self.lock:
+            future = self.calls.get((name, key))
+            leader = future is None
+            if leader:
+                future = self.calls[(name, key)] = Future()
+                self.executed[name] += 1
+            else:
+                self.coalesced[name] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = call()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[(name, key)]
+
+    def report(self) -> dict:
+        with self.lock:
+            names = sorted(set(self.executed) | set(self.coalesced))
+            return {
+                "enabled": SINGLE_FLIGHT,
+                "in_flight": len(self.calls),
+                "routes": [{
+                    "name": name,
+                    "executed": self.executed[name],
+                    "coalesced": self.coalesced[name],
+                } for name in names],
+            }
+
+    def metrics(self) -> str:
+        """The same numbers in the Prometheus text format."""
+        report = self.report()
+        lines = [
+            "# HELP single_flight_executed_total Reads that ran their handler, by route.",
+            "# TYPE single_flight_executed_total counter",
+        ]
+        lines += [f'single_flight_executed_total{{route="{r["name"]}"}} {r["executed"]}' for r in report["routes"]]
+        lines += [
+            "# HELP single_flight_coalesced_total Reads answered with the result of an identical one in flight, by route.",
+            "# TYPE single_flight_coalesced_total counter",
+        ]
+        lines += [f'single_flight_coalesced_total{{route="{r["name"]}"}} {r["coalesced"]}' for r in report["routes"]]
+        return "\n".join(lines) + "\n"
+
+
+single_flight = SingleFlight()
+
+
+def coalesced_response(request: Request, name: str, key: Hashable, response_model,
+                       compute: Callable[[Response], Any]) -> Response:
+    """The JSON response of ``compute``, shared with identical requests in flight.
+
+    ``key`` must hold everything the result depends on, including who may see
+    it. ``compute`` gets a response to set headers on, and returns content
+    that is validated against ``response_model`` like a route's return value.
+    A client that has just written skips joining a read that may have started
+    before its write.
+    """
+    def run() -> Tuple[bytes, Dict[str, str]]:
+        scratch = Response()
+        content = parse_obj_as(response_model, compute(scratch))
+        body = JSONResponse(jsonable_encoder(content)).body
+        headers = {k: v for k, v in scratch.headers.items() if k.lower() not in PER_RESPONSE_HEADERS}
+        return body, headers
+
+    body, headers = single_flight.do(name, key, run, join=SINGLE_FLIGHT and not wrote_recently(request))
+    return Response(content=body, media_type="application/json", headers=headers)
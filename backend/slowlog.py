@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Slow query log configuration; SLOW_QUERY_MS=0 turns it off
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# A query's plan is captured at most this often, since capturing runs it again on PostgreSQL
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "300"))
+SLOW_QUERY_MAX_STATEMENTS = 500  # Distinct statements kept in the report
+
+logger = logging.getLogger("slow_queries")
+
+# What issued the current query: the ASGI scope of a request (its route is
+# resolved when the query is logged) or a label such as "job checksum"
+query_source: ContextVar[Any] = ContextVar("query_source", default=None)
+
+IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|\$\d+))*\s*\)")
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+# Statements that write or lock rows, including in a WITH query's CTEs
+WRITES = re.compile(r"\b(?:insert|update|delete|merge)\b|\bfor\s+(?:no\s+key\s+|key\s+)?share\b")
+
+
+def normalize_sql(statement: str) -> str:
+    # Statements differing only in literals or the length of IN lists are the same query
+    statement = STRING_LITERAL.sub("?", statement)
+    statement = NUMBER_LITERAL.sub("?", statement)
+    statement = IN_LIST.sub("(...)", statement)
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+def parameters_shape(parameters, executemany: bool) -> Any:
+    # Types only: values may be passwords or personal data
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "row": parameters_shape(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def describe_source() -> str:
+    source = query_source.get()
+    if isinstance(source, dict):
+        route = source.get("route")
+        return f"{source['method']} {getattr(route, 'path', None) or source['path']}"
+    return source or "-"
+
+
+def is_explainable(statement: str) -> bool:
+    # Only reads: EXPLAIN ANALYZE executes the statement, and would take row locks
+    lowered = statement.lstrip().lower()
+    return lowered.startswith(("select", "with")) and not WRITES.search(lowered)
+
+
+class SlowQueryLog:
+    """Aggregates slow queries by normalized statement for a top-N report."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS,
+                 explain_interval: float = SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+                 max_statements: int = SLOW_QUERY_MAX_STATEMENTS):
+        self.threshold_ms = threshold_ms
+        self.explain_interval = explain_interval
+        self.max_statements = max_statements
+        self.entries: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        # Plans are captured by a background thread on a separate connection,
+        # so the request that was already slow does not wait for them
+        self.explain_queue: "queue.Queue" = queue.Queue(maxsize=100)
+        self.explain_thread: Optional[threading.Thread] = None
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.slow_query_started = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - context.slow_query_started) * 1000
+        if duration_ms < self.threshold_ms or context.execution_options.get("slow_query_log") is False:
+            return
+        self.record(conn.engine, statement, parameters, executemany, duration_ms)
+
+    def record(self, engine, statement: str, parameters, executemany: bool, duration_ms: float):
+        sql = normalize_sql(statement)
+        shape = parameters_shape(parameters, executemany)
+        source = describe_source()
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(sql)
+            if entry is None:
+                if len(self.entries) >= self.max_statements:
+                    # Forget the statement that was slow the longest time ago
+                    del self.entries[min(self.entries, key=lambda key: self.entries[key]["last_seen"])]
+                entry = self.entries[sql] = {
+                    "sql": sql, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "sources": {},
+                    "parameters": None, "plan": None, "plan_captured_at": None, "explained": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["sources"][source] = entry["sources"].get(source, 0) + 1
+            entry["parameters"] = shape
+            entry["last_seen"] = now
+            explain = (not executemany and is_explainable(statement)
+                       and now - entry["explained"] >= self.explain_interval)
+            if explain:
+                entry["explained"] = now
+
+        logger.warning("slow query %.1f ms from %s: %s %s", duration_ms, source, sql, json.dumps(shape))
+        if explain:
+            self.queue_explain(engine, sql, statement, parameters)
+
+    def queue_explain(self, engine, sql: str, statement: str, parameters):
+        if self.explain_thread is None or not self.explain_thread.is_alive():
+            self.explain_thread = threading.Thread(target=self.run_explains, name="slow-query-explain", daemon=True)
+            self.explain_thread.start()
+        try:
+            self.explain_queue.put_nowait((engine, sql, statement, parameters))
+        except queue.Full:
+            pass
+
+    def run_explains(self):
+        while True:
+            engine, sql, statement, parameters = self.explain_queue.get()
+            try:
+                plan = explain(engine, statement, parameters)
+            except Exception as exc:
+                plan = f"EXPLAIN failed: {exc}"
+            with self.lock:
+                entry = self.entries.get(sql)
+                if entry is not None:
+                    entry["plan"] = plan
+                    entry["plan_captured_at"] = datetime.utcnow()
+
+    def report(self, limit: int = 20, order_by: str = "total_ms") -> List[dict]:
+        with self.lock:
+            entries = [dict(entry, sources=dict(entry["sources"])) for entry in self.entries.values()]
+        for entry in entries:
+            entry["mean_ms"] = entry["total_ms"] / entry["count"]
+            entry["last_seen"] = datetime.utcfromtimestamp(entry["last_seen"])
+            del entry["explained"]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def explain(engine, statement: str, parameters) -> str:
+    with engine.connect().execution_options(slow_query_log=False) as conn:
+        if engine.dialect.name == "postgresql":
+            # Only a plain SELECT is run to measure it; a WITH query could still
+            # change data in ways is_explainable does not see, so it is only planned
+            analyze = statement.lstrip().lower().startswith("select")
+            rows = conn.exec_driver_sql(("EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN ") + statement,
+                                        parameters).all()
+            plan = "\n".join(row[0] for row in rows)
+        elif engine.dialect.name == "sqlite":
+            # Rows are (id, parent, notused, detail); indent details by depth
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            depth = {0: -1}
+            lines = []
+            for node_id, parent, _, detail in rows:
+                depth[node_id] = depth.get(parent, -1) + 1
+                lines.append("  " * depth[node_id] + detail)
+            plan = "\n".join(lines)
+        else:
+            plan = "\n".join(str(row[0]) for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters))
+        # EXPLAIN ANALYZE really runs the statement; never keep its effects
+        conn.rollback()
+    return plan
+
+
+slow_query_log = SlowQueryLog()
+
+
+class QuerySourceMiddleware:
+    """Makes the request available to the slow query log, which reports its route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # The router adds the matched route to this same scope dict later on
+        token = query_source.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_source.reset(token)
@@ -1,11 +1,37 @@
 import os
-from models import Base
-from database import engine
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from database import engine, shard_engines
+from sharding import create_shard_schemas
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "alembic"))
+    return config
 
 def init_db():
-    print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully!")
+    # Run before the app starts (the Docker image does); the app itself only checks the revision
+    print("Migrating the database...")
+    command.upgrade(alembic_config(), "head")
+    if shard_engines:
+        # Alembic migrates only the directory; shard tables are created from the models
+        create_shard_schemas(engine, shard_engines)
+    print("Database is up to date!")
+
+def check_schema():
+    """Refuse to start against a database that has not been migrated to the latest revision."""
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    with engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current or 'none'}, not {head}: "
+            f"run `python startup.py` (or `alembic upgrade head`) first"
+        )
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
@@ -0,0 +1,463 @@
+import hashlib
+import hmac
+import mimetypes
+import os
+import re
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from models import StorageUsage, StoredFile
+
+try:
+    import zstandard
+except ImportError:
+    # Without zstandard, compressible uploads are gzipped
+    zstandard = None
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    # Only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+# Load environment variables
+load_dotenv()
+
+UPLOAD_DIR = Path("uploads")
+CHUNK_SIZE = 1024 * 1024
+
+# "local" keeps files below UPLOAD_DIR, "s3" uses an S3-compatible object store
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET", "assignments")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+PRESIGNED_URL_EXPIRE_SECONDS = int(os.getenv("PRESIGNED_URL_EXPIRE_SECONDS", "900"))
+# Largest file accepted through a presigned URL or a resumable upload session
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(1024 * 1024 * 1024)))
+STORAGE_SIGNING_KEY = os.getenv("SECRET_KEY", "a-very-secure-secret-key-that-should-be-changed-in-production")
+
+# "auto" picks zstd when available and gzip otherwise; "none" disables compression
+UPLOAD_COMPRESSION = os.getenv("UPLOAD_COMPRESSION", "auto").lower()
+# Only compress when a sample of the file shrinks below this fraction of its size
+COMPRESSION_MIN_RATIO = float(os.getenv("COMPRESSION_MIN_RATIO", "0.9"))
+SAMPLE_SIZE = 64 * 1024
+
+# Suffix appended to the stored key for each codec
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Unreferenced files moved aside by the upload garbage collector (upload_gc.py)
+QUARANTINE_DIR = UPLOAD_DIR / ".quarantine"
+# Upload directories are named after their owner, e.g. uploads/student_2
+OWNER_DIR = re.compile(r"^(?:student|tutor)_(\d+)$")
+
+
+class LocalStorage:
+    """Stores objects as files; keys are paths relative to ``root``.
+
+    Presigned URLs point at the /storage routes of this API and carry an
+    HMAC signature instead of credentials.
+    """
+
+    def __init__(self, root: Path = Path(".")):
+        self.root = root.resolve()
+
+    def local_path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root / UPLOAD_DIR):
+            raise ValueError(f"Invalid storage key '{key}'")
+        return path
+
+    @contextmanager
+    def open_write(self, key: str, content_type: Optional[str] = None, content_encoding: Optional[str] = None):
+        path = self.local_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            yield f
+
+    def open_read(self, key: str) -> BinaryIO:
+        return self.local_path(key).open("rb")
+
+    def size(self, key: str) -> Optional[int]:
+        path = self.local_path(key)
+        return path.stat().st_size if path.is_file() else None
+
+    def delete(self, key: str):
+        self.local_path(key).unlink(missing_ok=True)
+
+    def move(self, key: str, new_key: str):
+        dest = self.local_path(new_key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.local_path(key), dest)
+
+    def iter_keys(self, prefix: str) -> Iterator[Tuple[str, int, datetime]]:
+        # (key, size, modification time in UTC), directories in sorted order like an S3 listing
+        for dirpath, dirnames, filenames in os.walk(self.local_path(prefix)):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = Path(dirpath) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                yield str(path.relative_to(self.root)), stat.st_size, datetime.utcfromtimestamp(stat.st_mtime)
+
+    def presigned_put_url(self, key: str, content_type: Optional[str] = None,
+                          expires_in: int = PRESIGNED_URL_EXPIRE_SECONDS, size: Optional[int] = None) -> str:
+        # The most bytes the URL accepts is part of what is signed
+        return self._signed_url("PUT", key, expires_in, size or MAX_UPLOAD_SIZE)
+
+    def presigned_get_url(self, key: str, expires_in: int = PRESIGNED_URL_EXPIRE_SECONDS,
+                          content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> str:
+        return self._signed_url("GET", key, expires_in)
+
+    def _signed_url(self, method: str, key: str, expires_in: int, max_size: int = 0) -> str:
+        expires = int(time.time()) + expires_in
+        params = {"expires": expires}
+        if max_size:
+            params["max_size"] = max_size
+        params["signature"] = sign(method, key, expires, max_size)
+        return f"/storage/{quote(key)}?{urlencode(params)}"
+
+
+class S3Storage:
+    """Stores objects in an S3-compatible bucket (AWS S3, MinIO, ...)."""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package")
+        self.bucket = bucket
+        # Signature v4 signs the Content-Length of presigned PUTs
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region,
+                                   config=Config(signature_version="s3v4"))
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return None
+
+    @contextmanager
+    def open_write(self, key: str, content_type: Optional[str] = None, content_encoding: Optional[str] = None):
+        # Spool to a temporary file, then upload it (multipart when large)
+        extra = {}
+        if content_type:
+            extra["ContentType"] = content_type
+        if content_encoding:
+            extra["ContentEncoding"] = content_encoding
+        with tempfile.SpooledTemporaryFile(max_size=8 * CHUNK_SIZE) as f:
+            yield f
+            f.seek(0)
+            self.client.upload_fileobj(f, self.bucket, key, ExtraArgs=extra or None)
+
+    def open_read(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError:
+            return None
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def move(self, key: str, new_key: str):
+        # Content type and encoding are copied along with the object
+        self.client.copy_object(Bucket=self.bucket, Key=new_key, CopySource={"Bucket": self.bucket, "Key": key})
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def iter_keys(self, prefix: str) -> Iterator[Tuple[str, int, datetime]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix.rstrip("/") + "/"):
+            for obj in page.get("Contents", []):
+                modified = obj["LastModified"].astimezone(timezone.utc).replace(tzinfo=None)
+                yield obj["Key"], obj["Size"], modified
+
+    def presigned_put_url(self, key: str, content_type: Optional[str] = None,
+                          expires_in: int = PRESIGNED_URL_EXPIRE_SECONDS, size: Optional[int] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_type:
+            params["ContentType"] = content_type
+        if size:
+            # S3 has no maximum for presigned PUTs, but it checks a signed Content-Length
+            params["ContentLength"] = size
+        return self.client.generate_presigned_url("put_object", Params=params, ExpiresIn=expires_in)
+
+    def presigned_get_url(self, key: str, expires_in: int = PRESIGNED_URL_EXPIRE_SECONDS,
+                          content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_type:
+            params["ResponseContentType"] = content_type
+        if content_encoding:
+            params["ResponseContentEncoding"] = content_encoding
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "s3":
+            _storage = S3Storage(S3_BUCKET, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION)
+        else:
+            _storage = LocalStorage()
+    return _storage
+
+
+def sign(method: str, key: str, expires: int, max_size: int = 0) -> str:
+    message = f"{method}\n{key}\n{expires}\n{max_size}".encode()
+    return hmac.new(STORAGE_SIGNING_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(method: str, key: str, expires: int, signature: str, max_size: int = 0) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign(method, key, expires, max_size), signature)
+
+
+def default_codec() -> Optional[str]:
+    if UPLOAD_COMPRESSION == "none":
+        return None
+    if UPLOAD_COMPRESSION == "gzip" or zstandard is None:
+        return "gzip"
+    return "zstd"
+
+
+def physical_key(path: str, codec: Optional[str]) -> str:
+    return path + CODEC_SUFFIXES[codec] if codec else path
+
+
+def is_compressible(sample: bytes) -> bool:
+    # PDFs with compressed streams, DOCX (zip) and images barely shrink;
+    # a quick deflate of the first block tells them apart from text
+    if len(sample) < 512:
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * COMPRESSION_MIN_RATIO
+
+
+def _copy(sample: bytes, src: BinaryIO, dest: BinaryIO) -> int:
+    dest.write(sample)
+    size = len(sample)
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+        dest.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def write_stream(sample: bytes, src: BinaryIO, dest: BinaryIO, codec: Optional[str]) -> int:
+    """Write ``sample`` followed by the rest of ``src`` to ``dest`` with the given codec.
+
+    Returns the number of original (uncompressed) bytes written.
+    """
+    if codec == "zstd":
+        with zstandard.ZstdCompressor(level=3).stream_writer(dest, closefd=False) as writer:
+            return _copy(sample, src, writer)
+    if codec == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        size = len(sample)
+        dest.write(compressor.compress(sample))
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            dest.write(compressor.compress(chunk))
+            size += len(chunk)
+        dest.write(compressor.flush())
+        return size
+    return _copy(sample, src, dest)
+
+
+def guess_content_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def save_upload(db: Session, src: BinaryIO, path: Path) -> StoredFile:
+    """Store an uploaded file, compressing it if worthwhile.
+
+    ``path`` is the logical path stored on the assignment and used in URLs.
+    The StoredFile row recording the codec and sizes is added to ``db`` but
+    not committed, so it is saved together with the assignment.
+    """
+    sample = src.read(SAMPLE_SIZE)
+    codec = default_codec() if is_compressible(sample) else None
+    content_type = guess_content_type(path.name)
+
+    storage = get_storage()
+    key = physical_key(str(path), codec)
+    with storage.open_write(key, content_type=content_type, content_encoding=codec) as dest:
+        original_size = write_stream(sample, src, dest, codec)
+
+    stored = StoredFile(
+        path=str(path),
+        codec=codec,
+        original_size=original_size,
+        stored_size=storage.size(key),
+        content_type=content_type,
+    )
+    db.add(stored)
+    count_usage(db, key, 1, stored.stored_size)
+    return stored
+
+
+def register_upload(db: Session, path: str) -> Optional[StoredFile]:
+    """Record a file the client uploaded directly to the store via a presigned URL.
+
+    Returns None if nothing was uploaded under ``path``.
+    """
+    size = get_storage().size(path)
+    if size is None:
+        return None
+    stored = StoredFile(
+        path=path,
+        codec=None,
+        original_size=size,
+        stored_size=size,
+        content_type=guess_content_type(path),
+    )
+    db.add(stored)
+    count_usage(db, path, 1, size)
+    return stored
+
+
+def save_bytes(path: str, data: bytes, content_type: Optional[str] = None):
+    # For small derived files such as previews, stored uncompressed
+    with get_storage().open_write(path, content_type=content_type or guess_content_type(path)) as dest:
+        dest.write(data)
+
+
+def owner_id(key: str) -> Optional[int]:
+    # uploads/[.quarantine/][archive/]student_2/file.pdf -> 2
+    parts = list(Path(os.path.relpath(key, UPLOAD_DIR)).parts[:-1])
+    while parts and parts[0] in (QUARANTINE_DIR.name, "archive"):
+        parts.pop(0)
+    match = OWNER_DIR.match(parts[0]) if parts else None
+    return int(match.group(1)) if match else None
+
+
+def count_usage(db: Session, key: str, files: int, size: int, quarantined: int = 0):
+    """Add to the storage usage counters of the owner of ``key`` (not committed).
+
+    Called in the transaction that records the change; the upload garbage
+    collector recounts everything daily to correct any drift.
+    """
+    user_id = owner_id(key)
+    owner = StorageUsage.user_id == user_id if user_id is not None else StorageUsage.user_id.is_(None)
+    now = datetime.utcnow()
+    updated = db.query(StorageUsage).filter(owner).update({
+        StorageUsage.file_count: StorageUsage.file_count + files,
+        StorageUsage.total_bytes: StorageUsage.total_bytes + size,
+        StorageUsage.quarantined_bytes: StorageUsage.quarantined_bytes + quarantined,
+        StorageUsage.updated_at: now,
+    }, synchronize_session=False)
+    if not updated:
+        db.add(StorageUsage(user_id=user_id, file_count=files, total_bytes=size,
+                            quarantined_bytes=quarantined, updated_at=now))
+        # So that the next change in this transaction updates the new row
+        db.flush()
+
+
+def get_stored_file(db: Session, path: str) -> Optional[StoredFile]:
+    return db.query(StoredFile).filter(StoredFile.path == path).first()
+
+
+def iter_original(path: str, codec: Optional[str]) -> Iterator[bytes]:
+    """Yield the original (decompressed) bytes of a stored file in chunks."""
+    with get_storage().open_read(physical_key(path, codec)) as f:
+        if codec == "zstd":
+            yield from zstandard.ZstdDecompressor().read_to_iter(f, read_size=CHUNK_SIZE)
+            return
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if codec == "gzip" else None
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            yield decompressor.decompress(chunk) if decompressor else chunk
+        if decompressor:
+            yield decompressor.flush()
+
+
+def iter_upload(db: Session, path: str) -> Iterator[bytes]:
+    stored = get_stored_file(db, path)
+    return iter_original(path, stored.codec if stored else None)
+
+
+@contextmanager
+def local_copy(db: Session, path: str) -> Iterator[Path]:
+    """Yield a filesystem path holding the original bytes of a stored file.
+
+    Uncompressed local files are used in place; anything else is copied
+    (and decompressed) to a temporary file that is removed afterwards.
+    """
+    stored = get_stored_file(db, path)
+    codec = stored.codec if stored else None
+    local_path = get_storage().local_path(path)
+    if not codec and local_path is not None:
+        yield local_path
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=Path(path).suffix) as tmp:
+        for chunk in iter_original(path, codec):
+            tmp.write(chunk)
+        tmp.flush()
+        yield Path(tmp.name)
+
+
+def relocate_upload(db: Session, path: str, new_path: str) -> StoredFile:
+    """Copy a stored file to ``new_path``, always compressed (for cold storage).
+
+    As with save_upload, the new StoredFile row is added but not committed;
+    the old copy is left for delete_upload once the caller has committed.
+    """
+    stored = get_stored_file(db, path)
+    codec = default_codec()
+    storage = get_storage()
+    key = physical_key(new_path, codec)
+    with local_copy(db, path) as src_path, open(src_path, "rb") as src:
+        with storage.open_write(key, content_type=stored.content_type if stored else None,
+                                content_encoding=codec) as dest:
+            original_size = write_stream(b"", src, dest, codec)
+
+    relocated = StoredFile(
+        path=new_path,
+        codec=codec,
+        original_size=original_size,
+        stored_size=storage.size(key),
+        content_type=stored.content_type if stored else guess_content_type(new_path),
+        crc32=stored.crc32 if stored else None,
+    )
+    db.add(relocated)
+    count_usage(db, key, 1, relocated.stored_size)
+    return relocated
+
+
+def delete_upload(db: Session, path: str):
+    """Delete a stored file and its StoredFile row (not committed)."""
+    stored = get_stored_file(db, path)
+    key = physical_key(path, stored.codec if stored else None)
+    storage = get_storage()
+    size = stored.stored_size if stored else storage.size(key)
+    storage.delete(key)
+    if size is not None:
+        count_usage(db, key, -1, -size)
+    if stored:
+        db.delete(stored)
+
+
+def accepts_encoding(accept_encoding: str, codec: str) -> bool:
+    # Minimal Accept-Encoding parsing: "gzip, deflate, br;q=0.9, zstd;q=0"
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in (codec, "*"):
+            continue
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
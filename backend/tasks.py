@@ -0,0 +1,159 @@
+import hashlib
+import zlib
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from archive import ARCHIVE_BATCH_SIZE, archive_returned
+from changes import record_change
+from jobs import enqueue, job_handler, periodic_job
+from models import Assignment, Job, FileArtifact
+from previews import extract_file
+from resumable import collect_sessions
+from sharding import shard_ids, prune_outbox_receipts, relay_outbox
+from similarity import find_similar, index_submission
+from upload_gc import collect_orphans, purge_quarantine
+from storage import UPLOAD_DIR, iter_upload, local_copy, save_bytes, get_stored_file
+
+# Assignment columns holding uploaded files
+FILE_FIELDS = ("file_path", "solution_file_path")
+
+# Which checksum column belongs to which file column
+CHECKSUM_FIELDS = {
+    "file_path": "file_checksum",
+    "solution_file_path": "solution_checksum",
+}
+
+
+def checksum_chunks(chunks):
+    # SHA-256 and CRC-32 in a single pass
+    digest = hashlib.sha256()
+    crc = 0
+    for chunk in chunks:
+        digest.update(chunk)
+        crc = zlib.crc32(chunk, crc)
+    return digest.hexdigest(), crc
+
+
+@job_handler("checksum")
+def compute_checksum(db: Session, job: Job):
+    field = job.payload.get("field", "file_path")
+    if field not in FILE_FIELDS:
+        raise ValueError(f"Unknown file field '{field}'")
+
+    assignment = db.get(Assignment, job.assignment_id)
+    if assignment is None or not getattr(assignment, field):
+        # Nothing left to do, e.g. the assignment was deleted in the meantime
+        return {"skipped": True}
+
+    # Checksum the original bytes, not the compressed copy on disk
+    path = getattr(assignment, field)
+    checksum, crc32 = checksum_chunks(iter_upload(db, path))
+    setattr(assignment, CHECKSUM_FIELDS[field], checksum)
+    stored = get_stored_file(db, path)
+    if stored:
+        stored.crc32 = crc32
+    record_change(db, assignment, "checksum_computed")
+    db.commit()
+    return {"field": field, "sha256": checksum}
+
+
+@job_handler("extract")
+def extract_artifacts(db: Session, job: Job):
+    field = job.payload.get("field", "file_path")
+    if field not in FILE_FIELDS:
+        raise ValueError(f"Unknown file field '{field}'")
+
+    assignment = db.get(Assignment, job.assignment_id)
+    if assignment is None or not getattr(assignment, field):
+        return {"skipped": True}
+
+    source_path = getattr(assignment, field)
+    prefix = "solution" if field == "solution_file_path" else "submission"
+    with local_copy(db, source_path) as path:
+        extracted = extract_file(path)
+
+    preview_path = None
+    if extracted["preview"]:
+        preview_path = str(UPLOAD_DIR / "previews" / f"assignment_{assignment.id}_{prefix}.png")
+        save_bytes(preview_path, extracted["preview"], "image/png")
+
+    # One artifact per file field; a re-uploaded solution replaces the old one
+    artifact = db.query(FileArtifact).filter(
+        FileArtifact.assignment_id == assignment.id,
+        FileArtifact.field == field
+    ).first()
+    if artifact is None:
+        artifact = FileArtifact(assignment_id=assignment.id, field=field)
+        db.add(artifact)
+    artifact.source_path = source_path
+    artifact.content_type = extracted["content_type"]
+    artifact.page_count = extracted["page_count"]
+    artifact.text = extracted["text"]
+    artifact.preview_path = preview_path
+    record_change(db, assignment, "artifacts_extracted")
+    if field == "file_path":
+        # The extracted text is compared with other submissions
+        enqueue(db, "similarity", assignment=assignment)
+    db.commit()
+
+    return {
+        "field": field,
+        "page_count": artifact.page_count,
+        "text_length": len(artifact.text or ""),
+        "preview_path": artifact.preview_path,
+    }
+
+
+@job_handler("similarity")
+def index_similarity(db: Session, job: Job):
+    assignment = db.get(Assignment, job.assignment_id)
+    if assignment is None:
+        return {"skipped": True}
+
+    record = index_submission(db, assignment)
+    db.commit()
+    if record is None:
+        return {"indexed": False}
+    return {
+        "indexed": True,
+        "shingles": record.shingle_count,
+        "similar": [other_id for other_id, _ in find_similar(db, assignment.id)],
+    }
+
+
+@periodic_job("collect_upload_sessions", interval_seconds=3600)
+def collect_upload_sessions(db: Session, job: Job):
+    # Remove chunks of finalized uploads and of sessions abandoned past their expiry
+    return {"collected": collect_sessions(db)}
+
+
+@periodic_job("relay_outbox", interval_seconds=60)
+def relay_shard_outboxes(db: Session, job: Job):
+    # Jobs and changes left in the shard outboxes when relaying them right after their commit failed
+    if not shard_ids:
+        return {"relayed": 0}
+    return {"relayed": relay_outbox(), "pruned_receipts": prune_outbox_receipts()}
+
+
+@periodic_job("archive_returned_assignments", interval_seconds=86400)
+def archive_returned_assignments(db: Session, job: Job):
+    # Move assignments returned more than ARCHIVE_AFTER_DAYS ago to the archive tables
+    archived = 0
+    while True:
+        count = archive_returned(db)
+        archived += count
+        if count < ARCHIVE_BATCH_SIZE:
+            return {"archived": archived}
+
+
+@periodic_job("collect_orphaned_uploads", interval_seconds=86400)
+def collect_orphaned_uploads(db: Session, job: Job):
+    # Quarantine unreferenced uploads, delete expired quarantined ones and refresh the usage counters
+    def renew_lease():
+        # The scan can outlast JOB_LEASE_SECONDS on large trees
+        job.locked_at = datetime.utcnow()
+
+    result = collect_orphans(db, heartbeat=renew_lease)
+    result.update(purge_quarantine(db))
+    return result
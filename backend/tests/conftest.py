@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The backend reads its settings from the environment when it is imported, so
+# the tests point it at throwaway SQLite databases first: a directory and three
+# shards, so that the sharded code paths (see sharding.py) are exercised.
+WORK_DIR = Path(tempfile.mkdtemp(prefix="assignment-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR / 'directory.db'}"
+os.environ["SHARD_DATABASE_URLS"] = ",".join(f"sqlite:///{WORK_DIR / f'shard{i}.db'}" for i in range(3))
+os.environ["JOB_WORKERS"] = "0"
+os.environ["LOAD_SHEDDING"] = "false"
+os.environ["SINGLE_FLIGHT"] = "false"
+
+# Uploads are stored relative to the working directory
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from startup import init_db  # noqa: E402
+
+# Migrates the directory and creates the shard tables, as before the server starts
+init_db()
+
+import main  # noqa: E402,F401
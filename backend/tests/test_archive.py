@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import sharding
+from archive import archive_returned
+from database import SessionLocal
+from models import ArchivedAssignment, Assignment, AssignmentStatus, Comment, Subject, User, UserRole
+
+
+def test_archive_returned_across_shards():
+    assert len(sharding.shard_ids) == 3
+    db = SessionLocal()
+    tutor = User(name="Tutor", email="tutor@example.com", hashed_password="x", role=UserRole.TUTOR)
+    students = [
+        User(name=f"Student {i}", email=f"student{i}@example.com", hashed_password="x", role=UserRole.STUDENT)
+        for i in range(3)
+    ]
+    subject = Subject(name="Math")
+    db.add_all([tutor, *students, subject])
+    db.commit()
+
+    # One returned assignment per student, so they land on different shards
+    long_ago = datetime.utcnow() - timedelta(days=400)
+    ids = []
+    for student in students:
+        assignment = Assignment(
+            title=f"Essay by {student.name}", student_id=student.id, tutor_id=tutor.id, subject_id=subject.id,
+            status=AssignmentStatus.RETURNED, returned_at=long_ago,
+        )
+        assignment.comments.append(Comment(text="Well done", user_id=tutor.id))
+        db.add(assignment)
+        db.commit()
+        ids.append(assignment.id)
+    assert len({sharding.shard_for_id(assignment_id) for assignment_id in ids}) > 1
+
+    # Not returned long enough ago
+    recent = Assignment(
+        title="Recent", student_id=students[0].id, tutor_id=tutor.id, subject_id=subject.id,
+        status=AssignmentStatus.RETURNED, returned_at=datetime.utcnow(),
+    )
+    db.add(recent)
+    db.commit()
+
+    assert archive_returned(db) == 3
+    db.expire_all()
+    assert [assignment.id for assignment in db.query(Assignment)] == [recent.id]
+    archived = db.query(ArchivedAssignment).order_by(ArchivedAssignment.id).all()
+    assert [assignment.id for assignment in archived] == sorted(ids)
+    assert all([comment.text for comment in assignment.comments] == ["Well done"] for assignment in archived)
+    assert sharding.count_rows(db, select(Comment)) == 0
+    db.close()
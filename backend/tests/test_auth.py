@@ -0,0 +1,33 @@
+from fastapi.testclient import TestClient
+
+import main
+import ratelimit
+from auth import get_password_hash
+from database import SessionLocal
+from models import User, UserRole
+
+client = TestClient(main.app)
+
+
+def login(password: str, ip: str) -> int:
+    return client.post(
+        "/token", data={"username": "ratelimit@example.com", "password": password},
+        headers={"X-Forwarded-For": ip},
+    ).status_code
+
+
+def test_only_failed_logins_count_against_the_email_limit(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUST_PROXY_HEADERS", True)
+    db = SessionLocal()
+    db.add(User(name="Rate", email="ratelimit@example.com", hashed_password=get_password_hash("secret"),
+                role=UserRole.STUDENT))
+    db.commit()
+    db.close()
+
+    burst = ratelimit.login_email_bucket.burst
+    assert [login("secret", "10.0.0.1") for _ in range(burst + 1)] == [200] * (burst + 1)
+    assert [login("wrong", "10.0.0.2") for _ in range(burst)] == [401] * burst
+    assert login("wrong", "10.0.0.2") == 429
+    assert login("secret", "10.0.0.2") == 429
+    # Failing on purpose from one address does not lock the owner out elsewhere
+    assert login("secret", "10.0.0.1") == 200
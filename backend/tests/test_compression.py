@@ -0,0 +1,16 @@
+from compression import encoded_etag, etag_matches
+
+
+def test_each_encoding_has_its_own_etag():
+    assert encoded_etag('"abc"', "gzip") == '"abc-gzip"'
+    assert encoded_etag('"abc"', "br") == '"abc-br"'
+
+
+def test_etag_matches_any_encoding_of_the_body():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"abc-br"', '"abc"')
+    assert etag_matches('W/"abc-gzip"', '"abc"')
+    assert etag_matches('"xyz", "abc-gzip"', '"abc-br"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd-gzip"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from database import SessionLocal
+from models import User, UserRole
+
+client = TestClient(main.app)
+
+
+def login(email: str) -> dict:
+    db = SessionLocal()
+    db.add(User(name=email, email=email, hashed_password="x", role=UserRole.STUDENT))
+    db.commit()
+    db.close()
+    return {"Authorization": "Bearer " + create_access_token({"sub": email})}
+
+
+def test_presigned_put_is_limited_to_its_user_size_and_one_upload():
+    owner, other = login("presign-owner@example.com"), login("presign-other@example.com")
+    presigned = client.post("/files/presign", json={"filename": "essay.txt", "size": 100}, headers=owner).json()
+    url = presigned["upload_url"]
+
+    assert client.put(url, content=b"x" * 10).status_code == 401
+    assert client.put(url, content=b"x" * 10, headers=other).status_code == 403
+    assert client.put(url, content=b"x" * 101, headers=owner).status_code == 413
+    assert client.put(url.replace("max_size=100", "max_size=1000"), content=b"x", headers=owner).status_code == 403
+
+    response = client.put(url, content=b"x" * 100, headers=owner)
+    assert response.status_code == 200
+    assert response.json() == {"file_key": presigned["file_key"], "size": 100}
+    assert client.put(url, content=b"y" * 10, headers=owner).status_code == 409
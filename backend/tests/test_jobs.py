@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import jobs
+import main
+from auth import create_access_token
+from database import SessionLocal
+from models import Job, JobStatus, User, UserRole
+
+
+@jobs.periodic_job("test_failing_periodic", 3600)
+def failing_periodic(db, job):
+    raise RuntimeError("boom")
+
+
+def test_periodic_job_is_rescheduled_after_final_failure():
+    db = SessionLocal()
+    jobs.enqueue(db, "test_failing_periodic", max_attempts=1)
+    db.commit()
+
+    assert jobs.work_once("test-worker")
+    db.expire_all()
+    runs = db.query(Job).filter(Job.kind == "test_failing_periodic").order_by(Job.id).all()
+    assert [run.status for run in runs] == [JobStatus.FAILED, JobStatus.QUEUED]
+    assert runs[1].run_at > datetime.utcnow()
+    db.close()
+
+
+def test_failed_periodic_job_cannot_be_retried():
+    db = SessionLocal()
+    db.add(User(name="jobs-admin", email="jobs-admin@example.com", hashed_password="x", role=UserRole.ADMIN))
+    failed = jobs.enqueue(db, "test_failing_periodic")
+    failed.status = JobStatus.FAILED
+    db.commit()
+
+    admin = {"Authorization": "Bearer " + create_access_token({"sub": "jobs-admin@example.com"})}
+    response = TestClient(main.app).post(f"/jobs/{failed.id}/retry", headers=admin)
+    assert response.status_code == 400
+    db.refresh(failed)
+    assert failed.status == JobStatus.FAILED
+    db.close()
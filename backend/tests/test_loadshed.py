@@ -0,0 +1,95 @@
+import asyncio
+
+from loadshed import LoadShedder, RouteClass
+
+
+def shedder(concurrency: int, *classes: RouteClass) -> LoadShedder:
+    return LoadShedder(list(classes), concurrency)
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def scenario():
+        reads = RouteClass("read", 1, 1, 5, 5)
+        load = shedder(10, reads)
+        assert await load.acquire(reads) is None
+        admitted = []
+
+        async def request(number: int):
+            assert await load.acquire(reads) is None
+            admitted.append(number)
+
+        waiting = [asyncio.create_task(request(number)) for number in range(3)]
+        await asyncio.sleep(0)
+        assert len(reads.waiters) == 3
+        for _ in range(3):
+            load.release(reads)
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiting)
+        assert admitted == [0, 1, 2]
+        assert (reads.active, reads.admitted) == (1, 4)
+
+    asyncio.run(scenario())
+
+
+def test_lower_priority_is_shed_while_higher_priority_waits():
+    async def scenario():
+        submissions = RouteClass("submission", 3, 5, 5, 5)
+        admin = RouteClass("admin", 0, 5, 5, 5)
+        load = shedder(1, submissions, admin)
+        assert await load.acquire(admin) is None
+
+        # The overall limit is reached, so the submission queues for the next slot
+        submission = asyncio.create_task(load.acquire(submissions))
+        await asyncio.sleep(0)
+        assert len(submissions.waiters) == 1
+        assert await load.acquire(admin) == "preempted"
+
+        load.release(admin)
+        assert await submission is None
+        assert (load.active, submissions.active, admin.active) == (1, 1, 0)
+        assert admin.rejected["preempted"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_and_deadline_shed_requests():
+    async def scenario():
+        reads = RouteClass("read", 1, 1, 1, 0.05)
+        load = shedder(10, reads)
+        assert await load.acquire(reads) is None
+        waiting = asyncio.create_task(load.acquire(reads))
+        await asyncio.sleep(0)
+        assert await load.acquire(reads) == "queue_full"
+        assert await waiting == "deadline"
+        assert not reads.waiters
+        assert reads.rejected == {"queue_full": 1, "deadline": 1, "preempted": 0}
+
+        # The slot is still there for the next request once it is released
+        load.release(reads)
+        assert await load.acquire(reads) is None
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiters_give_up_their_place_or_their_slot():
+    async def scenario():
+        reads = RouteClass("read", 1, 1, 5, 5)
+        load = shedder(10, reads)
+        assert await load.acquire(reads) is None
+
+        # Cancelled while still queued: taken out of the queue
+        waiting = asyncio.create_task(load.acquire(reads))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert not reads.waiters and reads.active == 1
+
+        # Cancelled after the slot was handed over: the slot is released again
+        waiting = asyncio.create_task(load.acquire(reads))
+        await asyncio.sleep(0)
+        load.release(reads)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert (reads.active, load.active) == (0, 0)
+
+    asyncio.run(scenario())
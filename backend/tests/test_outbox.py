@@ -0,0 +1,80 @@
+from sqlalchemy import func, select
+
+import sharding
+from changes import record_change
+from database import SessionLocal
+from jobs import enqueue
+from models import Assignment, AssignmentChange, Job, JobStatus, Subject, User, UserRole
+from sharding import engines, outbox_receipts, relay_outbox, shard_outbox
+
+
+def outbox_size() -> int:
+    total = 0
+    for shard_id in sharding.shard_ids:
+        with engines[shard_id].connect() as connection:
+            total += connection.execute(select(func.count()).select_from(shard_outbox)).scalar()
+    return total
+
+
+def new_assignment(db, email: str) -> Assignment:
+    student = User(name=email, email=email, hashed_password="x", role=UserRole.STUDENT)
+    subject = Subject(name=f"Subject of {email}")
+    db.add_all([student, subject])
+    db.commit()
+    assignment = Assignment(title="Essay", student_id=student.id, subject_id=subject.id)
+    db.add(assignment)
+    enqueue(db, "checksum", {"field": "file_path"}, assignment=assignment)
+    record_change(db, assignment, "created")
+    return assignment
+
+
+def test_jobs_and_changes_commit_with_their_assignment():
+    db = SessionLocal()
+    assignment = new_assignment(db, "outbox-commit@example.com")
+    db.commit()
+
+    # Relayed to the directory right after the commit
+    assert outbox_size() == 0
+    job = db.query(Job).filter(Job.assignment_id == assignment.id).one()
+    assert (job.kind, job.status, job.payload, job.attempts) == ("checksum", JobStatus.QUEUED, {"field": "file_path"}, 0)
+    assert db.query(AssignmentChange.action).filter(AssignmentChange.assignment_id == assignment.id).all() == [("created",)]
+
+    # Rolled back with the assignment
+    student_id = assignment.student_id
+    rolled_back = Assignment(title="Draft", student_id=student_id, subject_id=assignment.subject_id)
+    db.add(rolled_back)
+    record_change(db, rolled_back, "created")
+    db.rollback()
+    assert outbox_size() == 0
+    assert db.query(AssignmentChange).filter(AssignmentChange.student_id == student_id).count() == 1
+    db.close()
+
+
+def test_entries_left_in_the_outbox_are_relayed_once(monkeypatch):
+    def fail(shards=None):
+        raise RuntimeError("directory unavailable")
+
+    db = SessionLocal()
+    monkeypatch.setattr(sharding, "relay_outbox", fail)
+    assignment = new_assignment(db, "outbox-retry@example.com")
+    db.commit()
+    monkeypatch.undo()
+
+    assert outbox_size() == 2
+    assert db.query(Job).filter(Job.assignment_id == assignment.id).count() == 0
+
+    # One entry was relayed before, but not deleted from the shard
+    shard_id = sharding.shard_for_id(assignment.id)
+    with engines[shard_id].connect() as connection:
+        relayed = connection.execute(
+            select(shard_outbox.c.id).where(shard_outbox.c.table_name == "assignment_changes")
+        ).scalar_one()
+    with engines[sharding.DIRECTORY].begin() as connection:
+        connection.execute(outbox_receipts.insert().values(id=relayed, created_at=assignment.created_at))
+
+    assert relay_outbox() == 1
+    assert relay_outbox() == 0
+    assert outbox_size() == 0
+    assert db.query(Job).filter(Job.assignment_id == assignment.id).count() == 1
+    assert db.query(AssignmentChange).filter(AssignmentChange.assignment_id == assignment.id).count() == 0
+    db.close()
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiler
+from profiler import ProfilerMiddleware
+
+
+def spin_on_loop():
+    deadline = time.perf_counter() + 0.3
+    while time.perf_counter() < deadline:
+        pass
+
+
+def spin_in_threadpool():
+    deadline = time.perf_counter() + 0.3
+    while time.perf_counter() < deadline:
+        pass
+
+
+app = FastAPI()
+app.add_middleware(ProfilerMiddleware, sample_rate=1)
+
+
+@app.get("/loop")
+async def loop_route():
+    spin_on_loop()
+
+
+@app.get("/threadpool")
+def threadpool_route():
+    spin_in_threadpool()
+
+
+def test_profiles_only_show_their_own_request(monkeypatch):
+    profiles = {}
+    monkeypatch.setattr(profiler, "write_profile",
+                        lambda route, profile, *args: profiles.setdefault(route, profile))
+    client = TestClient(app)
+
+    # Each runs on its own event loop, at the same time as the other
+    requests = [threading.Thread(target=client.get, args=(path,)) for path in ("/loop", "/threadpool")]
+    for request in requests:
+        request.start()
+    for request in requests:
+        request.join()
+
+    loop_stacks = "\n".join(profiles["GET_loop"].counts)
+    threadpool_stacks = "\n".join(profiles["GET_threadpool"].counts)
+    assert "spin_on_loop" in loop_stacks and "spin_in_threadpool" not in loop_stacks
+    assert "spin_in_threadpool" in threadpool_stacks and "spin_on_loop" not in threadpool_stacks
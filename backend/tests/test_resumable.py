@@ -0,0 +1,89 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+
+from database import SessionLocal
+from models import User, UserRole, UploadChunk
+from resumable import (
+    SESSION_DIR, UploadError, chunk_key, consume_session, create_session, get_user_session, write_chunk
+)
+from storage import UPLOAD_DIR, get_storage
+
+
+async def body(*parts: bytes):
+    for part in parts:
+        await asyncio.sleep(0)  # lets parallel uploads interleave
+        yield part
+
+
+def new_session(email: str, size: int):
+    db = SessionLocal()
+    user = User(name=email, email=email, hashed_password="x", role=UserRole.STUDENT)
+    db.add(user)
+    db.commit()
+    session = create_session(db, user, "submission", "essay.txt", size)
+    return db, user, session
+
+
+def stored_keys(session_id: str) -> list:
+    return [key for key, _, _ in get_storage().iter_keys(str(SESSION_DIR / session_id))]
+
+
+def test_parallel_writes_at_the_same_offset_record_one_whole_chunk():
+    db, user, session = new_session("resumable-race@example.com", 8)
+
+    async def upload(data: bytes):
+        other = SessionLocal()
+        try:
+            await write_chunk(other, get_user_session(other, session.id, user), 0, body(data[:4], data[4:]))
+        finally:
+            other.close()
+
+    async def race():
+        await asyncio.gather(upload(b"a" * 8), upload(b"b" * 8))
+
+    asyncio.run(race())
+
+    db.expire_all()
+    assert len(session.chunks) == 1
+    with get_storage().open_read(chunk_key(session.id, 0)) as src:
+        data = src.read()
+    assert data in (b"a" * 8, b"b" * 8)
+    assert session.chunks[0].checksum == hashlib.sha256(data).hexdigest()
+    # The losing attempt was moved over or removed, not left behind
+    assert stored_keys(session.id) == [chunk_key(session.id, 0)]
+    db.close()
+
+
+def test_overlapping_chunk_and_bad_checksum_are_rejected():
+    db, user, session = new_session("resumable-overlap@example.com", 8)
+    asyncio.run(write_chunk(db, session, 0, body(b"abcd")))
+
+    with pytest.raises(UploadError) as exc:
+        asyncio.run(write_chunk(db, session, 2, body(b"cdef")))
+    assert exc.value.status_code == 409
+
+    checksum = "sha256 " + base64.b64encode(hashlib.sha256(b"other").digest()).decode()
+    with pytest.raises(UploadError) as exc:
+        asyncio.run(write_chunk(db, session, 4, body(b"efgh"), checksum))
+    assert exc.value.status_code == 460
+
+    assert [(chunk.offset, chunk.size) for chunk in session.chunks] == [(0, 4)]
+    assert stored_keys(session.id) == [chunk_key(session.id, 0)]
+    db.close()
+
+
+def test_consume_requires_chunks_that_add_up_to_the_upload():
+    db, user, session = new_session("resumable-consume@example.com", 8)
+    asyncio.run(write_chunk(db, session, 0, body(b"abcdef")))
+    # Overlaps the first chunk, as a chunk recorded by a racing request could have
+    db.add(UploadChunk(session_id=session.id, offset=4, size=4, checksum="x"))
+    db.commit()
+
+    with pytest.raises(UploadError) as exc:
+        consume_session(db, session.id, user, "submission", UPLOAD_DIR / "consume", "")
+    assert exc.value.status_code == 409
+    assert session.completed_at is None
+    db.close()
@@ -0,0 +1,18 @@
+import random
+
+from similarity import band_keys, band_layout, minhash
+
+
+def test_default_threshold_finds_pairs_just_above_it():
+    # 1 - (1 - 0.6^4)^32 = 98.8% of pairs at 0.6 share a band; 16 bands of 8 rows found 24%
+    assert band_layout(0.5) == (32, 4)
+
+    # Planted pairs of sets that share 60 of 100 shingles: Jaccard similarity 0.6
+    rng = random.Random(7)
+    found = 0
+    for _ in range(100):
+        shared = {rng.getrandbits(64) for _ in range(60)}
+        a = shared | {rng.getrandbits(64) for _ in range(20)}
+        b = shared | {rng.getrandbits(64) for _ in range(20)}
+        found += bool(set(band_keys(minhash(a))) & set(band_keys(minhash(b))))
+    assert found >= 95
@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def start_leader(flight: SingleFlight, executor: ThreadPoolExecutor, call):
+    started, finish = threading.Event(), threading.Event()
+
+    def leader():
+        started.set()
+        finish.wait(5)
+        return call()
+
+    future = executor.submit(flight.do, "route", "key", leader)
+    started.wait(5)
+    return future, finish
+
+
+def join_follower(flight: SingleFlight, executor: ThreadPoolExecutor):
+    future = executor.submit(flight.do, "route", "key", lambda: pytest.fail("a follower ran the call"))
+    # The follower has joined once it is counted
+    while flight.coalesced["route"] < 1:
+        time.sleep(0.001)
+    return future
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader, finish = start_leader(flight, executor, lambda: {"answer": 42})
+        follower = join_follower(flight, executor)
+        finish.set()
+        assert leader.result(5) == follower.result(5) == {"answer": 42}
+    assert (flight.executed["route"], flight.coalesced["route"], flight.calls) == (1, 1, {})
+
+    # Finished calls are not cached
+    assert flight.do("route", "key", lambda: "again") == "again"
+    assert flight.executed["route"] == 2
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+
+    def fail():
+        raise LookupError("gone")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader, finish = start_leader(flight, executor, fail)
+        follower = join_follower(flight, executor)
+        finish.set()
+        with pytest.raises(LookupError):
+            leader.result(5)
+        with pytest.raises(LookupError):
+            follower.result(5)
+    assert flight.calls == {}
+
+
+def test_calls_that_do_not_join_run_on_their_own():
+    flight = SingleFlight()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader, finish = start_leader(flight, executor, lambda: "shared")
+        assert flight.do("route", "key", lambda: "own", join=False) == "own"
+        finish.set()
+        assert leader.result(5) == "shared"
+    assert (flight.executed["route"], flight.coalesced["route"]) == (2, 0)
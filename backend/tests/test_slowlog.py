@@ -0,0 +1,11 @@
+from slowlog import is_explainable
+
+
+def test_only_reads_are_explained():
+    assert is_explainable("SELECT assignments.id, assignments.updated_at FROM assignments")
+    assert is_explainable("WITH recent AS (SELECT id FROM assignments) SELECT * FROM recent")
+    assert not is_explainable("WITH gone AS (DELETE FROM jobs RETURNING id) SELECT * FROM gone")
+    assert not is_explainable("WITH moved AS (INSERT INTO jobs (kind) VALUES ('x') RETURNING id) SELECT id FROM moved")
+    assert not is_explainable("SELECT * FROM jobs WHERE status = 'QUEUED' FOR UPDATE SKIP LOCKED")
+    assert not is_explainable("SELECT * FROM jobs FOR SHARE")
+    assert not is_explainable("UPDATE jobs SET status = 'DONE'")
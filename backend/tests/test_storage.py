@@ -0,0 +1,30 @@
+import io
+from pathlib import Path
+
+from database import SessionLocal
+from models import StorageUsage
+from storage import delete_upload, relocate_upload, save_upload
+
+
+def usage(db, user_id):
+    row = db.query(StorageUsage).filter(StorageUsage.user_id == user_id).one()
+    return row.file_count, row.total_bytes
+
+
+def test_uploads_and_deletions_update_storage_usage():
+    db = SessionLocal()
+    first = save_upload(db, io.BytesIO(b"compressible " * 1000), Path("uploads/student_901/a.txt"))
+    second = save_upload(db, io.BytesIO(bytes(range(256)) * 4), Path("uploads/student_901/b.bin"))
+    db.commit()
+    assert usage(db, 901) == (2, first.stored_size + second.stored_size)
+
+    archived = relocate_upload(db, "uploads/student_901/b.bin", "uploads/archive/student_901/b.bin")
+    delete_upload(db, "uploads/student_901/b.bin")
+    db.commit()
+    assert usage(db, 901) == (2, first.stored_size + archived.stored_size)
+
+    delete_upload(db, "uploads/student_901/a.txt")
+    delete_upload(db, "uploads/archive/student_901/b.bin")
+    db.commit()
+    assert usage(db, 901) == (0, 0)
+    db.close()
@@ -0,0 +1,233 @@
+"""Garbage collection of uploaded files that nothing refers to any more.
+
+Files are left behind when a solution is uploaded again, when users or
+subjects are deleted, or when a request fails after the file was written.
+Each run lists the uploads tree and checks the listed files against the
+database in batches. Files that nothing references are moved to
+``uploads/.quarantine``, and they are deleted once they have been there for
+UPLOAD_GC_QUARANTINE_DAYS. Uploads and deletions keep the per-user storage
+usage counters up to date; the same pass recounts them from the listing to
+correct any drift.
+
+Runs daily as a background job, or by hand:
+
+    python upload_gc.py --dry-run
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from models import Assignment, ArchivedAssignment, FileArtifact, QuarantinedFile, StorageUsage, StoredFile
+from resumable import SESSION_DIR
+from storage import UPLOAD_DIR, CODEC_SUFFIXES, QUARANTINE_DIR, count_usage, get_storage, owner_id
+
+# Files younger than this are never collected. They may belong to a request
+# that has not committed yet, or to a presigned upload not registered yet
+UPLOAD_GC_GRACE_HOURS = float(os.getenv("UPLOAD_GC_GRACE_HOURS", "24"))
+# Quarantined files are put back if they are referenced again before this
+UPLOAD_GC_QUARANTINE_DAYS = float(os.getenv("UPLOAD_GC_QUARANTINE_DAYS", "7"))
+UPLOAD_GC_BATCH_SIZE = 500
+
+# Columns holding the logical path of a stored file
+REFERENCE_COLUMNS = (
+    Assignment.file_path,
+    Assignment.solution_file_path,
+    ArchivedAssignment.file_path,
+    ArchivedAssignment.solution_file_path,
+    FileArtifact.preview_path,
+)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def is_under(key: str, directory: Path) -> bool:
+    return key.startswith(str(directory) + "/")
+
+
+def logical_paths(key: str) -> List[str]:
+    # A storage key is the logical path, plus a codec suffix when compressed
+    paths = [key]
+    for suffix in CODEC_SUFFIXES.values():
+        if key.endswith(suffix):
+            paths.append(key[:-len(suffix)])
+    return paths
+
+
+def quarantine_key(key: str) -> str:
+    return str(QUARANTINE_DIR / os.path.relpath(key, UPLOAD_DIR))
+
+
+def referenced_paths(db: Session, paths: List[str]) -> Set[str]:
+    """The subset of ``paths`` that some row refers to."""
+    found = set()
+    if not paths:
+        return found
+    for column in REFERENCE_COLUMNS:
+        found.update(value for (value,) in db.query(column).filter(column.in_(paths)))
+    return found
+
+
+def collect_orphans(db: Session, now: Optional[datetime] = None, dry_run: bool = False,
+                    heartbeat: Optional[Callable[[], None]] = None) -> dict:
+    """Quarantine unreferenced uploads and recount the storage usage counters.
+
+    ``heartbeat`` is called before each batch is committed, so that a job
+    running this can renew its lease.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=UPLOAD_GC_GRACE_HOURS)
+    storage = get_storage()
+    # user_id -> [file count, bytes, quarantined bytes]
+    usage: Dict[Optional[int], List[int]] = {}
+    result = {"scanned": 0, "total_bytes": 0, "quarantined": 0, "quarantined_bytes": 0}
+
+    # Keys are listed in sorted order, so .quarantine is listed before this
+    # run moves anything into it and no file is counted twice
+    for batch in batched(storage.iter_keys(str(UPLOAD_DIR)), UPLOAD_GC_BATCH_SIZE):
+        candidates = []
+        for key, size, modified in batch:
+            counts = usage.setdefault(owner_id(key), [0, 0, 0])
+            counts[0] += 1
+            counts[1] += size
+            result["scanned"] += 1
+            result["total_bytes"] += size
+            if is_under(key, QUARANTINE_DIR):
+                counts[2] += size
+            elif not is_under(key, SESSION_DIR) and modified < cutoff:
+                # Upload session chunks are collected with their sessions
+                candidates.append((key, size))
+
+        paths = [path for key, _ in candidates for path in logical_paths(key)]
+        referenced = referenced_paths(db, paths)
+        already = {path for (path,) in db.query(QuarantinedFile.path).filter(
+            QuarantinedFile.path.in_([key for key, _ in candidates])
+        )} if candidates else set()
+        orphans = [
+            (key, size) for key, size in candidates
+            if key not in already and not referenced.intersection(logical_paths(key))
+        ]
+        result["quarantined"] += len(orphans)
+        result["quarantined_bytes"] += sum(size for _, size in orphans)
+        if dry_run or not orphans:
+            continue
+
+        # Record the files before moving them: a file that was recorded but
+        # not moved is only looked up again, one that was moved unrecorded
+        # would stay in quarantine forever
+        records = [
+            QuarantinedFile(path=key, size=size, user_id=owner_id(key), quarantined_at=now)
+            for key, size in orphans
+        ]
+        db.add_all(records)
+        if heartbeat:
+            heartbeat()
+        db.commit()
+        for record in records:
+            if storage.size(record.path) is None:
+                # Deleted in the meantime
+                db.delete(record)
+                continue
+            storage.move(record.path, quarantine_key(record.path))
+            usage[record.user_id][2] += record.size
+        db.commit()
+
+    if not dry_run:
+        db.query(StorageUsage).delete()
+        db.add_all([
+            StorageUsage(user_id=user_id, file_count=count, total_bytes=total,
+                         quarantined_bytes=quarantined, updated_at=now)
+            for user_id, (count, total, quarantined) in usage.items()
+        ])
+        db.commit()
+    return result
+
+
+def purge_quarantine(db: Session, now: Optional[datetime] = None, dry_run: bool = False) -> dict:
+    """Delete quarantined files past UPLOAD_GC_QUARANTINE_DAYS, and put back
+    any that are referenced again."""
+    now = now or datetime.utcnow()
+    expired = now - timedelta(days=UPLOAD_GC_QUARANTINE_DAYS)
+    storage = get_storage()
+    result = {"deleted": 0, "deleted_bytes": 0, "restored": 0}
+
+    last_id = 0
+    while True:
+        records = db.query(QuarantinedFile).filter(
+            QuarantinedFile.id > last_id
+        ).order_by(QuarantinedFile.id).limit(UPLOAD_GC_BATCH_SIZE).all()
+        if not records:
+            return result
+        last_id = records[-1].id
+
+        referenced = referenced_paths(db, [path for record in records for path in logical_paths(record.path)])
+        for record in records:
+            if referenced.intersection(logical_paths(record.path)):
+                result["restored"] += 1
+                if not dry_run:
+                    if storage.size(quarantine_key(record.path)) is not None:
+                        storage.move(quarantine_key(record.path), record.path)
+                    count_usage(db, record.path, 0, 0, -record.size)
+                    db.delete(record)
+            elif record.quarantined_at < expired:
+                result["deleted"] += 1
+                result["deleted_bytes"] += record.size
+                if not dry_run:
+                    storage.delete(quarantine_key(record.path))
+                    count_usage(db, record.path, -1, -record.size, -record.size)
+                    db.query(StoredFile).filter(
+                        StoredFile.path.in_(logical_paths(record.path))
+                    ).delete(synchronize_session=False)
+                    db.delete(record)
+        db.commit()
+
+
+def restore(db: Session, key: str) -> bool:
+    """Move a quarantined file back to where it was."""
+    record = db.query(QuarantinedFile).filter(QuarantinedFile.path == key).first()
+    if record is None:
+        return False
+    storage = get_storage()
+    if storage.size(quarantine_key(key)) is not None:
+        storage.move(quarantine_key(key), key)
+    count_usage(db, key, 0, 0, -record.size)
+    db.delete(record)
+    db.commit()
+    return True
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Collect uploaded files that nothing refers to")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be quarantined or deleted")
+    parser.add_argument("--restore", metavar="KEY", help="Move a quarantined file back, e.g. uploads/tutor_3/x.pdf")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.restore:
+            print("restored" if restore(db, args.restore) else f"{args.restore} is not quarantined")
+            return
+        result = collect_orphans(db, dry_run=args.dry_run)
+        result.update(purge_quarantine(db, dry_run=args.dry_run))
+        print(json.dumps(result, indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
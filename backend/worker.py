@@ -0,0 +1,37 @@
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from jobs import work, ensure_periodic_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of worker threads")
+    parser.add_argument("--burst", action="store_true", help="Exit once the queue is drained")
+    args = parser.parse_args()
+
+    ensure_periodic_jobs()
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(target=work, kwargs={"stop_event": stop_event, "burst": args.burst})
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    main()
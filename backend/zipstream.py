@@ -0,0 +1,224 @@
+import struct
+import zlib
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from storage import iter_original
+
+ZIP64_LIMIT = 0xFFFFFFFF
+# Deflate can grow incompressible data slightly; entries near the limit use ZIP64 up front
+DEFLATE_MARGIN = 1 << 20
+
+FLAG_DATA_DESCRIPTOR = 0x08  # CRC and sizes follow the data instead of the local header
+FLAG_UTF8 = 0x800
+STORED = 0
+DEFLATED = 8
+
+# Files that are compressed already and would only cost CPU to deflate again
+ALREADY_COMPRESSED = {
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".zip", ".gz", ".zst", ".7z", ".rar",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp3", ".mp4", ".m4a", ".mov", ".webm",
+}
+
+
+def dos_datetime(dt: Optional[datetime]) -> Tuple[int, int]:
+    dt = max(dt or datetime(1980, 1, 1), datetime(1980, 1, 1))
+    return (
+        (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2),
+        ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day,
+    )
+
+
+class ZipEntry:
+    """One file of the archive, read from storage when the archive is streamed."""
+
+    def __init__(self, name: str, path: str, size: int, codec: Optional[str] = None,
+                 crc32: Optional[int] = None, modified: Optional[datetime] = None, deflate: bool = False):
+        self.name = name
+        self.path = path
+        self.codec = codec
+        self.size = size
+        self.crc32 = crc32
+        self.modified = modified
+        self.method = DEFLATED if deflate else STORED
+        self.compressed_size = size if not deflate else None
+        self.offset = 0
+
+    @property
+    def zip64(self) -> bool:
+        margin = DEFLATE_MARGIN if self.method == DEFLATED else 0
+        return self.size + margin >= ZIP64_LIMIT
+
+    @property
+    def encoded_name(self) -> bytes:
+        return self.name.encode("utf-8")
+
+    def local_header(self) -> bytes:
+        time_, date = dos_datetime(self.modified)
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if self.zip64 else b""
+        sizes = ZIP64_LIMIT if self.zip64 else 0
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if self.zip64 else 20, FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method, time_, date, 0, sizes, sizes, len(self.encoded_name), len(extra)
+        ) + self.encoded_name + extra
+
+    def data_descriptor(self) -> bytes:
+        if self.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, self.crc32, self.compressed_size, self.size)
+        return struct.pack("<IIII", 0x08074B50, self.crc32, self.compressed_size, self.size)
+
+    def descriptor_length(self) -> int:
+        return 24 if self.zip64 else 16
+
+    def central_header(self) -> bytes:
+        time_, date = dos_datetime(self.modified)
+        extra_values = []
+        size, compressed_size, offset = self.size, self.compressed_size, self.offset
+        if size >= ZIP64_LIMIT or self.zip64:
+            extra_values += [size, compressed_size]
+            size = compressed_size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            extra_values.append(offset)
+            offset = ZIP64_LIMIT
+        extra = b""
+        if extra_values:
+            extra = struct.pack(f"<HH{len(extra_values)}Q", 0x0001, 8 * len(extra_values), *extra_values)
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 45, 45 if extra else 20,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8, self.method, time_, date, self.crc32,
+            compressed_size, size, len(self.encoded_name), len(extra), 0, 0, 0, 0o100644 << 16, offset
+        ) + self.encoded_name + extra
+
+    def iter_data(self) -> Iterator[bytes]:
+        crc = 0
+        compressed_size = 0
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS) if self.method == DEFLATED else None
+        for chunk in iter_original(self.path, self.codec):
+            crc = zlib.crc32(chunk, crc)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            compressed_size += len(chunk)
+            if chunk:
+                yield chunk
+        if compressor:
+            tail = compressor.flush()
+            compressed_size += len(tail)
+            yield tail
+        self.crc32 = crc
+        self.compressed_size = compressed_size
+
+    def compute_crc32(self) -> int:
+        # Needed for the central directory when a range request skips this entry
+        if self.crc32 is None:
+            crc = 0
+            for chunk in iter_original(self.path, self.codec):
+                crc = zlib.crc32(chunk, crc)
+            self.crc32 = crc
+        return self.crc32
+
+
+def end_of_central_directory(count: int, cd_offset: int, cd_size: int) -> bytes:
+    records = b""
+    if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_offset = cd_offset + cd_size
+        records += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+        records += struct.pack("<IIQI", 0x07064B50, 0, zip64_offset, 1)
+        count, cd_offset, cd_size = min(count, 0xFFFF), min(cd_offset, ZIP64_LIMIT), min(cd_size, ZIP64_LIMIT)
+    return records + struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+
+
+class ZipStream:
+    """Builds a ZIP archive on the fly from files in storage, in constant memory.
+
+    With only STORED entries the layout is known before any file is read, so
+    ``content_length`` is available and any byte range can be produced
+    (``iter_range``) for resumed downloads. Archives with deflated entries can
+    only be streamed from the start.
+    """
+
+    def __init__(self, entries: List[ZipEntry]):
+        self.entries = entries
+
+    @property
+    def seekable(self) -> bool:
+        return all(entry.method == STORED for entry in self.entries)
+
+    def _segments(self) -> List[Tuple[int, Callable[[], Iterator[bytes]]]]:
+        # (length, producer) pairs that make up a STORED-only archive, in order
+        segments = []
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = entry.local_header()
+            segments.append((len(header), lambda header=header: iter([header])))
+            segments.append((entry.size, entry.iter_data))
+            segments.append((entry.descriptor_length(), lambda entry=entry: self._iter_descriptor(entry)))
+            offset += len(header) + entry.size + entry.descriptor_length()
+
+        cd_size = sum(46 + len(e.encoded_name) + self._central_extra_length(e) for e in self.entries)
+        segments.append((cd_size, self._iter_central_directory))
+        eocd_length = len(end_of_central_directory(len(self.entries), offset, cd_size))
+        segments.append((eocd_length, lambda: iter([end_of_central_directory(len(self.entries), offset, cd_size)])))
+        return segments
+
+    @staticmethod
+    def _central_extra_length(entry: ZipEntry) -> int:
+        count = (2 if entry.zip64 else 0) + (1 if entry.offset >= ZIP64_LIMIT else 0)
+        return 4 + 8 * count if count else 0
+
+    @staticmethod
+    def _iter_descriptor(entry: ZipEntry) -> Iterator[bytes]:
+        entry.compute_crc32()
+        yield entry.data_descriptor()
+
+    def _iter_central_directory(self) -> Iterator[bytes]:
+        for entry in self.entries:
+            entry.compute_crc32()
+            yield entry.central_header()
+
+    @property
+    def content_length(self) -> Optional[int]:
+        if not self.seekable:
+            return None
+        return sum(length for length, _ in self._segments())
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield bytes ``start`` to ``end`` (exclusive) of a STORED-only archive."""
+        position = 0
+        for length, produce in self._segments():
+            segment_end = position + length
+            if end is not None and position >= end:
+                break
+            if segment_end <= start:
+                position = segment_end
+                continue
+            for chunk in produce():
+                low = max(start - position, 0)
+                high = len(chunk) if end is None else min(len(chunk), end - position)
+                if high > low:
+                    yield chunk[low:high]
+                position += len(chunk)
+                if end is not None and position >= end:
+                    break
+            position = segment_end
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = entry.local_header()
+            yield header
+            offset += len(header)
+            for chunk in entry.iter_data():
+                offset += len(chunk)
+                yield chunk
+            descriptor = entry.data_descriptor()
+            yield descriptor
+            offset += len(descriptor)
+
+        cd_size = 0
+        for entry in self.entries:
+            header = entry.central_header()
+            cd_size += len(header)
+            yield header
+        yield end_of_central_directory(len(self.entries), offset, cd_size)
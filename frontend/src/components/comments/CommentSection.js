@@ -9,7 +9,9 @@ import {
 import { Send as SendIcon } from '@mui/icons-material';
 import { API_URL } from '../../config';
 
-const CommentSection = ({ assignmentId }) => {
+// Pages that already loaded the comments pass them as initialComments
+// (null while still loading); without it the section fetches them itself
+const CommentSection = ({ assignmentId, initialComments }) => {
   const dispatch = useDispatch();
   const { user } = useSelector(state => state.auth);
   
@@ -21,8 +23,12 @@ const CommentSection = ({ assignmentId }) => {
   
   // Fetch comments when component mounts
   useEffect(() => {
-    fetchComments();
-  }, [assignmentId]);
+    if (initialComments === undefined) {
+      fetchComments();
+    } else if (initialComments) {
+      setComments(initialComments);
+    }
+  }, [assignmentId, initialComments]);
   
   // Get auth config
   const getAuthConfig = () => {
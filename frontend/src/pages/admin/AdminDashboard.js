@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useDispatch, useSelector } from 'react-redux';
-import { fetchAssignments, assignTutor } from '../../store/slices/assignmentSlice';
+import { syncAssignments, assignTutor } from '../../store/slices/assignmentSlice';
 import { fetchSubjects } from '../../store/slices/subjectSlice';
 import { fetchAllTutors } from '../../store/slices/userSlice';
 import { 
@@ -39,7 +39,7 @@ const AdminDashboard = () => {
   
   // Fetch data when component mounts
   useEffect(() => {
-    dispatch(fetchAssignments());
+    dispatch(syncAssignments());
     dispatch(fetchSubjects());
     //dispatch(fetchAllTutors());
     if (tutors.length === 0) {
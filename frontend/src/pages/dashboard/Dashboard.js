@@ -1,7 +1,7 @@
 import React, { useEffect } from 'react';
 import { useSelector, useDispatch } from 'react-redux';
 import { useNavigate } from 'react-router-dom';
-import { fetchAssignments } from '../../store/slices/assignmentSlice';
+import { syncAssignments } from '../../store/slices/assignmentSlice';
 import { fetchSubjects } from '../../store/slices/subjectSlice';
 import { 
   Box, Typography, Paper, Grid, Card, CardContent, 
@@ -26,7 +26,7 @@ const Dashboard = () => {
   
   // Fetch data when component mounts
   useEffect(() => {
-    dispatch(fetchAssignments());
+    dispatch(syncAssignments());
     dispatch(fetchSubjects());
   }, [dispatch]);
   
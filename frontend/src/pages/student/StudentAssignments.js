@@ -2,7 +2,7 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useDispatch, useSelector } from 'react-redux';
-import { fetchAssignments } from '../../store/slices/assignmentSlice';
+import { syncAssignments } from '../../store/slices/assignmentSlice';
 import { 
   Box, Typography, Paper, Tabs, Tab, CircularProgress, Alert,
   Card, CardContent, CardActions, Button, Chip, Divider, Grid
@@ -24,7 +24,7 @@ const StudentAssignments = () => {
   
   // Fetch assignments when component mounts
   useEffect(() => {
-    dispatch(fetchAssignments());
+    dispatch(syncAssignments());
   }, [dispatch]);
   
   // Handle tab change
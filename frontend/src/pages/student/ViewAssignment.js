@@ -2,7 +2,7 @@
 import React, { useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useDispatch, useSelector } from 'react-redux';
-import { getAssignmentById } from '../../store/slices/assignmentSlice';
+import { fetchAssignmentWorkspace } from '../../store/slices/assignmentSlice';
 import {
   Box, Typography, Paper, Button, CircularProgress, Alert,
   Card, CardContent, Divider, Chip, Grid
@@ -22,11 +22,11 @@ const ViewAssignment = () => {
   const navigate = useNavigate();
   const dispatch = useDispatch();
   
-  const { currentAssignment, loading, error } = useSelector(state => state.assignments);
+  const { currentAssignment, currentComments, loading, error } = useSelector(state => state.assignments);
   
   // Fetch assignment data when component mounts
   useEffect(() => {
-    dispatch(getAssignmentById(id));
+    dispatch(fetchAssignmentWorkspace(id));
   }, [dispatch, id]);
   
   // Get status chip color
@@ -54,6 +54,12 @@ const ViewAssignment = () => {
     return new Date(dateString).toLocaleDateString(undefined, options);
   };
   
+  // Preview image generated for an uploaded file, if processing has finished
+  const getPreviewPath = (field) => {
+    const artifact = currentAssignment?.artifacts?.find((a) => a.field === field);
+    return artifact?.preview_path;
+  };
+  
   if (loading && !currentAssignment) {
     return (
       <Box className="flex justify-center items-center h-64">
@@ -160,6 +166,15 @@ const ViewAssignment = () => {
                 
                 {currentAssignment.file_path && (
                   <Box className="mt-4">
+                    {getPreviewPath('file_path') && (
+                      <Box className="mb-2">
+                        <img
+                          src={`${API_URL}/${getPreviewPath('file_path')}`}
+                          alt="First page of the submission"
+                          className="border rounded max-w-xs"
+                        />
+                      </Box>
+                    )}
                     <Button
                       variant="outlined"
                       startIcon={<DownloadIcon />}
@@ -255,7 +270,7 @@ const ViewAssignment = () => {
           </Typography>
         </Box>
         
-        <CommentSection assignmentId={id} />
+        <CommentSection assignmentId={id} initialComments={currentComments} />
       </Paper>
     </Box>
   );
@@ -3,7 +3,7 @@ import React, { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useDispatch, useSelector } from 'react-redux';
 import { 
-  getAssignmentById, 
+  fetchAssignmentWorkspace, 
   updateAssignmentStatus, 
   uploadSolution 
 } from '../../store/slices/assignmentSlice';
@@ -29,7 +29,7 @@ const ReviewAssignment = () => {
   const navigate = useNavigate();
   const dispatch = useDispatch();
   
-  const { currentAssignment, loading, error } = useSelector(state => state.assignments);
+  const { currentAssignment, currentComments, loading, error } = useSelector(state => state.assignments);
   
   // Local state
   const [status, setStatus] = useState('');
@@ -42,7 +42,7 @@ const ReviewAssignment = () => {
   
   // Fetch assignment data when component mounts
   useEffect(() => {
-    dispatch(getAssignmentById(id));
+    dispatch(fetchAssignmentWorkspace(id));
   }, [dispatch, id]);
   
   // Update status state when assignment data is loaded
@@ -147,6 +147,12 @@ const ReviewAssignment = () => {
     return new Date(dateString).toLocaleDateString(undefined, options);
   };
   
+  // Preview image generated for an uploaded file, if processing has finished
+  const getPreviewPath = (field) => {
+    const artifact = currentAssignment?.artifacts?.find((a) => a.field === field);
+    return artifact?.preview_path;
+  };
+  
   if (loading && !currentAssignment) {
     return (
       <Box className="flex justify-center items-center h-64">
@@ -275,6 +281,15 @@ const ReviewAssignment = () => {
                 
                 {currentAssignment.file_path && (
                   <Box className="mt-4">
+                    {getPreviewPath('file_path') && (
+                      <Box className="mb-2">
+                        <img
+                          src={`${API_URL}/${getPreviewPath('file_path')}`}
+                          alt="First page of the submission"
+                          className="border rounded max-w-xs"
+                        />
+                      </Box>
+                    )}
                     <Button
                       variant="outlined"
                       startIcon={<DownloadIcon />}
@@ -403,7 +418,7 @@ const ReviewAssignment = () => {
           </Typography>
         </Box>
         
-        <CommentSection assignmentId={id} />
+        <CommentSection assignmentId={id} initialComments={currentComments} />
       </Paper>
     </Box>
   );
@@ -3,7 +3,7 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useDispatch, useSelector } from 'react-redux';
-import { fetchAssignments } from '../../store/slices/assignmentSlice';
+import { syncAssignments } from '../../store/slices/assignmentSlice';
 import { 
   Box, Typography, Paper, Tabs, Tab, CircularProgress, Alert,
   Card, CardContent, CardActions, Button, Chip, Divider, Grid
@@ -25,7 +25,7 @@ const TutorAssignments = () => {
   
   // Fetch assignments when component mounts
   useEffect(() => {
-    dispatch(fetchAssignments());
+    dispatch(syncAssignments());
   }, [dispatch]);
   
   // Handle tab change
@@ -6,8 +6,12 @@ import { API_URL } from '../../config';
 const initialState = {
   assignments: [],
   currentAssignment: null,
+  currentComments: null,
   loading: false,
   error: null,
+  // Change feed cursor for incremental sync, and the user it belongs to
+  changeCursor: null,
+  syncedUserId: null,
 };
 
 // Helper function to set auth header
@@ -36,6 +40,47 @@ export const fetchAssignments = createAsyncThunk(
   }
 );
 
+// Sync assignments incrementally from the change feed; the first sync loads the full list
+export const syncAssignments = createAsyncThunk(
+  'assignments/sync',
+  async (_, { getState, rejectWithValue }) => {
+    try {
+      const user = JSON.parse(localStorage.getItem('user'));
+      const { changeCursor, syncedUserId } = getState().assignments;
+
+      if (changeCursor === null || syncedUserId !== user?.id) {
+        const response = await axios.get(`${API_URL}/assignments`, getAuthConfig());
+        return {
+          full: true,
+          assignments: response.data,
+          cursor: Number(response.headers['x-change-cursor'] || 0),
+          userId: user?.id,
+        };
+      }
+
+      let cursor = changeCursor;
+      let updated = [];
+      let removed = [];
+      let hasMore = true;
+      while (hasMore) {
+        const response = await axios.get(`${API_URL}/assignments/changes`, {
+          ...getAuthConfig(),
+          params: { since: cursor },
+        });
+        updated = updated.concat(response.data.assignments);
+        removed = removed.concat(response.data.removed);
+        hasMore = response.data.has_more;
+        cursor = response.data.cursor;
+      }
+      return { full: false, assignments: updated, removed, cursor, userId: user?.id };
+    } catch (error) {
+      return rejectWithValue(
+        error.response?.data?.detail || 'Failed to fetch assignments'
+      );
+    }
+  }
+);
+
 // Get assignment by ID
 export const getAssignmentById = createAsyncThunk(
   'assignments/getById',
@@ -51,6 +96,21 @@ export const getAssignmentById = createAsyncThunk(
   }
 );
 
+// Get an assignment together with its comments in one request
+export const fetchAssignmentWorkspace = createAsyncThunk(
+  'assignments/fetchWorkspace',
+  async (id, { rejectWithValue }) => {
+    try {
+      const response = await axios.get(`${API_URL}/assignments/${id}/workspace`, getAuthConfig());
+      return response.data;
+    } catch (error) {
+      return rejectWithValue(
+        error.response?.data?.detail || 'Failed to fetch assignment'
+      );
+    }
+  }
+);
+
 // Create new assignment
 export const createAssignment = createAsyncThunk(
   'assignments/create',
@@ -168,6 +228,7 @@ const assignmentSlice = createSlice({
     },
     clearCurrentAssignment: (state) => {
       state.currentAssignment = null;
+      state.currentComments = null;
     },
   },
   extraReducers: (builder) => {
@@ -185,6 +246,37 @@ const assignmentSlice = createSlice({
         state.loading = false;
         state.error = action.payload;
       })
+
+      // Sync assignments
+      .addCase(syncAssignments.pending, (state) => {
+        // Only show the spinner when there is nothing to show yet
+        state.loading = state.changeCursor === null;
+        state.error = null;
+      })
+      .addCase(syncAssignments.fulfilled, (state, action) => {
+        const { full, assignments, removed, cursor, userId } = action.payload;
+        state.loading = false;
+        state.changeCursor = cursor;
+        state.syncedUserId = userId;
+        if (full) {
+          state.assignments = assignments;
+          return;
+        }
+        state.assignments = state.assignments.filter(a => !removed.includes(a.id));
+        assignments.forEach(assignment => {
+          const index = state.assignments.findIndex(a => a.id === assignment.id);
+          if (index !== -1) {
+            state.assignments[index] = assignment;
+          } else {
+            state.assignments.push(assignment);
+          }
+        });
+      })
+      .addCase(syncAssignments.rejected, (state, action) => {
+        state.loading = false;
+        state.changeCursor = null;
+        state.error = action.payload;
+      })
       
       // Get assignment by ID
       .addCase(getAssignmentById.pending, (state) => {
@@ -199,6 +291,22 @@ const assignmentSlice = createSlice({
         state.loading = false;
         state.error = action.payload;
       })
+
+      // Get assignment workspace
+      .addCase(fetchAssignmentWorkspace.pending, (state) => {
+        state.loading = true;
+        state.error = null;
+        state.currentComments = null;
+      })
+      .addCase(fetchAssignmentWorkspace.fulfilled, (state, action) => {
+        state.loading = false;
+        state.currentAssignment = action.payload.assignment;
+        state.currentComments = action.payload.comments;
+      })
+      .addCase(fetchAssignmentWorkspace.rejected, (state, action) => {
+        state.loading = false;
+        state.error = action.payload;
+      })
       
       // Create assignment
       .addCase(createAssignment.pending, (state) => {